@@ -0,0 +1,129 @@
+"""Drive N simulated tills against a local API instance and report checkout latency.
+
+Starts uvicorn on a throwaway database (or uses --url), seeds a catalogue,
+then each till repeatedly searches, reserves stock and checks out.
+
+    python benchmarks/api_load_test.py --tills 8 --sales 50
+"""
+import argparse
+import asyncio
+import os
+import random
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+import httpx
+
+SRC_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'src')
+sys.path.insert(0, SRC_DIR)
+
+from database.db_manager import DatabaseManager  # noqa: E402
+
+
+def seed_database(db_path, products):
+    db = DatabaseManager(db_path)
+    for product_id in range(1, products + 1):
+        db.add_product(f"Load test product {product_id}", 1000000, 1.0 + product_id % 50,
+                       barcode=f"{700000000000 + product_id}")
+    db.close()
+
+
+def start_server(db_path, port):
+    env = dict(os.environ, TERRAN_DB_PATH=db_path)
+    server = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "api.main:app", "--app-dir", SRC_DIR,
+         "--port", str(port), "--log-level", "warning"],
+        env=env
+    )
+    url = f"http://127.0.0.1:{port}"
+    for _ in range(100):
+        try:
+            httpx.get(f"{url}/health", timeout=0.5)
+            return server, url
+        except httpx.HTTPError:
+            time.sleep(0.1)
+    server.terminate()
+    raise RuntimeError("API server did not start")
+
+
+async def run_till(client, till_id, sales, products, rng, results):
+    for _ in range(sales):
+        product_id = rng.randint(1, products)
+        quantity = rng.randint(1, 3)
+        await client.get("/catalog/products", params={"q": "load test", "limit": 20})
+
+        start = time.perf_counter()
+        response = await client.put("/sales/reservations", json={
+            "till_id": till_id, "product_id": product_id, "quantity": quantity
+        })
+        results['reserve'].append(time.perf_counter() - start)
+
+        start = time.perf_counter()
+        response = await client.post("/sales", json={
+            "till_id": till_id,
+            "items": [{"id": product_id, "quantity": quantity, "price": 1.0}]
+        })
+        results['checkout'].append(time.perf_counter() - start)
+        if response.status_code != 201:
+            results['errors'].append(response.status_code)
+
+
+async def run_load(url, tills, sales, products, seed):
+    results = {'reserve': [], 'checkout': [], 'errors': []}
+    async with httpx.AsyncClient(base_url=url, timeout=30) as client:
+        start = time.perf_counter()
+        await asyncio.gather(*(
+            run_till(client, f"load-till-{n}", sales, products, random.Random(seed + n), results)
+            for n in range(tills)
+        ))
+        elapsed = time.perf_counter() - start
+    return results, elapsed
+
+
+def percentile(values, pct):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * pct / 100))]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--tills', type=int, default=8)
+    parser.add_argument('--sales', type=int, default=50, help="checkouts per till")
+    parser.add_argument('--products', type=int, default=500)
+    parser.add_argument('--port', type=int, default=8765)
+    parser.add_argument('--url', help="use a running server instead of starting one")
+    parser.add_argument('--seed', type=int, default=42)
+    args = parser.parse_args()
+
+    server = None
+    url = args.url
+    with tempfile.TemporaryDirectory() as tmp:
+        if url is None:
+            db_path = os.path.join(tmp, "pos.db")
+            seed_database(db_path, args.products)
+            server, url = start_server(db_path, args.port)
+        try:
+            results, elapsed = asyncio.run(
+                run_load(url, args.tills, args.sales, args.products, args.seed)
+            )
+        finally:
+            if server is not None:
+                server.terminate()
+                server.wait()
+
+    total = args.tills * args.sales
+    print(f"{args.tills} tills, {total} checkouts in {elapsed:.2f} s "
+          f"({total / elapsed:.1f} sales/s), {len(results['errors'])} failed")
+    for name in ('reserve', 'checkout'):
+        values = results[name]
+        print(f"{name:>9}: p50 {percentile(values, 50) * 1000:7.1f} ms  "
+              f"p95 {percentile(values, 95) * 1000:7.1f} ms  "
+              f"p99 {percentile(values, 99) * 1000:7.1f} ms  "
+              f"mean {statistics.mean(values) * 1000:7.1f} ms")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,12 @@
+def bench_backup_database(benchmark, writable_store, tmp_path):
+    counter = iter(range(1000000))
+    benchmark.pedantic(
+        lambda: writable_store.backup_database(str(tmp_path / f"backup-{next(counter)}.db")),
+        rounds=5
+    )
+
+
+def bench_restore_database(benchmark, writable_store, tmp_path):
+    backup_file = str(tmp_path / "backup.db")
+    writable_store.backup_database(backup_file)
+    benchmark.pedantic(writable_store.restore_database, args=(backup_file,), rounds=5)
@@ -0,0 +1,52 @@
+import sqlite3
+import pytest
+
+
+@pytest.mark.parametrize("term", ["milk", "organic tea", "zzz"])
+def bench_search_products(benchmark, store, term):
+    benchmark(store.search_products, term)
+
+
+@pytest.mark.parametrize("query", ["m", "mil", "organic te"])
+def bench_search_catalog(benchmark, store, query):
+    store.get_all_products()
+    benchmark(store.search_catalog, query, None, True)
+
+
+def bench_get_all_products_cached(benchmark, store):
+    store.get_all_products()
+    benchmark(store.get_all_products)
+
+
+def bench_get_all_products_cold(benchmark, store):
+    # Every round reloads the catalogue from the database
+    benchmark.pedantic(store.get_all_products, setup=store.catalog.reset, rounds=20)
+
+
+def bench_find_product_by_code(benchmark, store):
+    store.get_all_products()
+    benchmark(store.find_product_by_code, "560000000042")
+
+
+def bench_read_after_external_commit(benchmark, writable_store):
+    """Read the catalogue back after a commit from another connection, as open windows do"""
+    db = writable_store
+    product_id = db.get_all_products()[0][0]
+    deltas = []
+
+    def reload(delta):
+        deltas.append(delta)
+        db.get_all_products()
+
+    db.subscribe_catalog(reload)
+    other = sqlite3.connect(db.db_path)
+
+    def external_commit():
+        deltas.clear()
+        other.execute("UPDATE inventory SET quantity = quantity + 1 WHERE id = ?", (product_id,))
+        other.commit()
+
+    benchmark.pedantic(db.get_all_products, setup=external_commit, rounds=20)
+    other.close()
+    # One notification per commit, not one per nested read-back
+    assert len(deltas) == 1
@@ -0,0 +1,34 @@
+import pytest
+
+CUSTOM_REPORTS = [
+    "Top Selling Products", "Sales by Category", "Daily Sales Summary", "Margin by Product"
+]
+
+
+@pytest.mark.parametrize("period", ["month", "year"])
+def bench_sales_report(benchmark, store, report_range, period):
+    benchmark(store.get_sales_report, *report_range[period])
+
+
+def bench_inventory_report(benchmark, store):
+    benchmark(store.get_inventory_report)
+
+
+@pytest.mark.parametrize("period", ["month", "year"])
+def bench_financial_report(benchmark, store, report_range, period):
+    benchmark(store.get_financial_report, *report_range[period])
+
+
+@pytest.mark.parametrize("report_type", CUSTOM_REPORTS)
+@pytest.mark.parametrize("period", ["month", "year"])
+def bench_custom_report(benchmark, store, report_range, report_type, period):
+    benchmark(store.get_custom_report, report_type, *report_range[period])
+
+
+@pytest.mark.parametrize("report_type", ["Sales by Store"] + CUSTOM_REPORTS)
+def bench_federated_report(benchmark, head_office, report_range, report_type):
+    benchmark(head_office.get_federated_report, report_type, *report_range["year"])
+
+
+def bench_stock_history_page(benchmark, store):
+    benchmark(store.get_stock_history, limit=200, days=None)
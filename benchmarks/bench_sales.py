@@ -0,0 +1,18 @@
+import pytest
+
+
+def make_cart(store, rng, lines):
+    product_count = len(store.get_all_products())
+    return [{'id': product_id, 'price': 2.5, 'quantity': 1}
+            for product_id in rng.sample(range(1, product_count + 1), lines)]
+
+
+@pytest.mark.parametrize("lines", [1, 5, 25])
+def bench_create_sale(benchmark, writable_store, rng, lines):
+    # Keep every product in stock however many rounds run
+    writable_store.conn.execute("UPDATE inventory SET quantity = 1000000000")
+    writable_store.conn.commit()
+    writable_store.catalog.reset()
+    cart = make_cart(writable_store, rng, lines)
+    sale_id = benchmark(writable_store.create_sale, cart, "Bench Client", None)
+    assert sale_id
@@ -0,0 +1,46 @@
+import pytest
+
+
+def make_delivery(store, rng, lines):
+    product_count = len(store.get_all_products())
+    return [{'product_id': product_id, 'quantity': rng.randint(1, 48),
+             'purchase_price': 1.25, 'selling_price': None}
+            for product_id in rng.sample(range(1, product_count + 1), lines)]
+
+
+@pytest.mark.parametrize("lines", [10, 100, 800])
+def bench_receive_delivery(benchmark, writable_store, rng, lines):
+    delivery = make_delivery(writable_store, rng, lines)
+    grn_id = benchmark(writable_store.receive_delivery, "Bench Supplier", delivery, "DN-BENCH")
+    assert grn_id
+
+
+@pytest.mark.parametrize("lines", [10, 100])
+def bench_transfer_round_trip(benchmark, head_office, rng, lines):
+    codes = [location['code'] for location in head_office.get_locations()][:2]
+    product_ids = rng.sample(range(1, 1000), lines)
+    direction = [0]
+
+    def move():
+        # Alternate direction so the stores never run out
+        source, destination = codes if direction[0] % 2 == 0 else codes[::-1]
+        direction[0] += 1
+        transfer_id = head_office.transfers.create(
+            source, destination, [(product_id, 1) for product_id in product_ids])
+        head_office.transfers.dispatch(transfer_id)
+        return head_office.transfers.receive(transfer_id)
+
+    assert benchmark(move)
+
+
+@pytest.mark.parametrize("moment", ["2024-06-30", "2024-12-15"])
+def bench_stock_valuation(benchmark, store, moment):
+    # A month end sits on a snapshot; mid-month replays half a month of movements
+    rows = benchmark(store.get_stock_valuation, moment)
+    assert rows
+
+
+def bench_stock_at_product(benchmark, store, rng):
+    product_ids = rng.sample(range(1, 1000), 20)
+    stock = benchmark(store.get_stock_at, "2024-03-01", product_ids)
+    assert isinstance(stock, dict)
@@ -0,0 +1,13 @@
+from benchmarks.datagen import BENCH_PASSWORD
+
+
+def bench_has_permission(benchmark, store):
+    assert benchmark(store.has_permission, 2, 'pos_access')
+
+
+def bench_get_user_permissions(benchmark, store):
+    benchmark(store.get_user_permissions, 2)
+
+
+def bench_authenticate_user(benchmark, store):
+    benchmark(store.authenticate_user, "user1", BENCH_PASSWORD)
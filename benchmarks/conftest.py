@@ -0,0 +1,85 @@
+"""Shared fixtures for the pytest-benchmark suites.
+
+The store database is generated once per scale and seed and cached under
+benchmarks/.data; tests that write work on a fresh copy. Results are saved
+as JSON under benchmarks/results so runs can be compared release over
+release with ``pytest-benchmark compare``.
+
+    BENCH_SCALE=medium python -m pytest benchmarks
+"""
+import os
+import random
+import shutil
+import pytest
+
+from benchmarks.datagen import cached_store, SCALES
+from database.db_manager import DatabaseManager
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+SCALE = os.environ.get("BENCH_SCALE", "small")
+SEED = int(os.environ.get("BENCH_SEED", "42"))
+# Stores in the head-office federation benchmarks
+FEDERATION_STORES = int(os.environ.get("BENCH_STORES", "8"))
+
+
+def pytest_configure(config):
+    # Keep results next to the suite wherever pytest is started from
+    if getattr(config.option, "benchmark_storage", None) == "file://./.benchmarks":
+        config.option.benchmark_storage = f"file://{os.path.join(HERE, 'results')}"
+
+
+def pytest_benchmark_update_json(config, benchmarks, output_json):
+    output_json["store"] = {"scale": SCALE, "seed": SEED, **SCALES[SCALE]}
+
+
+@pytest.fixture(scope="session")
+def template_db():
+    """Path of the generated database for BENCH_SCALE, built on first use"""
+    return cached_store(SCALE, SEED)
+
+
+@pytest.fixture(scope="session")
+def store(template_db, tmp_path_factory):
+    """Read-only DatabaseManager over a session copy of the store"""
+    path = tmp_path_factory.mktemp("store") / "pos.db"
+    shutil.copyfile(template_db, path)
+    db = DatabaseManager(path)
+    yield db
+    db.close()
+
+
+@pytest.fixture
+def writable_store(template_db, tmp_path):
+    """DatabaseManager over a private copy, for benchmarks that write"""
+    path = tmp_path / "pos.db"
+    shutil.copyfile(template_db, path)
+    db = DatabaseManager(path)
+    yield db
+    db.close()
+
+
+@pytest.fixture
+def rng():
+    return random.Random(SEED)
+
+
+@pytest.fixture(scope="session")
+def report_range():
+    """The last 30 days and the last full year of generated history"""
+    return {
+        "month": ("2024-12-01 00:00:00", "2024-12-31 23:59:59"),
+        "year": ("2024-01-01 00:00:00", "2024-12-31 23:59:59"),
+    }
+
+
+@pytest.fixture(scope="session")
+def head_office(template_db, tmp_path_factory):
+    """Head-office DatabaseManager with FEDERATION_STORES copies of the store registered"""
+    root = tmp_path_factory.mktemp("head_office")
+    db = DatabaseManager(root / "pos.db")
+    for number in range(FEDERATION_STORES):
+        path = root / f"store-{number}.db"
+        shutil.copyfile(template_db, path)
+        db.add_location(f"S{number:02d}", f"Store {number}", path)
+    yield db
+    db.close()
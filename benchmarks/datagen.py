@@ -0,0 +1,248 @@
+"""Deterministic synthetic store data for benchmarks.
+
+Populates a pos.db through the real schema (DatabaseManager creates it) and
+then bulk-inserts products, categories, sales history, stock receipts,
+users and activity log rows. The same seed, scale and end date always give
+the same database.
+
+    python -m benchmarks.datagen data/bench.db --scale medium
+"""
+import argparse
+import hashlib
+import os
+import random
+import sys
+import time
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'src'))
+
+from database.db_manager import DatabaseManager, EPOCH_COLUMNS, MONEY_COLUMNS  # noqa: E402
+from database.timeutil import to_epoch  # noqa: E402
+
+# Fixed so generated history does not depend on the day it is built
+DEFAULT_END_DATE = datetime(2025, 1, 1)
+
+SCALES = {
+    'small': {'products': 1000, 'categories': 20, 'years': 1, 'sales_per_day': 50,
+              'receipts_per_day': 10, 'users': 10, 'activity_per_day': 100},
+    'medium': {'products': 10000, 'categories': 50, 'years': 2, 'sales_per_day': 200,
+               'receipts_per_day': 40, 'users': 50, 'activity_per_day': 500},
+    'large': {'products': 50000, 'categories': 200, 'years': 5, 'sales_per_day': 500,
+              'receipts_per_day': 100, 'users': 200, 'activity_per_day': 2000},
+}
+
+WORDS = [
+    "apple", "banana", "bread", "butter", "cheese", "chicken", "coffee", "cola",
+    "cookie", "corn", "cream", "egg", "flour", "garlic", "honey", "juice", "lemon",
+    "milk", "oil", "onion", "orange", "pasta", "pepper", "rice", "salt", "soap",
+    "sugar", "tea", "tomato", "water", "yogurt", "organic", "large", "small", "pack"
+]
+SUPPLIERS = ["Acme Wholesale", "Northern Foods", "Metro Supply", "Coastal Traders", "Prime Goods"]
+ROLES = ["manager", "cashier", "cashier", "cashier", "inventory"]
+ACTIVITIES = [("access", "pos"), ("sale", "pos"), ("access", "inventory"),
+              ("update", "inventory"), ("access", "reports"), ("login", "auth")]
+
+BENCH_PASSWORD = "bench_password"
+BATCH_SIZE = 10000
+
+# Generated stores are kept here between runs
+DATA_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), ".data")
+
+
+def timestamp(value):
+    return value.strftime('%Y-%m-%d %H:%M:%S')
+
+
+def generate(db_path, scale='small', seed=42, end_date=DEFAULT_END_DATE, **overrides):
+    """Build a store database at db_path and return the row counts"""
+    config = dict(SCALES[scale], **overrides)
+    rng = random.Random(seed)
+    if os.path.exists(db_path):
+        raise FileExistsError(f"{db_path} already exists")
+
+    db = DatabaseManager(db_path)
+    # Bulk loading is not what the profiler is for
+    profiling = db.profiler.enabled
+    db.profiler.enabled = False
+    conn = db.conn
+    cursor = conn.cursor()
+    start_date = end_date - timedelta(days=365 * config['years'])
+    days = (end_date - start_date).days
+    counts = {}
+
+    # Categories beyond the preset ones
+    cursor.execute("SELECT COUNT(*) FROM categories")
+    existing = cursor.fetchone()[0]
+    cursor.executemany(
+        "INSERT INTO categories (name, description) VALUES (?, ?)",
+        [(f"Category {n}", f"Synthetic category {n}")
+         for n in range(existing + 1, config['categories'] + 1)]
+    )
+    cursor.execute("SELECT id FROM categories ORDER BY id")
+    category_ids = [row[0] for row in cursor.fetchall()]
+    counts['categories'] = len(category_ids)
+
+    # Products
+    products = []
+    for product_id in range(1, config['products'] + 1):
+        name = " ".join(rng.sample(WORDS, 3)).title() + f" {product_id}"
+        price = round(rng.uniform(0.5, 150), 2)
+        products.append((
+            product_id, name, rng.choice(category_ids), rng.randint(0, 500), price,
+            rng.choice((5, 10, 20)), f"Synthetic product {product_id}",
+            timestamp(start_date), timestamp(start_date), f"{560000000000 + product_id}"
+        ))
+    cursor.executemany(
+        """INSERT INTO inventory (id, name, category_id, quantity, price, alert_threshold,
+                                  description, created_at, updated_at, barcode)
+           VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)""",
+        products
+    )
+    prices = {product[0]: product[4] for product in products}
+    counts['products'] = len(products)
+
+    # Users
+    password_hash = hashlib.sha256(BENCH_PASSWORD.encode()).hexdigest()
+    cursor.executemany(
+        """INSERT INTO users (username, password_hash, full_name, email, role)
+           VALUES (?, ?, ?, ?, ?)""",
+        [(f"user{n}", password_hash, f"Bench User {n}", f"user{n}@bench.local", ROLES[n % len(ROLES)])
+         for n in range(1, config['users'] + 1)]
+    )
+    cursor.execute("SELECT id FROM users ORDER BY id")
+    user_ids = [row[0] for row in cursor.fetchall()]
+    counts['users'] = len(user_ids)
+
+    # Sales with their items, spread over the opening hours of each day
+    sale_id = 0
+    sales = []
+    items = []
+    counts['sales'] = counts['sale_items'] = 0
+    for day in range(days):
+        opening = start_date + timedelta(days=day, hours=8)
+        for _ in range(config['sales_per_day']):
+            sale_id += 1
+            lines = []
+            for product_id in rng.sample(range(1, config['products'] + 1), rng.randint(1, 5)):
+                lines.append((sale_id, product_id, rng.randint(1, 4), prices[product_id]))
+            total = round(sum(quantity * price for _, _, quantity, price in lines), 2)
+            created_at = opening + timedelta(seconds=rng.randint(0, 12 * 3600))
+            client = f"Client {rng.randint(1, 5000)}" if rng.random() < 0.3 else None
+            sales.append((sale_id, client, None, total, timestamp(created_at)))
+            items.extend(lines)
+        if len(items) >= BATCH_SIZE or day == days - 1:
+            cursor.executemany(
+                "INSERT INTO sales (id, client_name, nif, total_amount, created_at) VALUES (?, ?, ?, ?, ?)",
+                sales
+            )
+            cursor.executemany(
+                "INSERT INTO sale_items (sale_id, product_id, quantity, price_at_sale) VALUES (?, ?, ?, ?)",
+                items
+            )
+            counts['sales'] += len(sales)
+            counts['sale_items'] += len(items)
+            sales = []
+            items = []
+
+    # Stock receipts
+    receipts = []
+    for day in range(days):
+        received = start_date + timedelta(days=day, hours=6)
+        for _ in range(config['receipts_per_day']):
+            product_id = rng.randint(1, config['products'])
+            selling_price = prices[product_id]
+            receipts.append((
+                product_id, rng.choice(SUPPLIERS), rng.randint(10, 200),
+                round(selling_price * rng.uniform(0.5, 0.8), 2), selling_price, None,
+                timestamp(received + timedelta(minutes=rng.randint(0, 600)))
+            ))
+    cursor.executemany(
+        """INSERT INTO stock_receiving (product_id, supplier, quantity, purchase_price,
+                                        selling_price, notes, received_at)
+           VALUES (?, ?, ?, ?, ?, ?, ?)""",
+        receipts
+    )
+    counts['stock_receiving'] = len(receipts)
+
+    # Activity log
+    activity = []
+    for day in range(days):
+        opening = start_date + timedelta(days=day, hours=8)
+        for _ in range(config['activity_per_day']):
+            activity_type, module = rng.choice(ACTIVITIES)
+            activity.append((
+                rng.choice(user_ids), activity_type, module, f"Synthetic {activity_type}",
+                None, timestamp(opening + timedelta(seconds=rng.randint(0, 12 * 3600)))
+            ))
+    cursor.executemany(
+        """INSERT INTO user_activity_log (user_id, activity_type, module, description,
+                                          ip_address, timestamp)
+           VALUES (?, ?, ?, ?, ?, ?)""",
+        activity
+    )
+    counts['user_activity_log'] = len(activity)
+
+    # Only the REAL money and text time columns were written; derive the integer ones
+    for table, columns in MONEY_COLUMNS.items():
+        cursor.execute(f"UPDATE {table} SET " + ", ".join(
+            f"{cents} = CAST(ROUND({real} * 100) AS INTEGER)" for cents, real in columns
+        ))
+    for table, columns in EPOCH_COLUMNS.items():
+        cursor.execute(f"UPDATE {table} SET " + ", ".join(
+            f"{epoch} = CAST(strftime('%s', {text}) AS INTEGER)" for epoch, text in columns
+        ))
+    conn.commit()
+    # Sales and receipts were loaded directly; cost them by replaying the history
+    db.rebuild_costs()
+    # and write their stock movements, with a snapshot at the end of every month
+    counts['stock_movements'] = db.backfill_stock_ledger()
+    month = datetime(start_date.year, start_date.month, 1)
+    counts['stock_snapshots'] = 0
+    while month < end_date:
+        month = datetime(month.year + month.month // 12, month.month % 12 + 1, 1)
+        db.take_stock_snapshot(to_epoch(min(month, end_date)) - 1)
+        counts['stock_snapshots'] += 1
+    cursor.execute("ANALYZE")
+    conn.commit()
+    db.close()
+    db.profiler.enabled = profiling
+    return counts
+
+
+def cached_store(scale='small', seed=42):
+    """Path of the generated store for scale and seed, built on first use"""
+    os.makedirs(DATA_DIR, exist_ok=True)
+    path = os.path.join(DATA_DIR, f"store-{scale}-{seed}.db")
+    if not os.path.exists(path):
+        partial = path + ".partial"
+        if os.path.exists(partial):
+            os.remove(partial)
+        generate(partial, scale, seed)
+        os.replace(partial, path)
+    return path
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('db_path')
+    parser.add_argument('--scale', choices=sorted(SCALES), default='small')
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--end-date', default=DEFAULT_END_DATE.strftime('%Y-%m-%d'),
+                        help="last day of generated history (YYYY-MM-DD)")
+    for key in SCALES['small']:
+        parser.add_argument(f"--{key.replace('_', '-')}", type=int, dest=key,
+                            help=f"override the scale's {key.replace('_', ' ')}")
+    args = parser.parse_args()
+
+    overrides = {key: getattr(args, key) for key in SCALES['small'] if getattr(args, key) is not None}
+    start = time.perf_counter()
+    counts = generate(args.db_path, args.scale, args.seed,
+                      datetime.strptime(args.end_date, '%Y-%m-%d'), **overrides)
+    print(f"Generated {args.db_path} in {time.perf_counter() - start:.1f} s")
+    for table, count in counts.items():
+        print(f"  {table:>18}: {count}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,69 @@
+"""Overhead of the API's Prometheus instrumentation and the query profiler on checkout.
+
+Runs create_sale on a throwaway database directly, through
+api.metrics.call_with_metrics and with the query profiler on, alternating
+batches to cancel out drift, and reports the relative cost of each. The
+target for the always-on instrumentation is below 1% of checkout time;
+the profiler is opt-in.
+
+    python benchmarks/metrics_overhead.py --sales 2000
+"""
+import argparse
+import os
+import statistics
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'src'))
+
+from database.db_manager import DatabaseManager  # noqa: E402
+from api.metrics import call_with_metrics  # noqa: E402
+
+BATCH = 50
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--sales', type=int, default=2000, help="checkouts per variant")
+    parser.add_argument('--items', type=int, default=5, help="line items per sale")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        db = DatabaseManager(os.path.join(tmp, "pos.db"))
+        profiler = db.profiler
+        profiler.enabled = False
+        product_ids = [db.add_product(f"Product {n}", 10 ** 9, 1.5) for n in range(args.items)]
+        cart = [{'id': product_id, 'price': 1.5, 'quantity': 1} for product_id in product_ids]
+
+        def plain():
+            db.create_sale(cart)
+
+        def instrumented():
+            call_with_metrics(db, 'create_sale', (cart,), {})
+
+        timings = {'plain': [], 'instrumented': [], 'profiled': []}
+        for _ in range(args.sales // BATCH):
+            for name, run in (('plain', plain), ('instrumented', instrumented), ('profiled', plain)):
+                profiler.enabled = name == 'profiled'
+                start = time.perf_counter()
+                for _ in range(BATCH):
+                    run()
+                timings[name].append((time.perf_counter() - start) / BATCH)
+        profiler.enabled = False
+        db.close()
+
+    plain_time = statistics.median(timings['plain'])
+    instrumented_time = statistics.median(timings['instrumented'])
+    profiled_time = statistics.median(timings['profiled'])
+    overhead = (instrumented_time - plain_time) / plain_time * 100
+    profiler_overhead = (profiled_time - plain_time) / plain_time * 100
+    print(f"checkout (plain):        {plain_time * 1e6:9.1f} us")
+    print(f"checkout (instrumented): {instrumented_time * 1e6:9.1f} us")
+    print(f"checkout (profiled):     {profiled_time * 1e6:9.1f} us")
+    print(f"metrics overhead:        {overhead:9.2f} %  ({'ok' if overhead < 1 else 'above 1% target'})")
+    print(f"profiler overhead:       {profiler_overhead:9.2f} %  (opt-in)")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,82 @@
+"""Keystroke-to-results latency of the POS product search.
+
+Builds a synthetic catalogue in the in-memory CatalogCache and types a set
+of queries one character at a time, timing each search the POS would run.
+
+    python benchmarks/pos_search_latency.py --products 50000
+"""
+import argparse
+import os
+import random
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'src'))
+
+from database.catalog_cache import CatalogCache  # noqa: E402
+
+WORDS = [
+    "apple", "banana", "bread", "butter", "cheese", "chicken", "coffee", "cola",
+    "cookie", "corn", "cream", "egg", "flour", "garlic", "honey", "juice", "lemon",
+    "milk", "oil", "onion", "orange", "pasta", "pepper", "rice", "salt", "soap",
+    "sugar", "tea", "tomato", "water", "yogurt", "organic", "large", "small", "pack"
+]
+
+
+def build_catalog(count, categories=20, seed=42):
+    rng = random.Random(seed)
+    products = []
+    for product_id in range(1, count + 1):
+        name = " ".join(rng.sample(WORDS, 3)) + f" {product_id}"
+        category_id = rng.randint(1, categories)
+        products.append((
+            product_id, name, category_id, rng.randint(0, 200), round(rng.uniform(0.5, 50), 2),
+            10, None, None, None, f"{600000000000 + product_id}", f"Category {category_id}"
+        ))
+    cache = CatalogCache()
+    start = time.perf_counter()
+    cache.load(products)
+    return cache, time.perf_counter() - start
+
+
+def percentile(values, pct):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * pct / 100))]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--products', type=int, default=20000)
+    parser.add_argument('--queries', type=int, default=200)
+    parser.add_argument('--seed', type=int, default=42)
+    args = parser.parse_args()
+
+    cache, load_time = build_catalog(args.products, seed=args.seed)
+    print(f"Indexed {args.products} products in {load_time * 1000:.1f} ms")
+
+    rng = random.Random(args.seed)
+    timings = {'prefix search': [], 'substring filter': [], 'barcode lookup': []}
+    for _ in range(args.queries):
+        query = " ".join(rng.sample(WORDS, rng.randint(1, 2)))
+        for end in range(1, len(query) + 1):
+            typed = query[:end]
+            start = time.perf_counter()
+            cache.search(typed, in_stock_only=True)
+            timings['prefix search'].append(time.perf_counter() - start)
+            start = time.perf_counter()
+            cache.filter(typed)
+            timings['substring filter'].append(time.perf_counter() - start)
+        code = f"{600000000000 + rng.randint(1, args.products)}"
+        start = time.perf_counter()
+        cache.by_code(code)
+        timings['barcode lookup'].append(time.perf_counter() - start)
+
+    for name, values in timings.items():
+        print(f"{name:>17}: p50 {percentile(values, 50) * 1000:8.3f} ms  "
+              f"p95 {percentile(values, 95) * 1000:8.3f} ms  "
+              f"mean {statistics.mean(values) * 1000:8.3f} ms  (n={len(values)})")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,274 @@
+"""Headless timing of the PyQt windows against a generated store.
+
+Opens each window on the offscreen Qt platform, in its own process so peak
+RSS belongs to that window alone, and measures:
+
+  first paint   construction start until the window's first paint event
+  full load     construction start until the event queue is idle after show
+  load call     time spent in the window's load method (load_inventory, ...)
+  peak RSS      maximum resident set size of the process
+  keystrokes    per key: key event, filter run (debounce skipped), repaint
+
+The report is printed and saved as JSON under benchmarks/results.
+
+    python -m benchmarks.ui_harness --scale large
+    python -m benchmarks.ui_harness --scale small --windows pos inventory
+"""
+import argparse
+import json
+import os
+import random
+import resource
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime
+
+# Must be set before Qt is imported anywhere
+os.environ.setdefault("QT_QPA_PLATFORM", "offscreen")
+
+from benchmarks.datagen import cached_store, BENCH_PASSWORD, WORDS  # noqa: E402
+from database.db_manager import DatabaseManager  # noqa: E402
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+RESULTS_DIR = os.path.join(HERE, "results")
+
+# name: (module, class, load method, search field, filter method)
+WINDOWS = {
+    'inventory': ('views.inventory_window', 'InventoryWindow', 'load_inventory',
+                  'search_input', 'filter_inventory'),
+    'pos': ('views.pos_window', 'POSWindow', 'load_products',
+            'search_input', 'filter_products'),
+    'reports': ('views.reports_window', 'ReportsWindow', 'load_reports', None, None),
+    'users': ('views.user_management_window', 'UserManagementWindow', 'load_activity_log',
+              None, None),
+}
+
+# Give up on a window that never paints
+PAINT_TIMEOUT = 30.0
+# How often an unexpected modal dialog is looked for and dismissed
+MODAL_CHECK_MS = 100
+
+
+def search_queries(count, seed):
+    """Queries typed into the search fields: words, word pairs and product numbers"""
+    rng = random.Random(seed)
+    queries = []
+    for n in range(count):
+        kind = n % 3
+        if kind == 0:
+            queries.append(rng.choice(WORDS))
+        elif kind == 1:
+            queries.append(" ".join(rng.sample(WORDS, 2)))
+        else:
+            queries.append(str(rng.randint(1, 999)))
+    return queries
+
+
+def peak_rss_mb():
+    # ru_maxrss is in kilobytes on Linux and bytes on macOS
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak / (1024 * 1024) if sys.platform == "darwin" else peak / 1024
+
+
+def summarise(timings):
+    if not timings:
+        return None
+    ordered = sorted(timings)
+    return {
+        'count': len(ordered),
+        'median_ms': statistics.median(ordered),
+        'p95_ms': ordered[min(len(ordered) - 1, int(len(ordered) * 0.95))],
+        'max_ms': ordered[-1],
+    }
+
+
+def measure_window(name, db_path, queries):
+    """Open one window and time it; runs in the child process"""
+    from PyQt6.QtCore import QObject, QEvent, QTimer
+    from PyQt6.QtTest import QTest
+    from PyQt6.QtWidgets import QApplication
+    import importlib
+
+    app = QApplication.instance() or QApplication([sys.argv[0]])
+    module_name, class_name, load_method, search_field, filter_method = WINDOWS[name]
+
+    db = DatabaseManager(db_path)
+    user = db.authenticate_user("root", "terran_root_2024") or db.authenticate_user("user1", BENCH_PASSWORD)
+    window_class = getattr(importlib.import_module(module_name), class_name)
+    baseline_rss = peak_rss_mb()
+
+    # Time every call of the load method, including the one in __init__
+    load_calls = []
+    original_load = getattr(window_class, load_method)
+
+    def timed_load(self, *args, **kwargs):
+        start = time.perf_counter()
+        try:
+            return original_load(self, *args, **kwargs)
+        finally:
+            load_calls.append((time.perf_counter() - start) * 1000)
+
+    setattr(window_class, load_method, timed_load)
+
+    # A modal error box would block the run forever; note it and close it
+    errors = []
+
+    def dismiss_modal():
+        modal = QApplication.activeModalWidget()
+        if modal is not None:
+            text = modal.text() if hasattr(modal, 'text') else ""
+            errors.append(f"{modal.windowTitle()}: {text}")
+            modal.close()
+
+    modal_timer = QTimer()
+    modal_timer.setInterval(MODAL_CHECK_MS)
+    modal_timer.timeout.connect(dismiss_modal)
+    modal_timer.start()
+
+    class PaintWatcher(QObject):
+        """Records when any widget of the watched window first paints"""
+
+        def __init__(self):
+            super().__init__()
+            self.window = None
+            self.first_paint = None
+
+        def eventFilter(self, obj, event):
+            if (self.first_paint is None and self.window is not None
+                    and event.type() == QEvent.Type.Paint
+                    and hasattr(obj, 'window') and obj.window() is self.window):
+                self.first_paint = time.perf_counter()
+            return False
+
+    watcher = PaintWatcher()
+    app.installEventFilter(watcher)
+
+    start = time.perf_counter()
+    window = window_class(db, user)
+    constructed = time.perf_counter()
+    watcher.window = window
+    window.show()
+    deadline = time.perf_counter() + PAINT_TIMEOUT
+    while watcher.first_paint is None and time.perf_counter() < deadline:
+        app.processEvents()
+    app.processEvents()
+    loaded = time.perf_counter()
+
+    result = {
+        'window': class_name,
+        'construct_ms': (constructed - start) * 1000,
+        'first_paint_ms': (watcher.first_paint - start) * 1000 if watcher.first_paint else None,
+        'full_load_ms': (loaded - start) * 1000,
+        'load_call_ms': load_calls[0] if load_calls else None,
+        'baseline_rss_mb': baseline_rss,
+        'peak_rss_mb': None,
+        'keystrokes': None,
+        'errors': errors,
+    }
+
+    if search_field:
+        field = getattr(window, search_field)
+        run_filter = getattr(window, filter_method)
+        timings = []
+        for query in queries:
+            field.clear()
+            run_filter()
+            app.processEvents()
+            for char in query:
+                key_start = time.perf_counter()
+                QTest.keyClicks(field, char)
+                # The debounce only delays the filter; time the work itself
+                run_filter()
+                app.processEvents()
+                timings.append((time.perf_counter() - key_start) * 1000)
+        result['keystrokes'] = summarise(timings)
+
+    result['peak_rss_mb'] = peak_rss_mb()
+    app.removeEventFilter(watcher)
+    modal_timer.stop()
+    window.close()
+    app.processEvents()
+    setattr(window_class, load_method, original_load)
+    db.close()
+    return result
+
+
+def run_child(name, template, queries):
+    """Measure one window in a fresh process on a private copy of the store"""
+    with tempfile.TemporaryDirectory() as tmp:
+        db_path = os.path.join(tmp, "pos.db")
+        shutil.copyfile(template, db_path)
+        completed = subprocess.run(
+            [sys.executable, "-m", "benchmarks.ui_harness", "--child", name,
+             "--db", db_path, "--queries-json", json.dumps(queries)],
+            cwd=os.path.dirname(HERE), capture_output=True, text=True
+        )
+    if completed.returncode != 0:
+        return {'window': WINDOWS[name][1], 'errors': [completed.stderr.strip()[-2000:]]}
+    return json.loads(completed.stdout.strip().splitlines()[-1])
+
+
+def format_ms(value):
+    return "-" if value is None else f"{value:.1f}"
+
+
+def print_report(report):
+    store = report['store']
+    print(f"Store: {store['scale']} (seed {store['seed']}), {report['keystroke_queries']} queries")
+    print(f"{'window':<22}{'paint':>9}{'load':>9}{'full':>9}{'rss MB':>9}"
+          f"{'key p50':>9}{'key p95':>9}{'key max':>9}")
+    for result in report['windows']:
+        keys = result.get('keystrokes') or {}
+        print(f"{result['window']:<22}{format_ms(result.get('first_paint_ms')):>9}"
+              f"{format_ms(result.get('load_call_ms')):>9}{format_ms(result.get('full_load_ms')):>9}"
+              f"{format_ms(result.get('peak_rss_mb')):>9}{format_ms(keys.get('median_ms')):>9}"
+              f"{format_ms(keys.get('p95_ms')):>9}{format_ms(keys.get('max_ms')):>9}")
+        for error in result.get('errors', []):
+            print(f"  ! {error}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--scale', default='large')
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--windows', nargs='+', choices=sorted(WINDOWS), default=list(WINDOWS))
+    parser.add_argument('--queries', type=int, default=30, help="search queries typed per window")
+    parser.add_argument('--output', help="report path (default: benchmarks/results/ui-<time>.json)")
+    parser.add_argument('--child', choices=sorted(WINDOWS), help=argparse.SUPPRESS)
+    parser.add_argument('--db', help=argparse.SUPPRESS)
+    parser.add_argument('--queries-json', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        result = measure_window(args.child, args.db, json.loads(args.queries_json))
+        print(json.dumps(result))
+        return
+
+    start = time.perf_counter()
+    template = cached_store(args.scale, args.seed)
+    print(f"Store ready in {time.perf_counter() - start:.1f} s: {template}")
+
+    queries = search_queries(args.queries, args.seed)
+    report = {
+        'created_at': datetime.now().isoformat(timespec='seconds'),
+        'store': {'scale': args.scale, 'seed': args.seed},
+        'keystroke_queries': len(queries),
+        'windows': [run_child(name, template, queries) for name in args.windows],
+    }
+    print_report(report)
+
+    output = args.output
+    if not output:
+        os.makedirs(RESULTS_DIR, exist_ok=True)
+        output = os.path.join(RESULTS_DIR, f"ui-{datetime.now():%Y%m%d-%H%M%S}.json")
+    with open(output, 'w') as f:
+        json.dump(report, f, indent=2)
+    print(f"Report written to {output}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,108 @@
+import asyncio
+import functools
+import logging
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from database.db_manager import DatabaseManager
+from . import metrics
+
+logger = logging.getLogger('TerranPOS')
+
+DB_PATH = os.environ.get("TERRAN_DB_PATH", "data/pos.db")
+READER_THREADS = int(os.environ.get("TERRAN_DB_READERS", "4"))
+# Writes waiting for the writer thread before new ones are turned away
+WRITE_QUEUE_SIZE = int(os.environ.get("TERRAN_WRITE_QUEUE_SIZE", "64"))
+# Seconds a write may wait for a queue slot
+WRITE_QUEUE_TIMEOUT = float(os.environ.get("TERRAN_WRITE_QUEUE_TIMEOUT", "2.0"))
+
+
+class WriteQueueFull(Exception):
+    """Raised when a write cannot be queued within WRITE_QUEUE_TIMEOUT"""
+
+
+class DatabasePool:
+    """Runs DatabaseManager calls off the event loop.
+
+    All writes go through one thread owning the only writing connection, so
+    they are applied in arrival order and never contend for SQLite's write
+    lock inside the service. Reads run on a pool of threads, each with its
+    own connection; WAL lets them proceed while a write commits.
+    """
+
+    def __init__(self, db_path=DB_PATH, readers=READER_THREADS,
+                 write_queue_size=WRITE_QUEUE_SIZE, write_timeout=WRITE_QUEUE_TIMEOUT):
+        self.db_path = db_path
+        self.write_timeout = write_timeout
+        self.readers = readers
+        self._local = threading.local()
+        self._writer = ThreadPoolExecutor(1, thread_name_prefix="db-writer")
+        self._readers = ThreadPoolExecutor(readers, thread_name_prefix="db-reader")
+        self._write_slots = asyncio.Semaphore(write_queue_size)
+        self.pending_writes = 0
+        self.pending_reads = 0
+
+        # The writer sets up the schema before any reader connects
+        self._writer.submit(self._manager, True).result()
+
+    def _manager(self, initialize=False):
+        manager = getattr(self._local, "manager", None)
+        if manager is None:
+            manager = DatabaseManager(self.db_path, initialize=initialize)
+            self._local.manager = manager
+        return manager
+
+    def _call(self, method, args, kwargs):
+        return metrics.call_with_metrics(self._manager(), method, args, kwargs)
+
+    async def read(self, method, *args, **kwargs):
+        """Call a read-only DatabaseManager method on a reader thread"""
+        self.pending_reads += 1
+        try:
+            loop = asyncio.get_running_loop()
+            return await loop.run_in_executor(
+                self._readers, functools.partial(self._call, method, args, kwargs)
+            )
+        finally:
+            self.pending_reads -= 1
+
+    async def write(self, method, *args, **kwargs):
+        """Queue a DatabaseManager call on the writer thread.
+
+        The queue is bounded so a burst of checkouts fails fast with
+        WriteQueueFull instead of piling up unbounded latency.
+        """
+        try:
+            await asyncio.wait_for(self._write_slots.acquire(), self.write_timeout)
+        except asyncio.TimeoutError:
+            metrics.WRITE_QUEUE_REJECTIONS.inc()
+            raise WriteQueueFull(f"Write queue full ({self.pending_writes} pending)")
+
+        self.pending_writes += 1
+        try:
+            loop = asyncio.get_running_loop()
+            return await loop.run_in_executor(
+                self._writer, functools.partial(self._call, method, args, kwargs)
+            )
+        finally:
+            self.pending_writes -= 1
+            self._write_slots.release()
+
+    def _close_local(self, barrier=None):
+        manager = getattr(self._local, "manager", None)
+        if manager is not None:
+            manager.close()
+            self._local.manager = None
+        if barrier is not None:
+            # Hold this thread until every reader thread has taken one close task
+            barrier.wait()
+
+    def close(self):
+        """Close every connection from the thread that opened it, then stop the threads"""
+        barrier = threading.Barrier(self.readers)
+        closing = [self._readers.submit(self._close_local, barrier) for _ in range(self.readers)]
+        for future in closing:
+            future.result()
+        self._writer.submit(self._close_local).result()
+        self._readers.shutdown(wait=True)
+        self._writer.shutdown(wait=True)
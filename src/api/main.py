@@ -1,11 +1,35 @@
-from fastapi import FastAPI
+import asyncio
+import logging
+from contextlib import asynccontextmanager
+from fastapi import FastAPI, Response
 from fastapi.middleware.cors import CORSMiddleware
 from prometheus_client import make_asgi_app
+from .database import DatabasePool
+from . import metrics
+from .routers import catalog, sales, stock, reports, sync
+
+logger = logging.getLogger('TerranPOS')
+
+# Seconds the health probe may wait for a reader thread
+HEALTH_TIMEOUT = 2.0
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # One pool per process: a single writer thread plus pooled readers
+    app.state.db = DatabasePool()
+    metrics.register_pool(app.state.db)
+    try:
+        yield
+    finally:
+        app.state.db.close()
+
 
 app = FastAPI(
-    title="Telegram Bot API",
-    description="API for managing Telegram bot with LLM integration",
-    version="1.0.0"
+    title="TerranPOS API",
+    description="Store database service shared by the tills on the local network",
+    version="1.0.0",
+    lifespan=lifespan
 )
 
 # CORS middleware
@@ -23,22 +47,38 @@ app.mount("/metrics", metrics_app)
 
 @app.get("/")
 async def root():
-    return {"message": "Telegram Bot API is running"}
+    return {"message": "TerranPOS API is running"}
 
 @app.get("/health")
-async def health_check():
+async def health_check(response: Response):
+    db = app.state.db
+    try:
+        probe = await asyncio.wait_for(db.read("check_health"), HEALTH_TIMEOUT)
+    except Exception as e:
+        logger.error(f"Health check failed: {str(e)}", exc_info=True)
+        response.status_code = 503
+        return {
+            "status": "unhealthy",
+            "version": "1.0.0",
+            "services": {"database": f"error: {str(e) or type(e).__name__}"}
+        }
+
     return {
         "status": "healthy",
         "version": "1.0.0",
-        "services": {
-            "database": "ok",
-            "redis": "ok",
-            "ollama": "ok"
+        "services": {"database": "ok"},
+        "database": {
+            **probe,
+            "size_bytes": metrics.file_size(db.db_path),
+            "wal_size_bytes": metrics.file_size(f"{db.db_path}-wal"),
+            "pending_writes": db.pending_writes,
+            "pending_reads": db.pending_reads
         }
     }
 
-# Import and include routers
-# from .routers import bot, chat, admin
-# app.include_router(bot.router)
-# app.include_router(chat.router)
-# app.include_router(admin.router) 
\ No newline at end of file
+# Include routers
+app.include_router(catalog.router)
+app.include_router(sales.router)
+app.include_router(stock.router)
+app.include_router(reports.router)
+app.include_router(sync.router)
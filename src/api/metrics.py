@@ -0,0 +1,87 @@
+import os
+import time
+from prometheus_client import Counter, Gauge, Histogram
+
+# Sub-millisecond buckets: most catalogue reads are served from the in-memory cache
+DB_LATENCY_BUCKETS = (0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01,
+                      0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0)
+ROW_BUCKETS = (0, 1, 5, 10, 50, 100, 500, 1000, 5000, 10000)
+
+# DatabaseManager methods that roll back their transaction when they raise
+TRANSACTIONAL_METHODS = {'create_sale', 'add_stock_receiving', 'reserve_stock',
+                         'record_synced_sales', 'apply_catalog_changes'}
+
+DB_CALL_SECONDS = Histogram(
+    'terran_db_call_seconds', 'DatabaseManager call latency', ['method'],
+    buckets=DB_LATENCY_BUCKETS
+)
+DB_ROWS_RETURNED = Histogram(
+    'terran_db_rows_returned', 'Rows returned by DatabaseManager calls', ['method'],
+    buckets=ROW_BUCKETS
+)
+DB_ERRORS = Counter('terran_db_errors_total', 'DatabaseManager calls that raised', ['method'])
+DB_ROLLBACKS = Counter('terran_db_rollbacks_total', 'Transactions rolled back', ['method'])
+
+SALES = Counter('terran_sales_total', 'Sales recorded', ['source'])
+SALE_ITEMS = Counter('terran_sale_items_total', 'Sale line items recorded', ['source'])
+INSUFFICIENT_STOCK = Counter('terran_insufficient_stock_total', 'Checkouts refused for insufficient stock')
+SYNC_CONFLICTS = Counter('terran_sync_conflicts_total', 'Synced till sales that oversold a product')
+WRITE_QUEUE_REJECTIONS = Counter('terran_write_queue_rejections_total', 'Writes refused because the queue was full')
+
+DB_SIZE = Gauge('terran_db_size_bytes', 'Size of the database file')
+DB_WAL_SIZE = Gauge('terran_db_wal_size_bytes', 'Size of the write-ahead log')
+PENDING_WRITES = Gauge('terran_db_pending_writes', 'Writes queued or running on the writer thread')
+PENDING_READS = Gauge('terran_db_pending_reads', 'Reads queued or running on the reader pool')
+READER_THREADS = Gauge('terran_db_reader_threads', 'Size of the reader pool')
+
+
+def file_size(path):
+    try:
+        return os.path.getsize(path)
+    except OSError:
+        return 0
+
+
+def register_pool(pool):
+    """Expose pool usage and database file sizes, sampled at scrape time"""
+    DB_SIZE.set_function(lambda: file_size(pool.db_path))
+    DB_WAL_SIZE.set_function(lambda: file_size(f"{pool.db_path}-wal"))
+    PENDING_WRITES.set_function(lambda: pool.pending_writes)
+    PENDING_READS.set_function(lambda: pool.pending_reads)
+    READER_THREADS.set(pool.readers)
+
+
+def row_count(result):
+    """Lists count their entries; a single row or value counts as one"""
+    if result is None:
+        return 0
+    if isinstance(result, list):
+        return len(result)
+    return 1
+
+
+def call_with_metrics(manager, method, args, kwargs):
+    """Call a DatabaseManager method, recording latency, rows and outcome"""
+    start = time.perf_counter()
+    try:
+        result = getattr(manager, method)(*args, **kwargs)
+    except Exception as e:
+        DB_CALL_SECONDS.labels(method).observe(time.perf_counter() - start)
+        DB_ERRORS.labels(method).inc()
+        if method in TRANSACTIONAL_METHODS:
+            DB_ROLLBACKS.labels(method).inc()
+        if isinstance(e, ValueError) and "Insufficient stock" in str(e):
+            INSUFFICIENT_STOCK.inc()
+        raise
+    DB_CALL_SECONDS.labels(method).observe(time.perf_counter() - start)
+    DB_ROWS_RETURNED.labels(method).observe(row_count(result))
+
+    if method == 'create_sale':
+        SALES.labels('till').inc()
+        SALE_ITEMS.labels('till').inc(len(args[0]))
+    elif method == 'record_synced_sales':
+        recorded = [entry for entry, outcome in zip(args[0], result) if not outcome['duplicate']]
+        SALES.labels('sync').inc(len(recorded))
+        SALE_ITEMS.labels('sync').inc(sum(len(entry['items']) for entry in recorded))
+        SYNC_CONFLICTS.inc(sum(1 for outcome in result if outcome['conflicts']))
+    return result
@@ -0,0 +1,14 @@
+from fastapi import HTTPException, Request
+from ..database import DatabasePool, WriteQueueFull
+
+
+def get_db(request: Request) -> DatabasePool:
+    return request.app.state.db
+
+
+async def write_or_503(db: DatabasePool, method, *args, **kwargs):
+    """Run a write, answering 503 when the write queue is saturated"""
+    try:
+        return await db.write(method, *args, **kwargs)
+    except WriteQueueFull as e:
+        raise HTTPException(status_code=503, detail=str(e), headers={"Retry-After": "1"})
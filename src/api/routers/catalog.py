@@ -0,0 +1,55 @@
+from typing import List, Optional
+from fastapi import APIRouter, Depends, HTTPException, Query
+from ..database import DatabasePool
+from ..schemas import Product, Category
+from . import get_db
+
+router = APIRouter(prefix="/catalog", tags=["catalog"])
+
+
+@router.get("/products", response_model=List[Product])
+async def search_products(q: str = "", category_id: Optional[int] = None,
+                          in_stock_only: bool = False, limit: int = Query(200, ge=1, le=1000),
+                          db: DatabasePool = Depends(get_db)):
+    products = await db.read("search_catalog", q, category_id, in_stock_only)
+    return [Product.from_row(row) for row in products[:limit]]
+
+
+@router.get("/products/by-code/{code}", response_model=Product)
+async def find_product_by_code(code: str, db: DatabasePool = Depends(get_db)):
+    product = await db.read("find_product_by_code", code)
+    if product is None:
+        raise HTTPException(status_code=404, detail=f"Unknown code: {code}")
+    return Product.from_row(product)
+
+
+@router.get("/products/{product_id}", response_model=Product)
+async def get_product(product_id: int, db: DatabasePool = Depends(get_db)):
+    product = await db.read("get_product", product_id)
+    if product is None:
+        raise HTTPException(status_code=404, detail="Product not found")
+    return Product.from_row(product)
+
+
+@router.get("/low-stock", response_model=List[Product])
+async def get_low_stock_products(db: DatabasePool = Depends(get_db)):
+    return [Product.from_row(row) for row in await db.read("get_low_stock_products")]
+
+
+@router.get("/categories", response_model=List[Category])
+async def get_categories(db: DatabasePool = Depends(get_db)):
+    categories = await db.read("get_all_categories")
+    return [Category(id=row[0], name=row[1], description=row[2]) for row in categories]
+
+
+@router.get("/available")
+async def available_to_sell(ids: List[int] = Query(...), till_id: Optional[str] = None,
+                            db: DatabasePool = Depends(get_db)):
+    """Stock each product has left once other tills' reservations are held back"""
+    available = await db.read("available_to_sell", ids, till_id)
+    return {str(product_id): quantity for product_id, quantity in available.items()}
+
+
+@router.get("/version")
+async def get_catalog_version(db: DatabasePool = Depends(get_db)):
+    return {"version": await db.read("get_catalog_version")}
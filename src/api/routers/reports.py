@@ -0,0 +1,29 @@
+from fastapi import APIRouter, Depends, HTTPException
+from ..database import DatabasePool
+from . import get_db
+
+router = APIRouter(prefix="/reports", tags=["reports"])
+
+
+@router.get("/sales")
+async def get_sales_report(start_date: str, end_date: str, db: DatabasePool = Depends(get_db)):
+    return await db.read("get_sales_report", start_date, end_date)
+
+
+@router.get("/inventory")
+async def get_inventory_report(db: DatabasePool = Depends(get_db)):
+    return await db.read("get_inventory_report")
+
+
+@router.get("/financial")
+async def get_financial_report(start_date: str, end_date: str, db: DatabasePool = Depends(get_db)):
+    return await db.read("get_financial_report", start_date, end_date)
+
+
+@router.get("/custom/{report_type}")
+async def get_custom_report(report_type: str, start_date: str, end_date: str,
+                            db: DatabasePool = Depends(get_db)):
+    try:
+        return await db.read("get_custom_report", report_type, start_date, end_date)
+    except ValueError as e:
+        raise HTTPException(status_code=404, detail=str(e))
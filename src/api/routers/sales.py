@@ -0,0 +1,58 @@
+from fastapi import APIRouter, Depends, HTTPException
+from ..database import DatabasePool
+from ..schemas import SaleCreate, Reservation
+from . import get_db, write_or_503
+
+router = APIRouter(prefix="/sales", tags=["sales"])
+
+
+@router.post("", status_code=201)
+async def create_sale(sale: SaleCreate, db: DatabasePool = Depends(get_db)):
+    items = [item.model_dump() for item in sale.items]
+    try:
+        sale_id = await write_or_503(
+            db, "create_sale", items, sale.client_name, sale.client_nif, till_id=sale.till_id
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=409, detail=str(e))
+    return {"sale_id": sale_id}
+
+
+@router.get("/{sale_id}")
+async def get_sale(sale_id: int, db: DatabasePool = Depends(get_db)):
+    rows = await db.read("get_sale_details", sale_id)
+    if not rows:
+        raise HTTPException(status_code=404, detail="Sale not found")
+    first = rows[0]
+    return {
+        "sale_id": first[0],
+        "client_name": first[1],
+        "nif": first[2],
+        "total_amount": first[3],
+        "created_at": first[4],
+        "items": [
+            {"quantity": row[5], "price": row[6], "product_name": row[7]}
+            for row in rows
+        ]
+    }
+
+
+@router.put("/reservations")
+async def reserve_stock(reservation: Reservation, db: DatabasePool = Depends(get_db)):
+    """Set a till's hold on a product; quantity 0 releases it"""
+    reserved = await write_or_503(
+        db, "reserve_stock", reservation.product_id, reservation.quantity, reservation.till_id
+    )
+    if not reserved:
+        raise HTTPException(status_code=409, detail="Not enough stock available")
+    return {"reserved": reservation.quantity}
+
+
+@router.post("/reservations/{till_id}/renew")
+async def renew_reservations(till_id: str, db: DatabasePool = Depends(get_db)):
+    return {"renewed": await write_or_503(db, "renew_reservations", till_id)}
+
+
+@router.delete("/reservations/{till_id}")
+async def release_reservations(till_id: str, db: DatabasePool = Depends(get_db)):
+    return {"released": await write_or_503(db, "release_reservations", till_id)}
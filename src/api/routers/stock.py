@@ -0,0 +1,59 @@
+from typing import List, Optional
+from fastapi import APIRouter, Depends, HTTPException, Query
+from ..database import DatabasePool
+from ..schemas import DeliveryCreate, StockReceipt, StockReceiptCreate
+from . import get_db, write_or_503
+
+router = APIRouter(prefix="/stock", tags=["stock"])
+
+
+@router.post("/receipts", response_model=StockReceipt, status_code=201)
+async def receive_stock(receipt: StockReceiptCreate, db: DatabasePool = Depends(get_db)):
+    try:
+        receipt_id = await write_or_503(
+            db, "add_stock_receiving",
+            receipt.product_id, receipt.supplier, receipt.quantity,
+            receipt.purchase_price, receipt.selling_price, receipt.notes
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return StockReceipt.from_row(await db.read("get_stock_receipt", receipt_id))
+
+
+@router.post("/deliveries", status_code=201)
+async def receive_delivery(delivery: DeliveryCreate, db: DatabasePool = Depends(get_db)):
+    """Receive every line of a supplier delivery in one transaction"""
+    try:
+        grn_id = await write_or_503(
+            db, "receive_delivery",
+            delivery.supplier, [line.model_dump() for line in delivery.lines],
+            delivery.reference, delivery.notes
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return {"grn_id": grn_id, "lines": len(delivery.lines)}
+
+
+@router.get("/receipts", response_model=List[StockReceipt])
+async def get_stock_history(product_id: Optional[int] = None,
+                            days: Optional[int] = Query(90, ge=1),
+                            before_received_at: Optional[str] = None,
+                            before_id: Optional[int] = None,
+                            limit: int = Query(200, ge=1, le=1000),
+                            db: DatabasePool = Depends(get_db)):
+    """Newest receipts first; pass the last row's received_at and id to get the next page"""
+    before = None
+    if before_received_at is not None and before_id is not None:
+        before = (before_received_at, before_id)
+    rows = await db.read(
+        "get_stock_history", product_id, before=before, limit=limit, days=days
+    )
+    return [StockReceipt.from_row(row) for row in rows]
+
+
+@router.get("/receipts/{receipt_id}", response_model=StockReceipt)
+async def get_stock_receipt(receipt_id: int, db: DatabasePool = Depends(get_db)):
+    row = await db.read("get_stock_receipt", receipt_id)
+    if row is None:
+        raise HTTPException(status_code=404, detail="Receipt not found")
+    return StockReceipt.from_row(row)
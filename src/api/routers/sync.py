@@ -0,0 +1,28 @@
+from fastapi import APIRouter, Depends, Query
+from ..database import DatabasePool
+from ..schemas import Category, Product, SyncBatch
+from . import get_db, write_or_503
+
+router = APIRouter(prefix="/sync", tags=["sync"])
+
+
+@router.post("/sales")
+async def push_sales(batch: SyncBatch, db: DatabasePool = Depends(get_db)):
+    """Record a batch of journaled till sales; replays of a key return the original sale"""
+    entries = [sale.model_dump() for sale in batch.sales]
+    return {"results": await write_or_503(db, "record_synced_sales", entries)}
+
+
+@router.get("/catalog")
+async def pull_catalog(since: int = Query(0, ge=0), limit: int = Query(500, ge=1, le=5000),
+                       db: DatabasePool = Depends(get_db)):
+    """Products changed after the ``since`` version cursor, with their categories"""
+    changes = await db.read("get_catalog_changes", since, limit)
+    return {
+        "version": changes['version'],
+        "products": [Product.from_row(row) for row in changes['products']],
+        "categories": [Category(id=row[0], name=row[1], description=row[2])
+                       for row in changes['categories']],
+        "removed": changes['removed'],
+        "more": changes['more']
+    }
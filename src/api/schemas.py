@@ -0,0 +1,109 @@
+from typing import List, Optional
+from pydantic import BaseModel, Field
+
+
+class Product(BaseModel):
+    id: int
+    name: str
+    category_id: Optional[int] = None
+    category: Optional[str] = None
+    quantity: int
+    price: float
+    alert_threshold: Optional[int] = None
+    description: Optional[str] = None
+    barcode: Optional[str] = None
+    updated_at: Optional[str] = None
+
+    @classmethod
+    def from_row(cls, row):
+        """Build from a "SELECT i.*, c.name" product row"""
+        return cls(
+            id=row[0], name=row[1], category_id=row[2], quantity=row[3], price=row[4],
+            alert_threshold=row[5], description=row[6], updated_at=row[8],
+            barcode=row[9], category=row[-1]
+        )
+
+
+class Category(BaseModel):
+    id: int
+    name: str
+    description: Optional[str] = None
+
+
+class SaleItem(BaseModel):
+    id: int
+    quantity: int = Field(gt=0)
+    price: float = Field(ge=0)
+    name: Optional[str] = None
+
+
+class SaleCreate(BaseModel):
+    till_id: str
+    items: List[SaleItem] = Field(min_length=1)
+    client_name: Optional[str] = None
+    client_nif: Optional[str] = None
+
+
+class Reservation(BaseModel):
+    till_id: str
+    product_id: int
+    quantity: int = Field(ge=0)
+
+
+class StockReceiptCreate(BaseModel):
+    product_id: int
+    supplier: Optional[str] = None
+    quantity: int = Field(gt=0)
+    purchase_price: float = Field(ge=0)
+    selling_price: float = Field(ge=0)
+    notes: Optional[str] = None
+
+
+class DeliveryLine(BaseModel):
+    product_id: int
+    quantity: int = Field(gt=0)
+    purchase_price: float = Field(ge=0)
+    selling_price: Optional[float] = Field(default=None, ge=0)
+    notes: Optional[str] = None
+
+
+class DeliveryCreate(BaseModel):
+    """A goods received note; lines without a selling price keep the current price"""
+    supplier: Optional[str] = None
+    reference: Optional[str] = None
+    notes: Optional[str] = None
+    lines: List[DeliveryLine] = Field(min_length=1)
+
+
+class StockReceipt(BaseModel):
+    id: int
+    product_id: int
+    supplier: Optional[str] = None
+    quantity: int
+    purchase_price: float
+    selling_price: float
+    notes: Optional[str] = None
+    received_at: str
+    product_name: str
+
+    @classmethod
+    def from_row(cls, row):
+        """Build from a get_stock_history row"""
+        return cls(
+            id=row[0], product_id=row[1], supplier=row[2], quantity=row[3],
+            purchase_price=row[4], selling_price=row[5], notes=row[6],
+            received_at=row[7], product_name=row[-1]
+        )
+
+
+class JournaledSale(BaseModel):
+    idempotency_key: str
+    till_id: str
+    items: List[SaleItem] = Field(min_length=1)
+    client_name: Optional[str] = None
+    client_nif: Optional[str] = None
+    created_at: Optional[str] = None
+
+
+class SyncBatch(BaseModel):
+    sales: List[JournaledSale] = Field(max_length=500)
@@ -0,0 +1,259 @@
+import logging
+import weakref
+from .search_index import PrefixIndex
+
+logger = logging.getLogger('TerranPOS')
+
+# Column positions of a product row as returned by "SELECT i.*, c.name"
+PRODUCT_ID = 0
+PRODUCT_NAME = 1
+PRODUCT_CATEGORY_ID = 2
+PRODUCT_QUANTITY = 3
+PRODUCT_PRICE = 4
+PRODUCT_ALERT_THRESHOLD = 5
+PRODUCT_BARCODE = 9
+
+
+class CatalogCache:
+    """In-memory copy of the product catalogue and category list.
+
+    Products are keyed by ID with secondary indexes by category, lower-cased
+    name, barcode and a word-prefix trie used by the POS search. Every
+    applied change bumps ``version`` and is pushed to subscribers as a delta
+    so open windows can patch their views instead of reloading the whole
+    catalogue.
+    """
+
+    def __init__(self):
+        self.version = 0
+        self.loaded = False
+        self._products = {}
+        self._by_category = {}
+        self._by_name = {}
+        self._search_keys = {}
+        self._low_stock = set()
+        self._by_barcode = {}
+        self._prefix_index = PrefixIndex()
+        self._ordered = None
+        self._categories = None
+        self._listeners = []
+
+    # Loading
+    def load(self, products):
+        """Replace the cached catalogue with a full product list."""
+        self._products = {}
+        self._by_category = {}
+        self._by_name = {}
+        self._search_keys = {}
+        self._low_stock = set()
+        self._by_barcode = {}
+        self._prefix_index.clear()
+        for product in products:
+            self._index(product)
+        self._ordered = list(products)
+        self.loaded = True
+
+    def reset(self):
+        """Drop everything so the next read reloads from the database."""
+        self.loaded = False
+        self._products = {}
+        self._by_category = {}
+        self._by_name = {}
+        self._search_keys = {}
+        self._low_stock = set()
+        self._by_barcode = {}
+        self._prefix_index.clear()
+        self._ordered = None
+        self._categories = None
+        self.version += 1
+        self._notify({'version': self.version, 'changed': [], 'removed': [], 'reset': True})
+
+    def _index(self, product, index_text=True):
+        product_id = product[PRODUCT_ID]
+        self._products[product_id] = product
+        self._by_category.setdefault(product[PRODUCT_CATEGORY_ID], set()).add(product_id)
+        self._by_name.setdefault(product[PRODUCT_NAME].lower(), set()).add(product_id)
+        self._search_keys[product_id] = self.search_key(product)
+        if product[PRODUCT_QUANTITY] <= product[PRODUCT_ALERT_THRESHOLD]:
+            self._low_stock.add(product_id)
+        barcode = product[PRODUCT_BARCODE]
+        if barcode:
+            self._by_barcode[barcode] = product_id
+        if index_text:
+            self._prefix_index.add(product_id, f"{product[PRODUCT_NAME]} {barcode or ''}")
+
+    def _unindex(self, product_id, index_text=True):
+        product = self._products.pop(product_id, None)
+        if product is None:
+            return None
+        ids = self._by_category.get(product[PRODUCT_CATEGORY_ID])
+        if ids is not None:
+            ids.discard(product_id)
+            if not ids:
+                del self._by_category[product[PRODUCT_CATEGORY_ID]]
+        name_key = product[PRODUCT_NAME].lower()
+        ids = self._by_name.get(name_key)
+        if ids is not None:
+            ids.discard(product_id)
+            if not ids:
+                del self._by_name[name_key]
+        self._search_keys.pop(product_id, None)
+        self._low_stock.discard(product_id)
+        barcode = product[PRODUCT_BARCODE]
+        if barcode and self._by_barcode.get(barcode) == product_id:
+            del self._by_barcode[barcode]
+        if index_text:
+            self._prefix_index.remove(product_id)
+        return product
+
+    @staticmethod
+    def search_key(product):
+        """Lower-cased text searched by the inventory filter: name, category, quantity and price"""
+        return "\x00".join((
+            product[PRODUCT_NAME],
+            product[-1] or "",
+            str(product[PRODUCT_QUANTITY]),
+            f"${product[PRODUCT_PRICE]:.2f}"
+        )).lower()
+
+    # Reads
+    def get(self, product_id):
+        return self._products.get(product_id)
+
+    def all(self):
+        """Return all products ordered by name."""
+        if self._ordered is None:
+            self._ordered = sorted(self._products.values(), key=lambda p: p[PRODUCT_NAME])
+        return list(self._ordered)
+
+    def by_category(self, category_id):
+        ids = self._by_category.get(category_id, ())
+        return sorted((self._products[i] for i in ids), key=lambda p: p[PRODUCT_NAME])
+
+    def by_name(self, name):
+        ids = self._by_name.get(name.lower(), ())
+        return [self._products[i] for i in ids]
+
+    def low_stock(self):
+        return sorted((self._products[i] for i in self._low_stock), key=lambda p: p[PRODUCT_NAME])
+
+    def filter(self, search_text='', category_id=None, low_stock_only=False):
+        """Return products matching all given filters, ordered by name.
+
+        The category and low-stock indexes narrow the candidates first so
+        the text match only runs over their precomputed search keys.
+        """
+        candidates = None
+        if category_id is not None:
+            candidates = self._by_category.get(category_id, set())
+        if low_stock_only:
+            candidates = self._low_stock if candidates is None else candidates & self._low_stock
+
+        if candidates is None:
+            products = self.all()
+        else:
+            products = sorted((self._products[i] for i in candidates), key=lambda p: p[PRODUCT_NAME])
+
+        search_text = search_text.lower()
+        if search_text:
+            keys = self._search_keys
+            products = [p for p in products if search_text in keys[p[PRODUCT_ID]]]
+        return products
+
+    def matches(self, product, search_text='', category_id=None, low_stock_only=False):
+        """Check a single product against the same filters as filter()"""
+        if category_id is not None and product[PRODUCT_CATEGORY_ID] != category_id:
+            return False
+        if low_stock_only and product[PRODUCT_QUANTITY] > product[PRODUCT_ALERT_THRESHOLD]:
+            return False
+        return not search_text or search_text.lower() in self.search_key(product)
+
+    def search(self, query='', category_id=None, in_stock_only=False):
+        """Word-prefix search used by the POS, ordered by name"""
+        ids = self._prefix_index.search(query)
+        if ids is None:
+            if category_id is not None:
+                return [p for p in self.by_category(category_id)
+                        if not in_stock_only or p[PRODUCT_QUANTITY] > 0]
+            products = self.all()
+        else:
+            if category_id is not None:
+                ids = ids & self._by_category.get(category_id, set())
+            products = sorted((self._products[i] for i in ids), key=lambda p: p[PRODUCT_NAME])
+        if in_stock_only:
+            products = [p for p in products if p[PRODUCT_QUANTITY] > 0]
+        return products
+
+    def by_code(self, code):
+        """Exact match on barcode, falling back to the numeric product ID"""
+        code = (code or "").strip()
+        product_id = self._by_barcode.get(code)
+        if product_id is None and code.isdigit():
+            product_id = int(code)
+        return self._products.get(product_id)
+
+    def categories(self):
+        return self._categories
+
+    def set_categories(self, categories):
+        self._categories = list(categories)
+
+    def invalidate_categories(self):
+        self._categories = None
+
+    # Changes
+    def apply(self, changed=(), removed=()):
+        """Apply changed product rows and removed IDs, then notify subscribers."""
+        changed = list(changed)
+        removed = [product_id for product_id in removed if product_id in self._products]
+        if not changed and not removed:
+            return None
+
+        for product_id in removed:
+            self._unindex(product_id)
+        for product in changed:
+            # Stock and price changes leave the prefix index entries as they were
+            old = self._products.get(product[PRODUCT_ID])
+            index_text = (old is None or old[PRODUCT_NAME] != product[PRODUCT_NAME]
+                          or old[PRODUCT_BARCODE] != product[PRODUCT_BARCODE])
+            self._unindex(product[PRODUCT_ID], index_text)
+            self._index(product, index_text)
+        self._ordered = None
+
+        self.version += 1
+        delta = {
+            'version': self.version,
+            'changed': changed,
+            'removed': removed,
+            'reset': False
+        }
+        self._notify(delta)
+        return delta
+
+    # Subscriptions
+    def subscribe(self, callback):
+        """Register a callback receiving delta dicts.
+
+        Bound methods are held weakly so a closed window that forgot to
+        unsubscribe does not keep receiving notifications.
+        """
+        if hasattr(callback, '__self__'):
+            ref = weakref.WeakMethod(callback)
+        else:
+            ref = lambda: callback
+        self._listeners.append(ref)
+
+    def unsubscribe(self, callback):
+        self._listeners = [ref for ref in self._listeners
+                           if ref() is not None and ref() != callback]
+
+    def _notify(self, delta):
+        for ref in list(self._listeners):
+            callback = ref()
+            if callback is None:
+                continue
+            try:
+                callback(delta)
+            except Exception as e:
+                logger.error(f"Error in catalog listener: {str(e)}", exc_info=True)
+        self._listeners = [ref for ref in self._listeners if ref() is not None]
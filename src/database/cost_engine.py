@@ -0,0 +1,154 @@
+import json
+import logging
+from collections import deque
+from .money import round_cents
+from .queries import QUERIES
+from .timeutil import from_epoch
+
+logger = logging.getLogger('TerranPOS')
+
+# Costing methods a store can report margins with, and the sale_items column holding each
+COST_METHODS = {'fifo': 'cost_fifo_cents', 'average': 'cost_average_cents'}
+DEFAULT_COST_METHOD = 'fifo'
+
+
+def consume_layers(layers, quantity, average_cost):
+    """FIFO cost in cents of taking quantity units out of layers.
+
+    layers yields (layer_id, remaining, unit_cost_cents) oldest first. Returns
+    (cost, [(remaining_after, layer_id), ...]) for the layers touched. Units
+    beyond the layered stock (opening stock, imports) are costed at the
+    moving average; with no cost known at all the cost is None.
+    """
+    cost = 0
+    updates = []
+    left = quantity
+    for layer_id, remaining, unit_cost in layers:
+        if left <= 0:
+            break
+        taken = min(left, remaining)
+        cost += taken * unit_cost
+        left -= taken
+        updates.append((remaining - taken, layer_id))
+    if left > 0:
+        if average_cost is None:
+            return None, updates
+        cost += left * average_cost
+    return round_cents(cost), updates
+
+
+class CostEngine:
+    """Keeps per-product cost layers up to date as stock comes in and goes out.
+
+    Each receipt adds a FIFO layer and folds its price into the product's
+    moving average; each sale line consumes layers oldest first and stores
+    its cost of goods under both methods on the sale_items row. Everything
+    runs on the caller's cursor, inside the transaction that moves the
+    stock, so margin reports only sum stored values.
+    """
+
+    def record_receipts(self, cursor, receipt_ids):
+        """Add cost layers for stock_receiving rows already inserted"""
+        if not receipt_ids:
+            return
+        ids = json.dumps(list(receipt_ids))
+        cursor.execute(QUERIES.sql("costs.add_layers"), (ids,))
+        cursor.execute(QUERIES.sql("costs.fold_average"), (ids,))
+
+    def cost_lines(self, cursor, lines):
+        """Consume layers for sale lines about to be inserted.
+
+        lines are (product_id, quantity) pairs; returns the (cost_fifo,
+        cost_average) of each, to be stored on its sale_items row.
+        """
+        costs = []
+        for product_id, quantity in lines:
+            cursor.execute(QUERIES.sql("costs.product_average"), (product_id,))
+            row = cursor.fetchone()
+            average_cost = row[0] if row else None
+
+            cursor.execute(QUERIES.sql("costs.open_layers"), (product_id,))
+            fifo_cost, updates = consume_layers(cursor, quantity, average_cost)
+            if updates:
+                cursor.executemany(QUERIES.sql("costs.update_layer"), updates)
+            if row:
+                cursor.execute(QUERIES.sql("costs.take_average"), (quantity, product_id))
+
+            average_total = None
+            if average_cost is not None:
+                average_total = round_cents(quantity * average_cost)
+            costs.append((fifo_cost, average_total))
+        return costs
+
+    def rebuild(self, conn):
+        """Recompute every layer and sale line cost by replaying history in time order.
+
+        For databases that had receipts and sales before costs were kept,
+        or after bulk loads that bypass the engine. Stock sent to other
+        stores takes its layers like a sale does. Returns the number of
+        sale lines costed.
+        """
+        layers = {}
+        averages = {}
+        all_layers = []
+        line_costs = []
+        cursor = conn.cursor()
+        cursor.execute(QUERIES.sql("costs.history"))
+        for kind, row_id, product_id, quantity, unit_cost, at in cursor:
+            if kind == 0:
+                layer = [row_id, product_id, quantity, quantity, unit_cost, at]
+                all_layers.append(layer)
+                layers.setdefault(product_id, deque()).append(layer)
+                on_hand, average_cost = averages.get(product_id, (0, 0.0))
+                averages[product_id] = (
+                    on_hand + quantity,
+                    (on_hand * average_cost + quantity * unit_cost) / (on_hand + quantity)
+                )
+                continue
+
+            queue = layers.get(product_id, ())
+            on_hand, average_cost = averages.get(product_id, (0, None))
+            fifo_cost, updates = consume_layers(
+                ((layer, layer[3], layer[4]) for layer in queue), quantity, average_cost
+            )
+            for remaining, layer in updates:
+                layer[3] = remaining
+            while queue and queue[0][3] == 0:
+                queue.popleft()
+            if product_id in averages:
+                averages[product_id] = (max(on_hand - quantity, 0), average_cost)
+            if kind == 2:
+                # Sent to another store: consumes layers but is not a sale line
+                continue
+            line_costs.append((
+                fifo_cost,
+                round_cents(quantity * average_cost) if average_cost is not None else None,
+                row_id
+            ))
+
+        try:
+            cursor.execute("BEGIN IMMEDIATE")
+            cursor.execute("DELETE FROM cost_layers")
+            cursor.execute("DELETE FROM product_costs")
+            cursor.executemany(
+                """INSERT INTO cost_layers
+                   (receipt_id, product_id, quantity, remaining, unit_cost_cents, received_at)
+                   VALUES (?, ?, ?, ?, ?, ?)""",
+                # received_at holds the receipt's timestamp text, as costs.add_layers writes it
+                [(*layer[:5], from_epoch(layer[5])) for layer in all_layers]
+            )
+            cursor.executemany(
+                """INSERT INTO product_costs (product_id, quantity, average_cost_cents)
+                   VALUES (?, ?, ?)""",
+                [(product_id, on_hand, average_cost)
+                 for product_id, (on_hand, average_cost) in averages.items()]
+            )
+            cursor.executemany(QUERIES.sql("costs.set_line_cost"), line_costs)
+            conn.commit()
+        except Exception as e:
+            conn.rollback()
+            logger.error(f"Error rebuilding cost layers: {str(e)}", exc_info=True)
+            raise
+        logger.info(f"Rebuilt {len(all_layers)} cost layers and {len(line_costs)} sale line costs")
+        return len(line_costs)
+
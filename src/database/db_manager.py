@@ -1,18 +1,109 @@
 import sqlite3
-from datetime import datetime
+from datetime import datetime, timedelta
 from pathlib import Path
 import shutil
 import hashlib
 import logging
+import os
+import socket
+import json
+import uuid
+import time
+from .catalog_cache import CatalogCache
+from .cost_engine import CostEngine, COST_METHODS, DEFAULT_COST_METHOD
+from .federation import federated_report
+from .stock_ledger import StockLedger, BACKFILLED_SETTING, RECEIVED_KINDS, SOLD_KINDS
+from .transfer_engine import TransferEngine
+from .money import Money, round_cents, to_cents, to_units
+from .timeutil import SECONDS_PER_DAY, epoch_range, from_epoch, now_epoch, to_epoch
+from .query_profiler import QUERY_PROFILER, ProfilingConnection
+from .queries import IDS_PARAM, QUERIES, STATEMENT_CACHE_SIZE
 
 logger = logging.getLogger('TerranPOS')
 
+# Stock history returned when no explicit start date is given
+STOCK_HISTORY_WINDOW_DAYS = 90
+
+# Cart holds lapse after this long unless the till renews them
+RESERVATION_TTL_SECONDS = 300
+# How long a connection waits for another till's write lock before failing
+BUSY_TIMEOUT_MS = 5000
+# Tills synced to a central server take their catalogue from it; products there are
+# identified by the server's IDs, which the till's sales are pushed with
+SYNCED_TILL_MESSAGE = "Products are managed on the central server for a synced till"
+# Rows fetched at a time when a report is streamed rather than loaded whole
+REPORT_BATCH_SIZE = 500
+# Products changed by another connection above which the catalogue cache is reloaded whole
+CATALOG_DELTA_LIMIT = 500
+
+# Money is stored in integer cents; each cents column with the REAL column it was
+# migrated from, which is still written for older readers
+MONEY_COLUMNS = {
+    'inventory': [('price_cents', 'price')],
+    'goods_received_notes': [('total_cost_cents', 'total_cost')],
+    'stock_receiving': [('purchase_price_cents', 'purchase_price'),
+                        ('selling_price_cents', 'selling_price')],
+    'sales': [('total_cents', 'total_amount')],
+    'sale_items': [('price_cents', 'price_at_sale')],
+}
+# Time-series tables also store integer epoch seconds, indexed for range scans; each
+# epoch column with the CURRENT_TIMESTAMP text column it was migrated from
+EPOCH_COLUMNS = {
+    'sales': [('created_epoch', 'created_at')],
+    'stock_receiving': [('received_epoch', 'received_at')],
+    'user_activity_log': [('timestamp_epoch', 'timestamp')],
+    'user_sessions': [('last_activity_epoch', 'last_activity')],
+}
+
 class DatabaseManager:
-    def __init__(self):
-        self.db_path = Path("data/pos.db")
+    def __init__(self, db_path="data/pos.db", initialize: bool = True,
+                 cached_statements: int = STATEMENT_CACHE_SIZE):
+        """Open the store database.
+
+        Extra connections to an already set-up database (e.g. API reader
+        threads) pass initialize=False to skip the schema and seed writes.
+        cached_statements is how many compiled statements the connection
+        keeps; it should hold every registered query variant.
+        """
+        self.db_path = Path(db_path)
         self.db_path.parent.mkdir(parents=True, exist_ok=True)
-        self.conn = sqlite3.connect(str(self.db_path))
-        self.create_tables()
+        self.cached_statements = cached_statements
+        # Statement timings from every connection, viewable from the admin menu
+        self.profiler = QUERY_PROFILER
+        self.conn = self._connect()
+        self.catalog = CatalogCache()
+        self.costs = CostEngine()
+        self.transfers = TransferEngine(self)
+        self.ledger = StockLedger()
+        self._data_version = None
+        self._catalog_version = None
+        # Identifies this till's stock reservations
+        self.till_id = f"{socket.gethostname()}:{os.getpid()}"
+        if initialize:
+            self.create_tables()
+            self.purge_expired_reservations()
+            # Once per database, for one whose stock changed before the ledger was kept
+            if self.get_setting(BACKFILLED_SETTING) != '1':
+                self.backfill_stock_ledger()
+            if self.ledger.snapshot_due(self.conn.cursor()):
+                self.take_stock_snapshot()
+        # Tills synced to a central server journal every sale for the sync worker
+        self.outbox_enabled = bool(self.get_setting('sync_server_url'))
+        if self.get_setting('profile_queries') == '1':
+            self.profiler.enabled = True
+        slow_query_ms = self.get_setting('slow_query_ms')
+        if slow_query_ms:
+            self.profiler.threshold_ms = float(slow_query_ms)
+
+    def _connect(self):
+        """Open a connection set up for several tills sharing the database file"""
+        conn = sqlite3.connect(str(self.db_path), timeout=BUSY_TIMEOUT_MS / 1000,
+                               factory=ProfilingConnection,
+                               cached_statements=self.cached_statements)
+        # WAL lets tills read while another one is committing a sale
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute(f"PRAGMA busy_timeout={BUSY_TIMEOUT_MS}")
+        return conn
 
     def create_tables(self):
         cursor = self.conn.cursor()
@@ -48,9 +139,35 @@ class DatabaseManager:
                 description TEXT,
                 created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
                 updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                barcode TEXT,
+                price_cents INTEGER,
                 FOREIGN KEY (category_id) REFERENCES categories (id)
             )
         ''')
+        self._add_missing_columns(cursor, 'inventory', [('barcode', 'TEXT'),
+                                                        ('price_cents', 'INTEGER')])
+        cursor.execute(
+            "CREATE UNIQUE INDEX IF NOT EXISTS idx_inventory_barcode "
+            "ON inventory (barcode) WHERE barcode IS NOT NULL"
+        )
+
+        # Create goods_received_notes table: one row per supplier delivery
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS goods_received_notes (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                supplier TEXT,
+                reference TEXT,
+                notes TEXT,
+                line_count INTEGER NOT NULL,
+                total_quantity INTEGER NOT NULL,
+                total_cost REAL NOT NULL,
+                received_by INTEGER,
+                received_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                total_cost_cents INTEGER,
+                FOREIGN KEY (received_by) REFERENCES users (id)
+            )
+        ''')
+        self._add_missing_columns(cursor, 'goods_received_notes', [('total_cost_cents', 'INTEGER')])
 
         # Create stock_receiving table
         cursor.execute('''
@@ -63,9 +180,51 @@ class DatabaseManager:
                 selling_price REAL NOT NULL,
                 notes TEXT,
                 received_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                grn_id INTEGER,
+                purchase_price_cents INTEGER,
+                selling_price_cents INTEGER,
+                received_epoch INTEGER,
+                FOREIGN KEY (product_id) REFERENCES inventory (id),
+                FOREIGN KEY (grn_id) REFERENCES goods_received_notes (id)
+            )
+        ''')
+        self._add_missing_columns(cursor, 'stock_receiving', [('grn_id', 'INTEGER'),
+                                                              ('purchase_price_cents', 'INTEGER'),
+                                                              ('selling_price_cents', 'INTEGER'),
+                                                              ('received_epoch', 'INTEGER')])
+        cursor.execute(
+            "CREATE INDEX IF NOT EXISTS idx_stock_receiving_grn "
+            "ON stock_receiving (grn_id) WHERE grn_id IS NOT NULL"
+        )
+        # History is filtered and paged on the epoch column; the text indexes are superseded
+        cursor.execute("DROP INDEX IF EXISTS idx_stock_receiving_received_at")
+        cursor.execute("DROP INDEX IF EXISTS idx_stock_receiving_product_received_at")
+        cursor.execute(
+            "CREATE INDEX IF NOT EXISTS idx_stock_receiving_received_epoch "
+            "ON stock_receiving (received_epoch)"
+        )
+        cursor.execute(
+            "CREATE INDEX IF NOT EXISTS idx_stock_receiving_product_received_epoch "
+            "ON stock_receiving (product_id, received_epoch)"
+        )
+
+        # Create stock_reservations table: short-lived holds on stock sitting in till carts
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS stock_reservations (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                till_id TEXT NOT NULL,
+                product_id INTEGER NOT NULL,
+                quantity INTEGER NOT NULL,
+                expires_at TIMESTAMP NOT NULL,
+                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                UNIQUE (till_id, product_id),
                 FOREIGN KEY (product_id) REFERENCES inventory (id)
             )
         ''')
+        cursor.execute(
+            "CREATE INDEX IF NOT EXISTS idx_stock_reservations_product_expires "
+            "ON stock_reservations (product_id, expires_at)"
+        )
 
         # Create sales table with client information
         cursor.execute('''
@@ -74,9 +233,18 @@ class DatabaseManager:
                 client_name TEXT,
                 nif TEXT,
                 total_amount REAL NOT NULL,
-                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                total_cents INTEGER,
+                created_epoch INTEGER
             )
         ''')
+        self._add_missing_columns(cursor, 'sales', [('total_cents', 'INTEGER'),
+                                                    ('created_epoch', 'INTEGER')])
+        # Covers the daily summary, which only needs the time and the total
+        cursor.execute(
+            "CREATE INDEX IF NOT EXISTS idx_sales_created_epoch "
+            "ON sales (created_epoch, total_cents)"
+        )
 
         # Create sale_items table for individual items in a sale
         cursor.execute('''
@@ -86,10 +254,251 @@ class DatabaseManager:
                 product_id INTEGER,
                 quantity INTEGER NOT NULL,
                 price_at_sale REAL NOT NULL,
+                cost_fifo_cents INTEGER,
+                cost_average_cents INTEGER,
+                price_cents INTEGER,
                 FOREIGN KEY (sale_id) REFERENCES sales (id),
                 FOREIGN KEY (product_id) REFERENCES inventory (id)
             )
         ''')
+        # Cost of goods for the whole line under each costing method, NULL when unknown
+        self._add_missing_columns(cursor, 'sale_items', [('cost_fifo_cents', 'INTEGER'),
+                                                         ('cost_average_cents', 'INTEGER'),
+                                                         ('price_cents', 'INTEGER')])
+        # Reports reach the lines of a date range of sales through this
+        cursor.execute(
+            "CREATE INDEX IF NOT EXISTS idx_sale_items_sale ON sale_items (sale_id)"
+        )
+
+        # Create cost_layers table: FIFO queue of received stock not yet sold, per product
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS cost_layers (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                receipt_id INTEGER NOT NULL,
+                product_id INTEGER NOT NULL,
+                quantity INTEGER NOT NULL,
+                remaining INTEGER NOT NULL,
+                unit_cost_cents INTEGER NOT NULL,
+                received_at TIMESTAMP,
+                FOREIGN KEY (receipt_id) REFERENCES stock_receiving (id),
+                FOREIGN KEY (product_id) REFERENCES inventory (id)
+            )
+        ''')
+        cursor.execute(
+            "CREATE INDEX IF NOT EXISTS idx_cost_layers_open "
+            "ON cost_layers (product_id, id) WHERE remaining > 0"
+        )
+
+        # Create product_costs table: moving average cost of the costed stock on hand,
+        # in fractional cents
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS product_costs (
+                product_id INTEGER PRIMARY KEY,
+                quantity INTEGER NOT NULL,
+                average_cost_cents REAL NOT NULL,
+                updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                FOREIGN KEY (product_id) REFERENCES inventory (id)
+            )
+        ''')
+
+        # Create sales_outbox table: sales journaled locally, waiting to be pushed to the server
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS sales_outbox (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                idempotency_key TEXT NOT NULL UNIQUE,
+                sale_id INTEGER NOT NULL,
+                payload TEXT NOT NULL,
+                attempts INTEGER DEFAULT 0,
+                last_error TEXT,
+                server_sale_id INTEGER,
+                synced_at TIMESTAMP,
+                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                FOREIGN KEY (sale_id) REFERENCES sales (id)
+            )
+        ''')
+        cursor.execute(
+            "CREATE INDEX IF NOT EXISTS idx_sales_outbox_pending "
+            "ON sales_outbox (id) WHERE synced_at IS NULL"
+        )
+
+        # Create receipt_spool table: receipts waiting for the receipt printer
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS receipt_spool (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                sale_id INTEGER NOT NULL,
+                target TEXT NOT NULL,
+                payload TEXT NOT NULL,
+                attempts INTEGER DEFAULT 0,
+                last_error TEXT,
+                printed_at TIMESTAMP,
+                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                FOREIGN KEY (sale_id) REFERENCES sales (id)
+            )
+        ''')
+        cursor.execute(
+            "CREATE INDEX IF NOT EXISTS idx_receipt_spool_pending "
+            "ON receipt_spool (id) WHERE printed_at IS NULL"
+        )
+
+        # Create locations table: the stores a head office reports over, each with its own database file
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS locations (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                code TEXT NOT NULL UNIQUE,
+                name TEXT NOT NULL,
+                db_path TEXT NOT NULL,
+                active INTEGER DEFAULT 1,
+                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+            )
+        ''')
+
+        # Create stock_movements table: append-only ledger of stock moved in and out of the store
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS stock_movements (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                product_id INTEGER NOT NULL,
+                kind TEXT NOT NULL,
+                quantity INTEGER NOT NULL,
+                reference TEXT,
+                cost_cents INTEGER,
+                created_epoch INTEGER NOT NULL,
+                FOREIGN KEY (product_id) REFERENCES inventory (id)
+            )
+        ''')
+        cursor.execute(
+            "CREATE INDEX IF NOT EXISTS idx_stock_movements_product "
+            "ON stock_movements (product_id, id)"
+        )
+        # Point-in-time stock replays the movements between two moments
+        cursor.execute(
+            "CREATE INDEX IF NOT EXISTS idx_stock_movements_epoch "
+            "ON stock_movements (created_epoch, product_id, kind, quantity)"
+        )
+        # A transfer is applied to a store at most once per direction
+        cursor.execute(
+            "CREATE UNIQUE INDEX IF NOT EXISTS idx_stock_movements_reference "
+            "ON stock_movements (reference, kind, product_id) WHERE reference IS NOT NULL"
+        )
+        for action in ("UPDATE", "DELETE"):
+            cursor.execute(f'''
+                CREATE TRIGGER IF NOT EXISTS stock_movements_no_{action.lower()}
+                BEFORE {action} ON stock_movements
+                BEGIN
+                    SELECT RAISE(ABORT, 'stock_movements is append-only');
+                END
+            ''')
+
+        # Create stock snapshot tables: every product's quantity at a moment, taken periodically
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS stock_snapshots (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                snapshot_epoch INTEGER NOT NULL UNIQUE,
+                product_count INTEGER NOT NULL,
+                total_quantity INTEGER NOT NULL,
+                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+            )
+        ''')
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS stock_snapshot_lines (
+                snapshot_id INTEGER NOT NULL,
+                product_id INTEGER NOT NULL,
+                quantity INTEGER NOT NULL,
+                unit_cost_cents REAL,
+                PRIMARY KEY (snapshot_id, product_id),
+                FOREIGN KEY (snapshot_id) REFERENCES stock_snapshots (id)
+            ) WITHOUT ROWID
+        ''')
+
+        # Create transfers tables: stock moved between stores, tracked by the head office
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS transfers (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                transfer_key TEXT NOT NULL UNIQUE,
+                from_location TEXT NOT NULL,
+                to_location TEXT NOT NULL,
+                status TEXT NOT NULL DEFAULT 'pending',
+                notes TEXT,
+                created_by INTEGER,
+                last_error TEXT,
+                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                dispatched_at TIMESTAMP,
+                received_at TIMESTAMP
+            )
+        ''')
+        cursor.execute(
+            "CREATE INDEX IF NOT EXISTS idx_transfers_status ON transfers (status, id)"
+        )
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS transfer_lines (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                transfer_id INTEGER NOT NULL,
+                product_id INTEGER NOT NULL,
+                barcode TEXT,
+                product_name TEXT NOT NULL,
+                quantity INTEGER NOT NULL,
+                cost_cents INTEGER,
+                FOREIGN KEY (transfer_id) REFERENCES transfers (id)
+            )
+        ''')
+        cursor.execute(
+            "CREATE INDEX IF NOT EXISTS idx_transfer_lines_transfer ON transfer_lines (transfer_id)"
+        )
+        # Stock dispatched to each store and not yet received, kept up to date by the transfers
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS stock_in_transit (
+                location_code TEXT NOT NULL,
+                product_key TEXT NOT NULL,
+                quantity INTEGER NOT NULL,
+                PRIMARY KEY (location_code, product_key)
+            ) WITHOUT ROWID
+        ''')
+
+        # Create sync_receipts table: idempotency keys of till sales already recorded (server side)
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS sync_receipts (
+                idempotency_key TEXT PRIMARY KEY,
+                sale_id INTEGER NOT NULL,
+                received_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                FOREIGN KEY (sale_id) REFERENCES sales (id)
+            )
+        ''')
+
+        # Create catalog_changes table: one row per product, renumbered on every change,
+        # so "version > cursor" lists exactly the products a till has not seen yet
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS catalog_changes (
+                version INTEGER PRIMARY KEY AUTOINCREMENT,
+                product_id INTEGER NOT NULL UNIQUE,
+                deleted BOOLEAN DEFAULT FALSE,
+                changed_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+            )
+        ''')
+        for event, row, deleted in (('INSERT', 'NEW', 0), ('UPDATE', 'NEW', 0), ('DELETE', 'OLD', 1)):
+            cursor.execute(f'''
+                CREATE TRIGGER IF NOT EXISTS trg_inventory_{event.lower()}_catalog_changes
+                AFTER {event} ON inventory
+                BEGIN
+                    DELETE FROM catalog_changes WHERE product_id = {row}.id;
+                    INSERT INTO catalog_changes (product_id, deleted) VALUES ({row}.id, {deleted});
+                END
+            ''')
+        # Product rows carry their category's name, so renaming it changes them too
+        cursor.execute('''
+            CREATE TRIGGER IF NOT EXISTS trg_categories_update_catalog_changes
+            AFTER UPDATE OF name ON categories
+            WHEN NEW.name IS NOT OLD.name
+            BEGIN
+                DELETE FROM catalog_changes
+                WHERE product_id IN (SELECT id FROM inventory WHERE category_id = NEW.id);
+                INSERT INTO catalog_changes (product_id)
+                SELECT id FROM inventory WHERE category_id = NEW.id;
+            END
+        ''')
+        cursor.execute(
+            """INSERT INTO catalog_changes (product_id)
+               SELECT id FROM inventory
+               WHERE id NOT IN (SELECT product_id FROM catalog_changes)"""
+        )
 
         # Create users table
         cursor.execute('''
@@ -150,9 +559,15 @@ class DatabaseManager:
                 login_time TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
                 last_activity TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
                 is_active BOOLEAN DEFAULT TRUE,
+                last_activity_epoch INTEGER,
                 FOREIGN KEY (user_id) REFERENCES users (id)
             )
         ''')
+        self._add_missing_columns(cursor, 'user_sessions', [('last_activity_epoch', 'INTEGER')])
+        cursor.execute(
+            "CREATE INDEX IF NOT EXISTS idx_user_sessions_last_activity_epoch "
+            "ON user_sessions (last_activity_epoch)"
+        )
 
         # Create user_activity_log table for audit trail
         cursor.execute('''
@@ -164,9 +579,19 @@ class DatabaseManager:
                 description TEXT,
                 ip_address TEXT,
                 timestamp TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                timestamp_epoch INTEGER,
                 FOREIGN KEY (user_id) REFERENCES users (id)
             )
         ''')
+        self._add_missing_columns(cursor, 'user_activity_log', [('timestamp_epoch', 'INTEGER')])
+        cursor.execute(
+            "CREATE INDEX IF NOT EXISTS idx_user_activity_log_timestamp_epoch "
+            "ON user_activity_log (timestamp_epoch)"
+        )
+        cursor.execute(
+            "CREATE INDEX IF NOT EXISTS idx_user_activity_log_user_timestamp_epoch "
+            "ON user_activity_log (user_id, timestamp_epoch)"
+        )
 
         # Insert default roles
         default_roles = [
@@ -311,6 +736,25 @@ class DatabaseManager:
         
         self.conn.commit()
 
+    def _add_missing_columns(self, cursor, table, columns):
+        """Add columns introduced after a database file was first created"""
+        cursor.execute(f"PRAGMA table_info({table})")
+        existing = {row[1] for row in cursor.fetchall()}
+        for name, definition in columns:
+            if name not in existing:
+                cursor.execute(f"ALTER TABLE {table} ADD COLUMN {name} {definition}")
+                # Money and epoch columns just added are filled from the column they replace
+                for cents, real in MONEY_COLUMNS.get(table, ()):
+                    if cents == name:
+                        cursor.execute(
+                            f"UPDATE {table} SET {cents} = CAST(ROUND({real} * 100) AS INTEGER)"
+                        )
+                for epoch, text in EPOCH_COLUMNS.get(table, ()):
+                    if epoch == name:
+                        cursor.execute(
+                            f"UPDATE {table} SET {epoch} = CAST(strftime('%s', {text}) AS INTEGER)"
+                        )
+
     # Category Management
     def add_category(self, name: str, description: str = None) -> int:
         cursor = self.conn.cursor()
@@ -319,6 +763,7 @@ class DatabaseManager:
             (name, description)
         )
         self.conn.commit()
+        self.catalog.invalidate_categories()
         return cursor.lastrowid
     
     def update_category(self, id: int, name: str, description: str = None) -> bool:
@@ -328,10 +773,15 @@ class DatabaseManager:
             (name, description, id)
         )
         self.conn.commit()
-        return cursor.rowcount > 0
+        updated = cursor.rowcount > 0
+        self.catalog.invalidate_categories()
+        # Cached product rows carry the category name
+        self._refresh_products(self._category_product_ids(id))
+        return updated
     
     def delete_category(self, id: int) -> bool:
         cursor = self.conn.cursor()
+        moved_ids = self._category_product_ids(id)
         # Move products to default category first
         cursor.execute(
             "UPDATE inventory SET category_id=1 WHERE category_id=?",
@@ -339,222 +789,1026 @@ class DatabaseManager:
         )
         cursor.execute("DELETE FROM categories WHERE id=?", (id,))
         self.conn.commit()
-        return cursor.rowcount > 0
+        deleted = cursor.rowcount > 0
+        self.catalog.invalidate_categories()
+        self._refresh_products(moved_ids)
+        return deleted
     
     def get_all_categories(self):
+        self._check_external_changes()
+        categories = self.catalog.categories()
+        if categories is None:
+            cursor = self.conn.cursor()
+            cursor.execute("SELECT * FROM categories ORDER BY name")
+            categories = cursor.fetchall()
+            self.catalog.set_categories(categories)
+        return list(categories)
+
+    # Catalogue Cache
+    def subscribe_catalog(self, callback):
+        """Register a callback for catalogue delta notifications."""
+        self.catalog.subscribe(callback)
+
+    def unsubscribe_catalog(self, callback):
+        """Remove a catalogue delta callback."""
+        self.catalog.unsubscribe(callback)
+
+    def get_catalog_version(self) -> int:
+        """Return the newest catalog_changes version, the one /sync/catalog pages by."""
+        return self._catalog_changes_version()
+
+    def _catalog_changes_version(self):
         cursor = self.conn.cursor()
-        cursor.execute("SELECT * FROM categories ORDER BY name")
-        return cursor.fetchall()
+        cursor.execute("SELECT COALESCE(MAX(version), 0) FROM catalog_changes")
+        return cursor.fetchone()[0]
+
+    def _check_external_changes(self):
+        """Bring the cache up to date with another connection's product changes.
+
+        SQLite bumps PRAGMA data_version only for commits made by other
+        connections, so our own writes (already applied as deltas) never
+        trigger a reload. After another commit, the products it renumbered
+        in catalog_changes are re-read and applied as a delta, so a sale at
+        another till or an API reader costs a few rows and printed receipts
+        cost nothing; past CATALOG_DELTA_LIMIT the cache is reset instead.
+        """
+        cursor = self.conn.cursor()
+        cursor.execute("PRAGMA data_version")
+        data_version = cursor.fetchone()[0]
+        previous, self._data_version = self._data_version, data_version
+        if previous is None or data_version == previous:
+            return
+        # Categories are not versioned; the list is small enough to just read again
+        self.catalog.invalidate_categories()
+        if not self.catalog.loaded:
+            return
+        cursor.execute(
+            "SELECT version, product_id FROM catalog_changes WHERE version > ? ORDER BY version LIMIT ?",
+            (self._catalog_version, CATALOG_DELTA_LIMIT + 1)
+        )
+        changes = cursor.fetchall()
+        if not changes:
+            return
+        # Recorded before notifying: subscribers read the catalogue back from the delta
+        if len(changes) > CATALOG_DELTA_LIMIT:
+            logger.info("Catalogue changed externally, reloading catalogue cache")
+            self.catalog.reset()
+        else:
+            self._catalog_version = changes[-1][0]
+            self._refresh_products([product_id for _, product_id in changes])
+
+    def _ensure_catalog(self):
+        self._check_external_changes()
+        if not self.catalog.loaded:
+            # Read first, so a change landing during the load is picked up again later
+            self._catalog_version = self._catalog_changes_version()
+            cursor = self.conn.cursor()
+            cursor.execute(QUERIES.sql("products.all"))
+            self.catalog.load(cursor.fetchall())
+        return self.catalog
+
+    def _category_product_ids(self, category_id):
+        if self.catalog.loaded:
+            return [p[0] for p in self.catalog.by_category(category_id)]
+        return []
+
+    def _refresh_products(self, product_ids):
+        """Re-read the given products and push them to the cache as a delta."""
+        product_ids = list(dict.fromkeys(product_ids))
+        if not product_ids or not self.catalog.loaded:
+            return None
+        cursor = self.conn.cursor()
+        cursor.execute(QUERIES.sql("products.by_ids"), (json.dumps(product_ids),))
+        changed = cursor.fetchall()
+        found = {row[0] for row in changed}
+        removed = [product_id for product_id in product_ids if product_id not in found]
+        return self.catalog.apply(changed, removed)
+
+    # Stock Reservations
+    def _timestamp(self, seconds=0):
+        """UTC timestamp in SQLite's CURRENT_TIMESTAMP format, offset by seconds"""
+        return (datetime.utcnow() + timedelta(seconds=seconds)).strftime('%Y-%m-%d %H:%M:%S')
+
+    def available_to_sell(self, product_ids, till_id=None) -> dict:
+        """Stock not held by other tills' unexpired reservations, by product ID.
+
+        This till's own holds are not subtracted, so the value is the most
+        this till's cart may contain.
+        """
+        product_ids = list(product_ids)
+        if not product_ids:
+            return {}
+        cursor = self.conn.cursor()
+        cursor.execute(
+            QUERIES.sql("stock.available_many"),
+            (self._timestamp(), till_id or self.till_id, json.dumps(product_ids))
+        )
+        return dict(cursor.fetchall())
+
+    def reserve_stock(self, product_id: int, quantity: int, till_id=None) -> bool:
+        """Set this till's hold on a product to quantity (0 releases it).
+
+        Returns False without changing the hold when less than quantity is
+        available to sell.
+        """
+        till_id = till_id or self.till_id
+        if quantity <= 0:
+            self.release_reservation(product_id, till_id)
+            return True
+        
+        now = self._timestamp()
+        cursor = self.conn.cursor()
+        try:
+            cursor.execute("BEGIN IMMEDIATE")
+            cursor.execute(
+                "DELETE FROM stock_reservations WHERE product_id = ? AND expires_at <= ?",
+                (product_id, now)
+            )
+            cursor.execute(QUERIES.sql("stock.available_one"), (now, till_id, product_id))
+            row = cursor.fetchone()
+            if row is None or row[0] < quantity:
+                self.conn.rollback()
+                return False
+            
+            cursor.execute(
+                """INSERT INTO stock_reservations (till_id, product_id, quantity, expires_at)
+                   VALUES (?, ?, ?, ?)
+                   ON CONFLICT (till_id, product_id) DO UPDATE
+                   SET quantity = excluded.quantity, expires_at = excluded.expires_at""",
+                (till_id, product_id, quantity, self._timestamp(RESERVATION_TTL_SECONDS))
+            )
+            self.conn.commit()
+            return True
+        except Exception as e:
+            self.conn.rollback()
+            logger.error(f"Error reserving stock: {str(e)}", exc_info=True)
+            raise
+
+    def release_reservation(self, product_id: int, till_id=None) -> bool:
+        cursor = self.conn.cursor()
+        cursor.execute(
+            "DELETE FROM stock_reservations WHERE till_id = ? AND product_id = ?",
+            (till_id or self.till_id, product_id)
+        )
+        self.conn.commit()
+        return cursor.rowcount > 0
+
+    def release_reservations(self, till_id=None) -> int:
+        """Release every hold of a till, e.g. when its cart is cleared"""
+        cursor = self.conn.cursor()
+        cursor.execute(
+            "DELETE FROM stock_reservations WHERE till_id = ?",
+            (till_id or self.till_id,)
+        )
+        self.conn.commit()
+        return cursor.rowcount
+
+    def renew_reservations(self, till_id=None) -> int:
+        """Push back the expiry of a till's holds while its cart is still open"""
+        cursor = self.conn.cursor()
+        cursor.execute(
+            "UPDATE stock_reservations SET expires_at = ? WHERE till_id = ?",
+            (self._timestamp(RESERVATION_TTL_SECONDS), till_id or self.till_id)
+        )
+        self.conn.commit()
+        return cursor.rowcount
+
+    def purge_expired_reservations(self) -> int:
+        cursor = self.conn.cursor()
+        cursor.execute(
+            "DELETE FROM stock_reservations WHERE expires_at <= ?",
+            (self._timestamp(),)
+        )
+        self.conn.commit()
+        return cursor.rowcount
 
     # Stock Receiving
     def add_stock_receiving(self, product_id: int, supplier: str, quantity: int,
                           purchase_price: float, selling_price: float, notes: str = None) -> int:
+        if self.outbox_enabled:
+            raise ValueError(SYNCED_TILL_MESSAGE)
+        purchase_cents = to_cents(purchase_price)
+        selling_cents = to_cents(selling_price)
+        received = now_epoch()
         cursor = self.conn.cursor()
         try:
             # Start transaction
             cursor.execute("BEGIN TRANSACTION")
             
+            cursor.execute(QUERIES.sql("deliveries.unknown_products"), (json.dumps([product_id]),))
+            if cursor.fetchone():
+                raise ValueError(f"Unknown product ID: {product_id}")
+            
             # Add stock receiving record
             cursor.execute(
                 """INSERT INTO stock_receiving 
-                   (product_id, supplier, quantity, purchase_price, selling_price, notes)
-                   VALUES (?, ?, ?, ?, ?, ?)""",
-                (product_id, supplier, quantity, purchase_price, selling_price, notes)
+                   (product_id, supplier, quantity, purchase_price, selling_price, notes,
+                    purchase_price_cents, selling_price_cents, received_at, received_epoch)
+                   VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)""",
+                (product_id, supplier, quantity, to_units(purchase_cents), to_units(selling_cents),
+                 notes, purchase_cents, selling_cents, from_epoch(received), received)
             )
+            receipt_id = cursor.lastrowid
+            self.costs.record_receipts(cursor, [receipt_id])
             
             # Update product quantity and price
             cursor.execute(
                 """UPDATE inventory 
                    SET quantity = quantity + ?,
                        price = ?,
+                       price_cents = ?,
                        updated_at = CURRENT_TIMESTAMP
                    WHERE id = ?""",
-                (quantity, selling_price, product_id)
+                (quantity, to_units(selling_cents), selling_cents, product_id)
             )
+            self.ledger.record(cursor, [(product_id, 'receipt', quantity, f"receipt:{receipt_id}",
+                                         quantity * purchase_cents)], received)
             
             # Commit transaction
             self.conn.commit()
-            return cursor.lastrowid
+            self._refresh_products([product_id])
+            return receipt_id
         except Exception as e:
             cursor.execute("ROLLBACK")
             raise e
 
-    def get_stock_history(self, product_id: int = None, start_date=None, end_date=None):
+    def receive_delivery(self, supplier: str, lines, reference: str = None, notes: str = None,
+                         received_by: int = None) -> int:
+        """Receive a whole supplier delivery as one goods received note.
+
+        lines are dicts with product_id, quantity, purchase_price and an
+        optional selling_price (None keeps the current price). All lines are
+        inserted with one executemany and inventory is updated with a single
+        set-based statement, in one transaction. Returns the note's ID.
+        """
+        if self.outbox_enabled:
+            raise ValueError(SYNCED_TILL_MESSAGE)
+        if not lines:
+            raise ValueError("A delivery needs at least one line")
+        for line in lines:
+            if line['quantity'] <= 0:
+                raise ValueError(f"Quantity must be positive for product ID {line['product_id']}")
+        
+        cursor = self.conn.cursor()
+        try:
+            cursor.execute("BEGIN IMMEDIATE")
+            grn_id = self._receive_lines(cursor, supplier, lines, reference, notes, received_by)
+            self.conn.commit()
+        except Exception as e:
+            self.conn.rollback()
+            raise e
+        
+        self._refresh_products([line['product_id'] for line in lines])
+        return grn_id
+
+    def _receive_lines(self, cursor, supplier, lines, reference=None, notes=None, received_by=None,
+                       movement_kind='receipt', movement_reference=None):
+        """Insert a goods received note and its lines inside the caller's transaction.
+
+        The stock movements are recorded under movement_reference, by
+        default the note itself.
+        """
+        total_cost = sum(Money.of(line['purchase_price']) * line['quantity'] for line in lines)
+        received = now_epoch()
+        cursor.execute(
+            """INSERT INTO goods_received_notes
+               (supplier, reference, notes, line_count, total_quantity, total_cost,
+                received_by, total_cost_cents, received_at)
+               VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)""",
+            (supplier, reference, notes, len(lines),
+             sum(line['quantity'] for line in lines),
+             float(total_cost), received_by, total_cost.cents, from_epoch(received))
+        )
+        grn_id = cursor.lastrowid
+        
+        cursor.execute(
+            QUERIES.sql("deliveries.unknown_products"),
+            (json.dumps([line['product_id'] for line in lines]),)
+        )
+        unknown = [row[0] for row in cursor.fetchall()]
+        if unknown:
+            raise ValueError(f"Unknown product ID(s): {', '.join(map(str, unknown))}")
+        
+        cursor.executemany(
+            QUERIES.sql("deliveries.insert_line"),
+            [(line['product_id'], supplier, line['quantity'], to_cents(line['purchase_price']),
+              to_cents(line.get('selling_price')), line.get('notes'), grn_id,
+              from_epoch(received), received) for line in lines]
+        )
+        cursor.execute(QUERIES.sql("deliveries.apply_to_inventory"), (grn_id,))
+        cursor.execute(QUERIES.sql("movements.from_delivery"),
+                       (movement_kind, movement_reference or f"grn:{grn_id}", received, grn_id))
+        cursor.execute("SELECT id FROM stock_receiving WHERE grn_id = ?", (grn_id,))
+        self.costs.record_receipts(cursor, [row[0] for row in cursor.fetchall()])
+        return grn_id
+
+    # Transfers (store side; the head office coordinates them through self.transfers)
+    def apply_transfer_out(self, reference: str, lines) -> list:
+        """Take a transfer's (product_id, quantity) lines out of this store's stock.
+
+        The decrements, their cost layers and the transfer_out movements are
+        one transaction. A transfer already applied is not applied again;
+        its recorded movements are returned instead. Returns
+        [(product_id, quantity, cost_cents)], costed with the store's method.
+        """
+        cursor = self.conn.cursor()
+        try:
+            cursor.execute("BEGIN IMMEDIATE")
+            cursor.execute(QUERIES.sql("movements.for_reference"), (reference, 'transfer_out'))
+            applied = cursor.fetchall()
+            if applied:
+                self.conn.rollback()
+                return [(product_id, -quantity, cost) for product_id, quantity, cost in applied]
+            
+            now = self._timestamp()
+            for product_id, quantity in lines:
+                # Stock held for other tills' carts cannot be sent away
+                cursor.execute(
+                    QUERIES.sql("sales.decrement_stock"),
+                    (quantity, product_id, quantity, now, self.till_id)
+                )
+                if cursor.rowcount == 0:
+                    raise ValueError(f"Insufficient stock for product ID {product_id}")
+            
+            method = list(COST_METHODS).index(self.get_cost_method())
+            costs = [cost[method] for cost in self.costs.cost_lines(cursor, lines)]
+            self.ledger.record(cursor, [(product_id, 'transfer_out', -quantity, reference, cost)
+                                        for (product_id, quantity), cost in zip(lines, costs)])
+            self.conn.commit()
+        except Exception as e:
+            self.conn.rollback()
+            raise e
+        
+        self._refresh_products([product_id for product_id, quantity in lines])
+        return [(product_id, quantity, cost) for (product_id, quantity), cost in zip(lines, costs)]
+
+    def apply_transfer_in(self, reference: str, from_location: str, lines, received_by: int = None) -> int:
+        """Book a transfer's lines into this store as a goods received note.
+
+        lines are dicts with barcode, product_name, quantity and the
+        cost_cents they left the source store at; products are matched by
+        barcode, or by name when they have none. The receipt and the
+        transfer_in movements are one transaction, applied once per
+        transfer. Returns the note's ID.
+        """
         cursor = self.conn.cursor()
-        query = """
-            SELECT sr.*, i.name as product_name
-            FROM stock_receiving sr
-            JOIN inventory i ON sr.product_id = i.id
-            WHERE 1=1
+        try:
+            cursor.execute("BEGIN IMMEDIATE")
+            cursor.execute(QUERIES.sql("movements.for_reference"), (reference, 'transfer_in'))
+            if cursor.fetchone():
+                self.conn.rollback()
+                cursor.execute(
+                    "SELECT id FROM goods_received_notes WHERE reference = ? ORDER BY id DESC LIMIT 1",
+                    (reference,)
+                )
+                row = cursor.fetchone()
+                return row[0] if row else None
+            
+            receipts = []
+            missing = []
+            for line in lines:
+                if line['barcode']:
+                    cursor.execute(QUERIES.sql("transfers.product_by_barcode"), (line['barcode'],))
+                else:
+                    cursor.execute(QUERIES.sql("transfers.product_by_name"), (line['product_name'],))
+                row = cursor.fetchone()
+                if row is None:
+                    missing.append(line['product_name'])
+                    continue
+                
+                cost = line['cost_cents']
+                if cost is None:
+                    # Unknown at the source: take this store's own average so margins stay sane
+                    cursor.execute(QUERIES.sql("costs.product_average"), (row[0],))
+                    average = cursor.fetchone()
+                    cost = round_cents(average[0] * line['quantity']) if average else 0
+                # Layers cost whole cents per unit, so the line's total is kept exact by
+                # costing the remainder units one cent more
+                unit_cost, extra = divmod(cost, line['quantity'])
+                for quantity, unit_cents in ((line['quantity'] - extra, unit_cost), (extra, unit_cost + 1)):
+                    if quantity:
+                        receipts.append({'product_id': row[0], 'quantity': quantity,
+                                         'purchase_price': Money(unit_cents)})
+            if missing:
+                raise ValueError(f"Products not stocked at this store: {', '.join(missing)}")
+            
+            grn_id = self._receive_lines(
+                cursor, f"Transfer from {from_location}", receipts, reference=reference,
+                received_by=received_by, movement_kind='transfer_in', movement_reference=reference
+            )
+            self.conn.commit()
+        except Exception as e:
+            self.conn.rollback()
+            raise e
+        
+        self._refresh_products(list(dict.fromkeys(line['product_id'] for line in receipts)))
+        return grn_id
+
+    def get_stock_history(self, product_id: int = None, start_date=None, end_date=None,
+                          before=None, limit: int = None, days: int = STOCK_HISTORY_WINDOW_DAYS):
+        """Get stock receiving history, newest first.
+
+        Without a start_date only the last ``days`` days are returned
+        (pass days=None for the full history). ``before`` is the
+        (received_at, id) of the last row already shown and fetches the next
+        page through the received_epoch indexes instead of an OFFSET scan.
         """
+        cursor = self.conn.cursor()
         params = []
         
         if product_id:
-            query += " AND sr.product_id = ?"
             params.append(product_id)
         
+        if start_date is None and days is not None:
+            start_date = now_epoch() - days * SECONDS_PER_DAY
+        start_date, end_date = epoch_range(start_date, end_date)
+        
         if start_date:
-            query += " AND sr.received_at >= ?"
             params.append(start_date)
         
         if end_date:
-            query += " AND sr.received_at <= ?"
             params.append(end_date)
         
-        query += " ORDER BY sr.received_at DESC"
+        if before:
+            received_at, receipt_id = before
+            received = to_epoch(received_at)
+            params.extend([received, received, receipt_id])
         
+        if limit:
+            params.append(limit)
+
+        query = QUERIES.sql("stock.history", bool(product_id), bool(start_date), bool(end_date),
+                            bool(before), bool(limit))
         cursor.execute(query, params)
         return cursor.fetchall()
 
-    # Inventory Management
-    def add_product(self, name: str, quantity: int, price: float, category_id: int = 1,
-                   alert_threshold: int = 10, description: str = None) -> int:
+    def get_stock_receipt(self, receipt_id: int):
+        """Get a single stock receiving record in the get_stock_history row shape"""
+        cursor = self.conn.cursor()
+        cursor.execute(
+            """SELECT sr.*, i.name as product_name
+               FROM stock_receiving sr
+               JOIN inventory i ON sr.product_id = i.id
+               WHERE sr.id = ?""",
+            (receipt_id,)
+        )
+        return cursor.fetchone()
+
+    # Stock ledger
+    def take_stock_snapshot(self, at=None) -> int:
+        """Snapshot every product's stock, now or at a past moment; returns the snapshot ID"""
+        return self.ledger.snapshot(self.conn, to_epoch(at))
+
+    def backfill_stock_ledger(self) -> int:
+        """Write movements for stock history from before the ledger was kept (e.g. after a bulk load)"""
+        return self.ledger.backfill(self.conn, COST_METHODS[self.get_cost_method()])
+
+    def get_stock_at(self, at, product_ids=None) -> dict:
+        """{product_id: quantity} on hand at a moment; a bare date means at its close"""
+        at = epoch_range(None, at)[1]
+        stock = self.ledger.stock_at(self.conn.cursor(), at, product_ids)
+        return {product_id: quantity for product_id, (quantity, cost) in stock.items()}
+
+    def _product_labels(self, cursor, product_ids) -> dict:
+        """{product_id: (name, category)}, naming products deleted since by ID"""
+        cursor.execute(QUERIES.sql("products.by_ids"), (json.dumps(list(product_ids)),))
+        labels = {row[0]: (row[1], row[-1]) for row in cursor.fetchall()}
+        return {product_id: labels.get(product_id, (f"Product #{product_id} (deleted)", None))
+                for product_id in product_ids}
+
+    def get_stock_valuation(self, at) -> list:
+        """Stock on hand at a moment valued at cost, highest value first.
+
+        Units are costed at the moving average kept with the snapshot the
+        figures were replayed from, or the current average when it had none.
+        """
+        cursor = self.conn.cursor()
+        at = epoch_range(None, at)[1]
+        stock = self.ledger.stock_at(cursor, at)
+        missing = [product_id for product_id, (quantity, cost) in stock.items() if cost is None]
+        if missing:
+            cursor.execute(
+                f"SELECT product_id, average_cost_cents FROM product_costs WHERE product_id IN {IDS_PARAM}",
+                (json.dumps(missing),)
+            )
+            for product_id, cost in cursor.fetchall():
+                stock[product_id][1] = cost
+        labels = self._product_labels(cursor, stock)
+        rows = []
+        for product_id, (quantity, cost) in stock.items():
+            name, category = labels[product_id]
+            rows.append({'product': name, 'category': category, 'quantity': quantity,
+                         'unit_cost': cost / 100.0 if cost is not None else None,
+                         'value': round_cents(quantity * cost) / 100.0 if cost is not None else None})
+        return sorted(rows, key=lambda row: row['value'] or 0.0, reverse=True)
+
+    def get_stock_movement(self, start_date, end_date) -> list:
+        """Opening stock, units received and sold, and closing stock per product over a period"""
+        cursor = self.conn.cursor()
+        start, end = epoch_range(start_date, end_date)
+        start = start if start is not None else 0
+        end = end if end is not None else now_epoch()
+        opening = self.ledger.stock_at(cursor, start - 1)
+        moved = self.ledger.movements_by_kind(cursor, start - 1, end)
+        product_ids = list(dict.fromkeys([*opening, *moved]))
+        labels = self._product_labels(cursor, product_ids)
+        rows = []
+        for product_id in product_ids:
+            initial = opening.get(product_id, [0, None])[0]
+            kinds = moved.get(product_id, {})
+            rows.append({'product': labels[product_id][0], 'initial_stock': initial,
+                         'received': sum(kinds.get(kind, 0) for kind in RECEIVED_KINDS),
+                         'sold': -sum(kinds.get(kind, 0) for kind in SOLD_KINDS),
+                         'current_stock': initial + sum(kinds.values())})
+        return sorted(rows, key=lambda row: row['product'])
+
+    # Inventory Management
+    def add_product(self, name: str, quantity: int, price: float, category_id: int = 1,
+                   alert_threshold: int = 10, description: str = None,
+                   barcode: str = None) -> int:
+        if self.outbox_enabled:
+            raise ValueError(SYNCED_TILL_MESSAGE)
+        price_cents = to_cents(price)
+        cursor = self.conn.cursor()
+        cursor.execute(
+            """INSERT INTO inventory 
+               (name, category_id, quantity, price, alert_threshold, description, barcode,
+                price_cents)
+               VALUES (?, ?, ?, ?, ?, ?, ?, ?)""",
+            (name, category_id, quantity, to_units(price_cents), alert_threshold, description,
+             barcode or None, price_cents)
+        )
+        product_id = cursor.lastrowid
+        self.ledger.record(cursor, [(product_id, 'opening', quantity, None, None)])
+        self.conn.commit()
+        self._refresh_products([product_id])
+        return product_id
+
+    def upsert_products(self, products) -> dict:
+        """Insert or update a batch of imported products in one transaction.
+
+        products are (name, category_id, quantity, price, alert_threshold,
+        description, barcode) tuples. Rows with a barcode update the product
+        having it; None in an optional column keeps the stored value.
+        """
+        if self.outbox_enabled:
+            raise ValueError(SYNCED_TILL_MESSAGE)
+        with_barcode = [product for product in products if product[6]]
+        without_barcode = [product for product in products if not product[6]]
+        cursor = self.conn.cursor()
+        try:
+            cursor.execute("BEGIN IMMEDIATE")
+            cursor.execute(
+                "SELECT id, quantity FROM inventory WHERE barcode IN (SELECT value FROM json_each(?))",
+                (json.dumps([product[6] for product in with_barcode]),)
+            )
+            before = dict(cursor.fetchall())
+            existing = len(before)
+            cursor.execute("SELECT COALESCE(MAX(id), 0) FROM inventory")
+            last_id = cursor.fetchone()[0]
+            cursor.executemany(QUERIES.sql("products.import_upsert"),
+                               [(*product, to_cents(product[3])) for product in with_barcode])
+            cursor.executemany(QUERIES.sql("products.import_insert"),
+                               [(*product, to_cents(product[3])) for product in without_barcode])
+            cursor.execute("SELECT id FROM inventory WHERE id > ?", (last_id,))
+            self.ledger.record_changes(cursor, 'import', before, [row[0] for row in cursor.fetchall()])
+            self.conn.commit()
+        except Exception as e:
+            self.conn.rollback()
+            raise e
+        
+        # Too many rows to patch in as a delta
+        if self.catalog.loaded:
+            self.catalog.reset()
+        return {'inserted': len(products) - existing, 'updated': existing}
+
+    def update_product(self, id: int, name: str, quantity: int, price: float,
+                      category_id: int = None, alert_threshold: int = None,
+                      description: str = None, barcode: str = None) -> bool:
+        if self.outbox_enabled:
+            raise ValueError(SYNCED_TILL_MESSAGE)
+        cursor = self.conn.cursor()
+        
+        # Get current product data
+        cursor.execute("SELECT * FROM inventory WHERE id=?", (id,))
+        current = cursor.fetchone()
+        if not current:
+            return False
+        
+        # Use current values if new ones aren't provided
+        category_id = category_id if category_id is not None else current[2]
+        alert_threshold = alert_threshold if alert_threshold is not None else current[5]
+        description = description if description is not None else current[6]
+        barcode = (barcode or None) if barcode is not None else current[9]
+        price_cents = to_cents(price)
+        
+        cursor.execute(
+            """UPDATE inventory 
+               SET name=?, category_id=?, quantity=?, price=?, price_cents=?,
+                   alert_threshold=?, description=?, barcode=?, updated_at=CURRENT_TIMESTAMP 
+               WHERE id=?""",
+            (name, category_id, quantity, to_units(price_cents), price_cents, alert_threshold,
+             description, barcode, id)
+        )
+        updated = cursor.rowcount > 0
+        self.ledger.record(cursor, [(id, 'adjustment', quantity - current[3], None, None)])
+        self.conn.commit()
+        self._refresh_products([id])
+        return updated
+
+    def remove_product(self, id: int) -> bool:
+        if self.outbox_enabled:
+            raise ValueError(SYNCED_TILL_MESSAGE)
+        cursor = self.conn.cursor()
+        before = self.ledger.on_hand(cursor, [id])
+        cursor.execute("DELETE FROM inventory WHERE id=?", (id,))
+        removed = cursor.rowcount > 0
+        self.ledger.record_changes(cursor, 'removal', before)
+        self.conn.commit()
+        self._refresh_products([id])
+        return removed
+
+    def get_product(self, id: int):
+        return self._ensure_catalog().get(id)
+
+    def get_all_products(self):
+        return self._ensure_catalog().all()
+
+    def get_low_stock_products(self):
+        return self._ensure_catalog().low_stock()
+
+    def filter_products(self, search_text: str = '', category_id: int = None,
+                        low_stock_only: bool = False):
+        """Get products matching the inventory search, category and low-stock filters"""
+        return self._ensure_catalog().filter(search_text, category_id, low_stock_only)
+
+    def search_catalog(self, query: str = '', category_id: int = None,
+                       in_stock_only: bool = False):
+        """Word-prefix product search over the cached catalogue (POS search)"""
+        return self._ensure_catalog().search(query, category_id, in_stock_only)
+
+    def find_product_by_code(self, code: str):
+        """Find a product by exact barcode or product ID, e.g. from a scanner"""
+        return self._ensure_catalog().by_code(code)
+
+    def product_matches_filter(self, product, search_text: str = '', category_id: int = None,
+                               low_stock_only: bool = False) -> bool:
+        """Check whether a product row passes the filters used by filter_products"""
+        return self.catalog.matches(product, search_text, category_id, low_stock_only)
+
+    def get_products_by_category(self, category_id: int):
+        return self._ensure_catalog().by_category(category_id)
+
+    def search_products(self, search_term: str):
+        cursor = self.conn.cursor()
+        cursor.execute(
+            """SELECT i.*, c.name as category_name
+               FROM inventory i
+               JOIN categories c ON i.category_id = c.id
+               WHERE i.name LIKE ? OR i.description LIKE ?
+               ORDER BY i.name""",
+            (f"%{search_term}%", f"%{search_term}%")
+        )
+        return cursor.fetchall()
+
+    def create_sale(self, cart_items, client_name=None, client_nif=None, till_id=None):
+        """Record a sale and decrement stock, converting the till's reservations.
+
+        Each decrement only succeeds if it leaves enough stock for the other
+        tills' unexpired holds, so stock can never be oversold.
+        """
+        till_id = till_id or self.till_id
+        now = self._timestamp()
+        cursor = self.conn.cursor()
+        try:
+            # Take the write lock up front so concurrent checkouts queue on busy_timeout
+            cursor.execute("BEGIN IMMEDIATE")
+            
+            sale_id = self._insert_sale(cursor, cart_items, client_name, client_nif)
+            
+            # Update inventory
+            for item in cart_items:
+                # Update inventory quantity if enough is left unreserved
+                cursor.execute(
+                    QUERIES.sql("sales.decrement_stock"),
+                    (item['quantity'], item['id'], item['quantity'], now, till_id)
+                )
+                if cursor.rowcount == 0:
+                    raise ValueError(f"Insufficient stock for product ID {item['id']}")
+            
+            # The holds are now real decrements
+            cursor.execute(
+                QUERIES.sql("reservations.delete_for_products"),
+                (till_id, json.dumps([item['id'] for item in cart_items]))
+            )
+            
+            # Journal the sale in the same transaction so it cannot be lost before syncing
+            if self.outbox_enabled:
+                self._journal_sale(cursor, sale_id, cart_items, client_name, client_nif, till_id)
+            
+            # Commit transaction
+            self.conn.commit()
+            self._refresh_products([item['id'] for item in cart_items])
+            return sale_id
+            
+        except Exception as e:
+            cursor.execute("ROLLBACK")
+            raise e
+
+    def _insert_sale(self, cursor, cart_items, client_name=None, client_nif=None, created_at=None):
+        """Insert the sale and its items with their cost of goods, returning the sale ID.
+        
+        Item prices may be floats or Money; the total is summed in cents.
+        """
+        prices = [to_cents(item['price']) for item in cart_items]
+        total_cents = sum(cents * item['quantity'] for cents, item in zip(prices, cart_items))
+        created = to_epoch(created_at) if created_at else now_epoch()
+        cursor.execute(
+            """INSERT INTO sales (client_name, nif, total_amount, created_at, total_cents,
+                                  created_epoch)
+               VALUES (?, ?, ?, ?, ?, ?)""",
+            (client_name, client_nif, to_units(total_cents), created_at or from_epoch(created),
+             total_cents, created)
+        )
+        sale_id = cursor.lastrowid
+        costs = self.costs.cost_lines(cursor, [(item['id'], item['quantity']) for item in cart_items])
+        cursor.executemany(
+            """INSERT INTO sale_items
+               (sale_id, product_id, quantity, price_at_sale, price_cents,
+                cost_fifo_cents, cost_average_cents)
+               VALUES (?, ?, ?, ?, ?, ?, ?)""",
+            [(sale_id, item['id'], item['quantity'], to_units(cents), cents, *cost)
+             for item, cents, cost in zip(cart_items, prices, costs)]
+        )
+        # Booked now, so a synced sale made earlier does not rewrite stock already snapshotted
+        cursor.execute(QUERIES.sql("movements.from_sale", COST_METHODS[self.get_cost_method()]),
+                       (now_epoch(), sale_id))
+        return sale_id
+
+    # Sync
+    def _journal_sale(self, cursor, sale_id, cart_items, client_name, client_nif, till_id):
+        cursor.execute("SELECT created_at FROM sales WHERE id = ?", (sale_id,))
+        payload = {
+            'till_id': till_id,
+            'client_name': client_name,
+            'client_nif': client_nif,
+            'created_at': cursor.fetchone()[0],
+            'items': [{'id': item['id'], 'quantity': item['quantity'],
+                       'price': to_units(to_cents(item['price']))}
+                      for item in cart_items]
+        }
+        cursor.execute(
+            "INSERT INTO sales_outbox (idempotency_key, sale_id, payload) VALUES (?, ?, ?)",
+            (str(uuid.uuid4()), sale_id, json.dumps(payload))
+        )
+
+    def get_pending_sales(self, limit: int = 50) -> list:
+        """Oldest journaled sales not yet accepted by the server"""
+        cursor = self.conn.cursor()
+        cursor.execute(
+            """SELECT id, idempotency_key, payload FROM sales_outbox
+               WHERE synced_at IS NULL
+               ORDER BY id
+               LIMIT ?""",
+            (limit,)
+        )
+        return [{'outbox_id': row[0], 'idempotency_key': row[1], **json.loads(row[2])}
+                for row in cursor.fetchall()]
+
+    def mark_sales_synced(self, results) -> int:
+        """Record server sale IDs for journaled sales, keyed by idempotency key"""
+        cursor = self.conn.cursor()
+        cursor.executemany(
+            """UPDATE sales_outbox
+               SET synced_at = CURRENT_TIMESTAMP, server_sale_id = ?, last_error = NULL
+               WHERE idempotency_key = ?""",
+            [(result['sale_id'], result['idempotency_key']) for result in results]
+        )
+        self.conn.commit()
+        return cursor.rowcount
+
+    def mark_sales_failed(self, outbox_ids, error: str):
         cursor = self.conn.cursor()
-        cursor.execute(
-            """INSERT INTO inventory 
-               (name, category_id, quantity, price, alert_threshold, description)
-               VALUES (?, ?, ?, ?, ?, ?)""",
-            (name, category_id, quantity, price, alert_threshold, description)
+        cursor.executemany(
+            "UPDATE sales_outbox SET attempts = attempts + 1, last_error = ? WHERE id = ?",
+            [(error, outbox_id) for outbox_id in outbox_ids]
         )
         self.conn.commit()
-        return cursor.lastrowid
 
-    def update_product(self, id: int, name: str, quantity: int, price: float,
-                      category_id: int = None, alert_threshold: int = None,
-                      description: str = None) -> bool:
+    def get_outbox_status(self) -> dict:
         cursor = self.conn.cursor()
-        
-        # Get current product data
-        cursor.execute("SELECT * FROM inventory WHERE id=?", (id,))
-        current = cursor.fetchone()
-        if not current:
-            return False
-        
-        # Use current values if new ones aren't provided
-        category_id = category_id if category_id is not None else current[2]
-        alert_threshold = alert_threshold if alert_threshold is not None else current[5]
-        description = description if description is not None else current[6]
-        
         cursor.execute(
-            """UPDATE inventory 
-               SET name=?, category_id=?, quantity=?, price=?,
-                   alert_threshold=?, description=?, updated_at=CURRENT_TIMESTAMP 
-               WHERE id=?""",
-            (name, category_id, quantity, price, alert_threshold, description, id)
+            """SELECT COUNT(*), MIN(created_at), MAX(attempts)
+               FROM sales_outbox WHERE synced_at IS NULL"""
         )
-        self.conn.commit()
-        return cursor.rowcount > 0
+        pending, oldest, attempts = cursor.fetchone()
+        return {'pending': pending, 'oldest': oldest, 'attempts': attempts or 0}
 
-    def remove_product(self, id: int) -> bool:
+    def spool_receipt(self, sale_id: int, target: str, receipt: dict) -> int:
+        """Queue a receipt for the spooler to print on target"""
         cursor = self.conn.cursor()
-        cursor.execute("DELETE FROM inventory WHERE id=?", (id,))
+        cursor.execute(
+            "INSERT INTO receipt_spool (sale_id, target, payload) VALUES (?, ?, ?)",
+            (sale_id, target, json.dumps(receipt))
+        )
         self.conn.commit()
-        return cursor.rowcount > 0
+        return cursor.lastrowid
 
-    def get_product(self, id: int):
+    def get_pending_receipts(self, max_attempts: int, limit: int = 20) -> list:
+        """Oldest receipts not yet printed that have not used up their retries"""
         cursor = self.conn.cursor()
         cursor.execute(
-            """SELECT i.*, c.name as category_name
-               FROM inventory i
-               JOIN categories c ON i.category_id = c.id
-               WHERE i.id = ?""",
-            (id,)
+            """SELECT id, sale_id, target, payload FROM receipt_spool
+               WHERE printed_at IS NULL AND attempts < ?
+               ORDER BY id
+               LIMIT ?""",
+            (max_attempts, limit)
         )
-        return cursor.fetchone()
+        return [{'spool_id': row[0], 'sale_id': row[1], 'target': row[2],
+                 'receipt': json.loads(row[3])}
+                for row in cursor.fetchall()]
 
-    def get_all_products(self):
+    def mark_receipt_printed(self, spool_id: int):
         cursor = self.conn.cursor()
         cursor.execute(
-            """SELECT i.*, c.name as category_name
-               FROM inventory i
-               JOIN categories c ON i.category_id = c.id
-               ORDER BY i.name"""
+            "UPDATE receipt_spool SET printed_at = CURRENT_TIMESTAMP, last_error = NULL WHERE id = ?",
+            (spool_id,)
         )
-        return cursor.fetchall()
+        self.conn.commit()
 
-    def get_low_stock_products(self):
+    def mark_receipt_failed(self, spool_id: int, error: str):
         cursor = self.conn.cursor()
         cursor.execute(
-            """SELECT i.*, c.name as category_name
-               FROM inventory i
-               JOIN categories c ON i.category_id = c.id
-               WHERE i.quantity <= i.alert_threshold
-               ORDER BY i.name"""
+            "UPDATE receipt_spool SET attempts = attempts + 1, last_error = ? WHERE id = ?",
+            (error, spool_id)
         )
-        return cursor.fetchall()
+        self.conn.commit()
 
-    def get_products_by_category(self, category_id: int):
+    def get_spool_status(self) -> dict:
         cursor = self.conn.cursor()
         cursor.execute(
-            """SELECT i.*, c.name as category_name
-               FROM inventory i
-               JOIN categories c ON i.category_id = c.id
-               WHERE i.category_id = ?
-               ORDER BY i.name""",
-            (category_id,)
+            """SELECT COUNT(*), MAX(attempts),
+                      (SELECT last_error FROM receipt_spool
+                       WHERE printed_at IS NULL AND last_error IS NOT NULL
+                       ORDER BY id DESC LIMIT 1)
+               FROM receipt_spool WHERE printed_at IS NULL"""
         )
-        return cursor.fetchall()
+        pending, attempts, last_error = cursor.fetchone()
+        return {'pending': pending, 'attempts': attempts or 0, 'last_error': last_error}
 
-    def search_products(self, search_term: str):
+    def record_synced_sales(self, entries) -> list:
+        """Record a batch of sales journaled by tills (server side).
+
+        Entries already seen are answered with their original sale ID. The
+        goods have already left the store, so stock is decremented even
+        when it goes negative; those products are reported as conflicts for
+        the till to reconcile.
+        """
+        cursor = self.conn.cursor()
+        results = []
+        touched = []
+        try:
+            cursor.execute("BEGIN IMMEDIATE")
+            for entry in entries:
+                key = entry['idempotency_key']
+                cursor.execute("SELECT sale_id FROM sync_receipts WHERE idempotency_key = ?", (key,))
+                existing = cursor.fetchone()
+                if existing:
+                    results.append({'idempotency_key': key, 'sale_id': existing[0],
+                                    'duplicate': True, 'conflicts': []})
+                    continue
+                
+                items = entry['items']
+                sale_id = self._insert_sale(
+                    cursor, items, entry.get('client_name'), entry.get('client_nif'),
+                    entry.get('created_at')
+                )
+                conflicts = []
+                for item in items:
+                    cursor.execute(
+                        """UPDATE inventory
+                           SET quantity = quantity - ?, updated_at = CURRENT_TIMESTAMP
+                           WHERE id = ?
+                           RETURNING quantity""",
+                        (item['quantity'], item['id'])
+                    )
+                    row = cursor.fetchone()
+                    if row is None or row[0] < 0:
+                        conflicts.append(item['id'])
+                    touched.append(item['id'])
+                cursor.execute(
+                    "INSERT INTO sync_receipts (idempotency_key, sale_id) VALUES (?, ?)",
+                    (key, sale_id)
+                )
+                if conflicts:
+                    logger.warning(f"Synced sale {key} oversold products {conflicts}")
+                results.append({'idempotency_key': key, 'sale_id': sale_id,
+                                'duplicate': False, 'conflicts': conflicts})
+            self.conn.commit()
+        except Exception as e:
+            self.conn.rollback()
+            logger.error(f"Error recording synced sales: {str(e)}", exc_info=True)
+            raise
+        self._refresh_products(touched)
+        return results
+
+    def get_catalog_changes(self, since: int = 0, limit: int = 500) -> dict:
+        """Products changed after the given catalog_changes version (server side)"""
         cursor = self.conn.cursor()
         cursor.execute(
-            """SELECT i.*, c.name as category_name
-               FROM inventory i
-               JOIN categories c ON i.category_id = c.id
-               WHERE i.name LIKE ? OR i.description LIKE ?
-               ORDER BY i.name""",
-            (f"%{search_term}%", f"%{search_term}%")
+            """SELECT cc.version, cc.product_id, cc.deleted
+               FROM catalog_changes cc
+               WHERE cc.version > ?
+               ORDER BY cc.version
+               LIMIT ?""",
+            (since, limit)
         )
-        return cursor.fetchall()
+        changes = cursor.fetchall()
+        changed_ids = [row[1] for row in changes if not row[2]]
+        products = []
+        categories = []
+        if changed_ids:
+            cursor.execute(QUERIES.sql("products.by_ids"), (json.dumps(changed_ids),))
+            products = cursor.fetchall()
+            # The changed products' categories, which the till may not have yet
+            cursor.execute(
+                f"SELECT id, name, description FROM categories WHERE id IN {IDS_PARAM}",
+                (json.dumps(list({row[2] for row in products})),)
+            )
+            categories = cursor.fetchall()
+        return {
+            'version': changes[-1][0] if changes else since,
+            'products': products,
+            'categories': categories,
+            'removed': [row[1] for row in changes if row[2]],
+            'more': len(changes) == limit
+        }
+
+    def apply_catalog_changes(self, products, removed, categories=()) -> int:
+        """Overwrite local products with the server's copy (till side).
 
-    def create_sale(self, cart_items, client_name=None, client_nif=None):
+        The server's stock does not include sales still waiting in the
+        outbox, so those quantities are taken off again to keep local
+        stock consistent with what the till has sold. categories are the
+        server's (id, name, description) for the products; they are
+        matched to the till's own by name, created when missing, and
+        products are filed under the local ID.
+        """
         cursor = self.conn.cursor()
         try:
-            # Start transaction
-            cursor.execute("BEGIN TRANSACTION")
-            
-            # Calculate total amount
-            total_amount = sum(item['price'] * item['quantity'] for item in cart_items)
-            
-            # Create sale record
-            cursor.execute(
-                """INSERT INTO sales (client_name, nif, total_amount)
-                   VALUES (?, ?, ?)""",
-                (client_name, client_nif, total_amount)
+            cursor.execute("BEGIN IMMEDIATE")
+            cursor.executemany(
+                """INSERT INTO categories (name, description) VALUES (?, ?)
+                   ON CONFLICT (name) DO UPDATE SET description = excluded.description""",
+                [(c['name'], c['description']) for c in categories]
             )
-            sale_id = cursor.lastrowid
-            
-            # Add sale items and update inventory
-            for item in cart_items:
-                # Add sale item
-                cursor.execute(
-                    """INSERT INTO sale_items (sale_id, product_id, quantity, price_at_sale)
-                       VALUES (?, ?, ?, ?)""",
-                    (sale_id, item['id'], item['quantity'], item['price'])
-                )
-                
-                # Update inventory quantity
-                cursor.execute(
-                    """UPDATE inventory
-                       SET quantity = quantity - ?,
-                           updated_at = CURRENT_TIMESTAMP
-                       WHERE id = ?""",
-                    (item['quantity'], item['id'])
+            # Server category ID -> local ID, falling back to the product's category name,
+            # then to General
+            cursor.execute("SELECT name, id FROM categories")
+            local_ids = dict(cursor.fetchall())
+            category_ids = {c['id']: local_ids[c['name']] for c in categories}
+            for p in products:
+                p['category_id'] = category_ids.get(
+                    p['category_id'], local_ids.get(p.get('category'), 1)
                 )
-                
-                # Check if we have enough stock
-                cursor.execute("SELECT quantity FROM inventory WHERE id = ?", (item['id'],))
-                remaining_stock = cursor.fetchone()[0]
-                if remaining_stock < 0:
-                    raise ValueError(f"Insufficient stock for product ID {item['id']}")
-            
-            # Commit transaction
+            cursor.execute(
+                """SELECT json_extract(item.value, '$.id'), SUM(json_extract(item.value, '$.quantity'))
+                   FROM sales_outbox o, json_each(o.payload, '$.items') item
+                   WHERE o.synced_at IS NULL
+                   GROUP BY 1"""
+            )
+            unsynced = dict(cursor.fetchall())
+            before = self.ledger.on_hand(cursor, [p['id'] for p in products] + list(removed))
+            cursor.executemany(
+                """INSERT INTO inventory
+                   (id, name, category_id, quantity, price, alert_threshold, description, barcode,
+                    price_cents)
+                   VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+                   ON CONFLICT (id) DO UPDATE SET
+                       name = excluded.name,
+                       category_id = excluded.category_id,
+                       quantity = excluded.quantity,
+                       price = excluded.price,
+                       price_cents = excluded.price_cents,
+                       alert_threshold = excluded.alert_threshold,
+                       description = excluded.description,
+                       barcode = excluded.barcode,
+                       updated_at = CURRENT_TIMESTAMP""",
+                [(p['id'], p['name'], p['category_id'], p['quantity'] - unsynced.get(p['id'], 0),
+                  p['price'], p['alert_threshold'], p['description'], p['barcode'],
+                  to_cents(p['price']))
+                 for p in products]
+            )
+            cursor.executemany("DELETE FROM inventory WHERE id = ?", [(i,) for i in removed])
+            # Stock sold at other tills reaches this one as the difference
+            self.ledger.record_changes(cursor, 'sync', before, [p['id'] for p in products])
             self.conn.commit()
-            return sale_id
-            
         except Exception as e:
-            cursor.execute("ROLLBACK")
-            raise e
+            self.conn.rollback()
+            logger.error(f"Error applying catalogue changes: {str(e)}", exc_info=True)
+            raise
+        self._refresh_products([p['id'] for p in products] + list(removed))
+        return len(products) + len(removed)
 
     def get_sale_details(self, sale_id):
         cursor = self.conn.cursor()
@@ -567,7 +1821,9 @@ class DatabaseManager:
                 s.created_at,
                 si.quantity,
                 si.price_at_sale,
-                i.name as product_name
+                i.name as product_name,
+                si.price_cents,
+                s.total_cents
                FROM sales s
                JOIN sale_items si ON s.id = si.sale_id
                JOIN inventory i ON si.product_id = i.id
@@ -577,89 +1833,146 @@ class DatabaseManager:
         return cursor.fetchall()
 
     # Report Functions
-    def get_sales_report(self, start_date, end_date):
-        """Get sales report data for the given date range"""
-        cursor = self.conn.cursor()
-        try:
+    def _report_query(self, report_type, start_date=None, end_date=None):
+        """(query, params, columns) of the sales, inventory or financial report"""
+        if report_type == 'inventory':
+            query = """
+                SELECT 
+                    i.name,
+                    c.name as category,
+                    i.quantity as stock,
+                    i.price_cents / 100.0 as price,
+                    i.quantity * i.price_cents / 100.0 as value,
+                    CASE 
+                        WHEN i.quantity <= i.alert_threshold THEN 'Low Stock'
+                        ELSE 'Normal'
+                    END as status
+                FROM inventory i
+                JOIN categories c ON i.category_id = c.id
+                ORDER BY i.name
+            """
+            return query, (), ['name', 'category', 'stock', 'price', 'value', 'status']
+        
+        start_date, end_date = epoch_range(start_date, end_date)
+        if report_type == 'sales':
             query = """
                 SELECT 
                     s.id,
                     s.created_at as date,
                     s.client_name,
                     COUNT(si.id) as items,
-                    s.total_amount,
+                    s.total_cents / 100.0 as total_amount,
                     GROUP_CONCAT(DISTINCT i.name) as products,
                     'Cash' as payment_method
                 FROM sales s
                 LEFT JOIN sale_items si ON s.id = si.sale_id
                 LEFT JOIN inventory i ON si.product_id = i.id
-                WHERE s.created_at BETWEEN ? AND ?
+                WHERE s.created_epoch BETWEEN ? AND ?
                 GROUP BY s.id
-                ORDER BY s.created_at DESC
+                ORDER BY s.created_epoch DESC
             """
-            cursor.execute(query, (start_date, end_date))
-            
-            # Convert to list of dictionaries for easier handling
             columns = ['id', 'date', 'client_name', 'items', 'total_amount', 'products', 'payment_method']
-            return [dict(zip(columns, row)) for row in cursor.fetchall()]
+            return query, (start_date, end_date), columns
+        
+        if report_type == 'financial':
+            cost = f"si.{COST_METHODS[self.get_cost_method()]}"
+            query = f"""
+                SELECT 
+                    s.created_at as date,
+                    GROUP_CONCAT(i.name) as description,
+                    s.total_cents / 100.0 as gross_amount,
+                    s.total_cents * 0.23 / 100.0 as tax,
+                    s.total_cents * 0.77 / 100.0 as net_amount,
+                    CASE WHEN COUNT({cost}) = COUNT(si.id) THEN SUM({cost}) / 100.0 END
+                    as cost_of_goods,
+                    CASE WHEN COUNT({cost}) = COUNT(si.id)
+                         THEN (s.total_cents * 0.77 - SUM({cost})) / 100.0 END as margin
+                FROM sales s
+                LEFT JOIN sale_items si ON s.id = si.sale_id
+                LEFT JOIN inventory i ON si.product_id = i.id
+                WHERE s.created_epoch BETWEEN ? AND ?
+                GROUP BY s.id
+                ORDER BY s.created_epoch DESC
+            """
+            columns = ['date', 'description', 'gross_amount', 'tax', 'net_amount',
+                       'cost_of_goods', 'margin']
+            return query, (start_date, end_date), columns
         
+        raise ValueError(f"Unknown report: {report_type}")
+
+    def iter_report(self, report_type, start_date=None, end_date=None, batch_size=REPORT_BATCH_SIZE):
+        """Yield the rows of a sales, inventory or financial report as dicts.
+
+        Rows are fetched batch by batch, so printing a year of sales holds
+        one batch in memory rather than the whole report.
+        """
+        query, params, columns = self._report_query(report_type, start_date, end_date)
+        cursor = self.conn.cursor()
+        cursor.execute(query, params)
+        while True:
+            rows = cursor.fetchmany(batch_size)
+            if not rows:
+                break
+            for row in rows:
+                yield dict(zip(columns, row))
+
+    def count_report(self, report_type, start_date=None, end_date=None) -> int:
+        """Number of rows iter_report will yield, for progress.
+
+        The reports have a row per product or per sale, so the base table
+        is counted instead of running the grouped query twice.
+        """
+        cursor = self.conn.cursor()
+        if report_type == 'inventory':
+            cursor.execute("SELECT COUNT(*) FROM inventory i JOIN categories c ON i.category_id = c.id")
+        else:
+            cursor.execute(
+                "SELECT COUNT(*) FROM sales WHERE created_epoch BETWEEN ? AND ?",
+                epoch_range(start_date, end_date)
+            )
+        return cursor.fetchone()[0]
+
+    def _load_report(self, report_type, start_date=None, end_date=None):
+        query, params, columns = self._report_query(report_type, start_date, end_date)
+        cursor = self.conn.cursor()
+        cursor.execute(query, params)
+        # Convert to list of dictionaries for easier handling
+        return [dict(zip(columns, row)) for row in cursor.fetchall()]
+
+    def get_sales_report(self, start_date, end_date):
+        """Get sales report data for the given date range"""
+        try:
+            return self._load_report('sales', start_date, end_date)
         except Exception as e:
             logger.error(f"Error getting sales report: {str(e)}")
             raise
 
     def get_inventory_report(self):
         """Get current inventory status report"""
-        cursor = self.conn.cursor()
         try:
-            query = """
-                SELECT 
-                    i.name,
-                    c.name as category,
-                    i.quantity as stock,
-                    i.price,
-                    i.quantity * i.price as value,
-                    CASE 
-                        WHEN i.quantity <= i.alert_threshold THEN 'Low Stock'
-                        ELSE 'Normal'
-                    END as status
-                FROM inventory i
-                JOIN categories c ON i.category_id = c.id
-                ORDER BY i.name
-            """
-            cursor.execute(query)
-            
-            # Convert to list of dictionaries
-            columns = ['name', 'category', 'stock', 'price', 'value', 'status']
-            return [dict(zip(columns, row)) for row in cursor.fetchall()]
-        
+            return self._load_report('inventory')
         except Exception as e:
             logger.error(f"Error getting inventory report: {str(e)}")
             raise
 
+    # Costing
+    def get_cost_method(self) -> str:
+        """Costing method margins are reported with: 'fifo' or 'average'"""
+        method = self.get_setting('cost_method')
+        return method if method in COST_METHODS else DEFAULT_COST_METHOD
+
+    def rebuild_costs(self) -> int:
+        """Recompute cost layers and sale line costs from the full history"""
+        return self.costs.rebuild(self.conn)
+
     def get_financial_report(self, start_date, end_date):
-        """Get financial report for the given date range"""
-        cursor = self.conn.cursor()
+        """Get financial report for the given date range.
+
+        cost_of_goods and margin come from the costs stored on each sale
+        line; they are None for sales with a line of unknown cost.
+        """
         try:
-            query = """
-                SELECT 
-                    s.created_at as date,
-                    GROUP_CONCAT(i.name) as description,
-                    s.total_amount as gross_amount,
-                    s.total_amount * 0.23 as tax,
-                    s.total_amount * 0.77 as net_amount
-                FROM sales s
-                LEFT JOIN sale_items si ON s.id = si.sale_id
-                LEFT JOIN inventory i ON si.product_id = i.id
-                WHERE s.created_at BETWEEN ? AND ?
-                GROUP BY s.id
-                ORDER BY s.created_at DESC
-            """
-            cursor.execute(query, (start_date, end_date))
-            
-            # Convert to list of dictionaries
-            columns = ['date', 'description', 'gross_amount', 'tax', 'net_amount']
-            return [dict(zip(columns, row)) for row in cursor.fetchall()]
-        
+            return self._load_report('financial', start_date, end_date)
         except Exception as e:
             logger.error(f"Error getting financial report: {str(e)}")
             raise
@@ -667,20 +1980,21 @@ class DatabaseManager:
     def get_custom_report(self, report_type, start_date, end_date):
         """Get custom report based on type and date range"""
         cursor = self.conn.cursor()
+        start_date, end_date = epoch_range(start_date, end_date)
         try:
             if report_type == "Top Selling Products":
                 query = """
                     SELECT 
                         i.name as product,
                         SUM(si.quantity) as quantity_sold,
-                        SUM(si.quantity * si.price_at_sale) as total_revenue,
-                        (SUM(si.quantity * si.price_at_sale) * 100.0 / 
-                            (SELECT SUM(total_amount) FROM sales WHERE created_at BETWEEN ? AND ?)) 
+                        SUM(si.quantity * si.price_cents) / 100.0 as total_revenue,
+                        (SUM(si.quantity * si.price_cents) * 100.0 / 
+                            (SELECT SUM(total_cents) FROM sales WHERE created_epoch BETWEEN ? AND ?)) 
                         as sales_percentage
                     FROM sale_items si
                     JOIN inventory i ON si.product_id = i.id
                     JOIN sales s ON si.sale_id = s.id
-                    WHERE s.created_at BETWEEN ? AND ?
+                    WHERE s.created_epoch BETWEEN ? AND ?
                     GROUP BY i.id
                     ORDER BY quantity_sold DESC
                 """
@@ -692,15 +2006,15 @@ class DatabaseManager:
                     SELECT 
                         c.name as category,
                         SUM(si.quantity) as items_sold,
-                        SUM(si.quantity * si.price_at_sale) as total_revenue,
-                        (SUM(si.quantity * si.price_at_sale) * 100.0 / 
-                            (SELECT SUM(total_amount) FROM sales WHERE created_at BETWEEN ? AND ?)) 
+                        SUM(si.quantity * si.price_cents) / 100.0 as total_revenue,
+                        (SUM(si.quantity * si.price_cents) * 100.0 / 
+                            (SELECT SUM(total_cents) FROM sales WHERE created_epoch BETWEEN ? AND ?)) 
                         as sales_percentage
                     FROM sale_items si
                     JOIN inventory i ON si.product_id = i.id
                     JOIN categories c ON i.category_id = c.id
                     JOIN sales s ON si.sale_id = s.id
-                    WHERE s.created_at BETWEEN ? AND ?
+                    WHERE s.created_epoch BETWEEN ? AND ?
                     GROUP BY c.id
                     ORDER BY total_revenue DESC
                 """
@@ -708,20 +2022,66 @@ class DatabaseManager:
                 columns = ['category', 'items_sold', 'total_revenue', 'sales_percentage']
             
             elif report_type == "Daily Sales Summary":
-                query = """
+                query = f"""
                     SELECT 
-                        DATE(created_at) as date,
+                        date(created_epoch / {SECONDS_PER_DAY} * {SECONDS_PER_DAY}, 'unixepoch')
+                        as date,
                         COUNT(*) as number_of_sales,
-                        SUM(total_amount) as total_revenue,
-                        AVG(total_amount) as average_sale
+                        SUM(total_cents) / 100.0 as total_revenue,
+                        AVG(total_cents) / 100.0 as average_sale
                     FROM sales
-                    WHERE created_at BETWEEN ? AND ?
-                    GROUP BY DATE(created_at)
-                    ORDER BY date DESC
+                    WHERE created_epoch BETWEEN ? AND ?
+                    GROUP BY created_epoch / {SECONDS_PER_DAY}
+                    ORDER BY created_epoch / {SECONDS_PER_DAY} DESC
                 """
                 cursor.execute(query, (start_date, end_date))
                 columns = ['date', 'number_of_sales', 'total_revenue', 'average_sale']
             
+            elif report_type == "Margin by Product":
+                cost = f"si.{COST_METHODS[self.get_cost_method()]}"
+                query = f"""
+                    SELECT 
+                        i.name as product,
+                        SUM(si.quantity) as quantity_sold,
+                        SUM(si.quantity * si.price_cents) * 0.77 / 100.0 as net_revenue,
+                        SUM({cost}) / 100.0 as cost_of_goods,
+                        (SUM(si.quantity * si.price_cents) * 0.77 - SUM({cost})) / 100.0 as margin,
+                        (SUM(si.quantity * si.price_cents) * 0.77 - SUM({cost})) * 100.0 /
+                            NULLIF(SUM(si.quantity * si.price_cents) * 0.77, 0)
+                        as margin_percentage
+                    FROM sale_items si
+                    JOIN inventory i ON si.product_id = i.id
+                    JOIN sales s ON si.sale_id = s.id
+                    WHERE s.created_epoch BETWEEN ? AND ?
+                      AND {cost} IS NOT NULL
+                    GROUP BY i.id
+                    ORDER BY margin DESC
+                """
+                cursor.execute(query, (start_date, end_date))
+                columns = ['product', 'quantity_sold', 'net_revenue', 'cost_of_goods',
+                           'margin', 'margin_percentage']
+            
+            elif report_type == "Stock Movement":
+                return self.get_stock_movement(start_date, end_date)
+            
+            elif report_type == "Stock Valuation":
+                # Valued as of the end of the period
+                return self.get_stock_valuation(end_date)
+            
+            elif report_type == "Sales by Store":
+                # This database's own row of the head-office report
+                query = """
+                    SELECT 
+                        ? as store,
+                        COUNT(*) as number_of_sales,
+                        COALESCE(SUM(total_cents), 0) / 100.0 as total_revenue,
+                        COALESCE(AVG(total_cents), 0) / 100.0 as average_sale
+                    FROM sales
+                    WHERE created_epoch BETWEEN ? AND ?
+                """
+                cursor.execute(query, (self.get_location_code() or "This store", start_date, end_date))
+                columns = ['store', 'number_of_sales', 'total_revenue', 'average_sale']
+            
             else:
                 raise ValueError(f"Unknown report type: {report_type}")
             
@@ -732,22 +2092,89 @@ class DatabaseManager:
             logger.error(f"Error getting custom report: {str(e)}")
             raise
 
+    # Locations
+    def get_location_code(self) -> str:
+        """Code of the store this database belongs to, None for a single-store install"""
+        return self.get_setting('location_code')
+
+    def add_location(self, code: str, name: str, db_path=None) -> int:
+        """Register a store and create its database file.
+
+        Every store keeps its inventory, sales and receipts in its own file
+        (data/stores/<code>.db unless given), so no table needs a location
+        column and each store's indexes stay as small as a single shop's.
+        """
+        if db_path is None:
+            db_path = self.db_path.parent / "stores" / f"{code}.db"
+        store = DatabaseManager(db_path)
+        try:
+            store.update_setting('location_code', code)
+            store.update_setting('location_name', name)
+        finally:
+            store.close()
+        
+        cursor = self.conn.cursor()
+        cursor.execute(
+            "INSERT INTO locations (code, name, db_path) VALUES (?, ?, ?)",
+            (code, name, str(db_path))
+        )
+        self.conn.commit()
+        logger.info(f"Added location {code} ({name}) at {db_path}")
+        return cursor.lastrowid
+
+    def get_locations(self, active_only: bool = True) -> list:
+        cursor = self.conn.cursor()
+        cursor.execute(
+            """SELECT id, code, name, db_path, active FROM locations
+               WHERE active = 1 OR ? = 0
+               ORDER BY code""",
+            (1 if active_only else 0,)
+        )
+        columns = ['id', 'code', 'name', 'db_path', 'active']
+        return [dict(zip(columns, row)) for row in cursor.fetchall()]
+
+    def set_location_active(self, code: str, active: bool):
+        cursor = self.conn.cursor()
+        cursor.execute("UPDATE locations SET active = ? WHERE code = ?", (1 if active else 0, code))
+        self.conn.commit()
+
+    def open_location(self, code: str, initialize: bool = False) -> 'DatabaseManager':
+        """A connection to one store's database; the caller closes it"""
+        cursor = self.conn.cursor()
+        cursor.execute("SELECT db_path FROM locations WHERE code = ?", (code,))
+        row = cursor.fetchone()
+        if not row:
+            raise ValueError(f"Unknown location: {code}")
+        return DatabaseManager(row[0], initialize=initialize)
+
+    def get_federated_report(self, report_type, start_date, end_date, codes=None, max_workers=None):
+        """A custom report over several stores (all active ones unless codes are given).
+
+        Each store's partial sums are computed in parallel worker processes
+        against its own file and merged here.
+        """
+        stores = [(location['code'], location['db_path']) for location in self.get_locations()
+                  if codes is None or location['code'] in codes]
+        try:
+            return federated_report(stores, report_type, start_date, end_date, max_workers)
+        except Exception as e:
+            logger.error(f"Error getting federated report: {str(e)}", exc_info=True)
+            raise
+
     def backup_database(self, backup_file):
         """Create a backup of the database."""
         try:
-            # Close current connection
-            self.conn.close()
-            
-            # Copy database file
-            shutil.copy2(str(self.db_path), backup_file)
-            
-            # Reopen connection
-            self.conn = sqlite3.connect(str(self.db_path))
+            # Use the online backup API: with WAL, recent commits may still
+            # live in the -wal file, which a plain file copy would miss
+            backup_conn = sqlite3.connect(backup_file)
+            try:
+                self.conn.backup(backup_conn)
+            finally:
+                backup_conn.close()
             
             return True
         except Exception as e:
-            # Ensure connection is reopened even if backup fails
-            self.conn = sqlite3.connect(str(self.db_path))
+            logger.error(f"Error backing up database: {str(e)}", exc_info=True)
             raise e
 
     def restore_database(self, backup_file):
@@ -764,12 +2191,15 @@ class DatabaseManager:
             shutil.copy2(backup_file, str(self.db_path))
             
             # Reopen connection
-            self.conn = sqlite3.connect(str(self.db_path))
+            self.conn = self._connect()
+            self._data_version = None
+            self.catalog.reset()
             
             return True
         except Exception as e:
             # Ensure connection is reopened even if restore fails
-            self.conn = sqlite3.connect(str(self.db_path))
+            self.conn = self._connect()
+            self._data_version = None
             raise e
 
     # User Management Methods
@@ -839,11 +2269,13 @@ class DatabaseManager:
             # Generate a unique session token
             session_token = hashlib.sha256(str(uuid.uuid4()).encode()).hexdigest()
             
+            now = now_epoch()
             cursor.execute(
                 """INSERT INTO user_sessions 
-                   (user_id, session_token, ip_address)
-                   VALUES (?, ?, ?)""",
-                (user_id, session_token, ip_address)
+                   (user_id, session_token, ip_address, login_time, last_activity,
+                    last_activity_epoch)
+                   VALUES (?, ?, ?, ?, ?, ?)""",
+                (user_id, session_token, ip_address, from_epoch(now), from_epoch(now), now)
             )
             self.conn.commit()
             return session_token
@@ -866,11 +2298,12 @@ class DatabaseManager:
             
             if session and session[4]:  # Check if session exists and user is active
                 # Update last activity
+                now = now_epoch()
                 cursor.execute(
                     """UPDATE user_sessions 
-                       SET last_activity = CURRENT_TIMESTAMP 
+                       SET last_activity = ?, last_activity_epoch = ?
                        WHERE session_token = ?""",
-                    (session_token,)
+                    (from_epoch(now), now, session_token)
                 )
                 self.conn.commit()
                 
@@ -940,11 +2373,13 @@ class DatabaseManager:
         """Log user activity for audit purposes."""
         cursor = self.conn.cursor()
         try:
+            now = now_epoch()
             cursor.execute(
                 """INSERT INTO user_activity_log 
-                   (user_id, activity_type, module, description, ip_address)
-                   VALUES (?, ?, ?, ?, ?)""",
-                (user_id, activity_type, module, description, ip_address)
+                   (user_id, activity_type, module, description, ip_address, timestamp,
+                    timestamp_epoch)
+                   VALUES (?, ?, ?, ?, ?, ?, ?)""",
+                (user_id, activity_type, module, description, ip_address, from_epoch(now), now)
             )
             self.conn.commit()
         except Exception as e:
@@ -955,28 +2390,9 @@ class DatabaseManager:
         """Get user activity log with optional filters."""
         cursor = self.conn.cursor()
         try:
-            query = """
-                SELECT u.username, l.activity_type, l.module, l.description, 
-                       l.ip_address, l.timestamp
-                FROM user_activity_log l
-                JOIN users u ON l.user_id = u.id
-                WHERE 1=1
-            """
-            params = []
-            
-            if user_id:
-                query += " AND l.user_id = ?"
-                params.append(user_id)
-            
-            if start_date:
-                query += " AND l.timestamp >= ?"
-                params.append(start_date)
-            
-            if end_date:
-                query += " AND l.timestamp <= ?"
-                params.append(end_date)
-            
-            query += " ORDER BY l.timestamp DESC"
+            start_date, end_date = epoch_range(start_date, end_date)
+            params = [value for value in (user_id, start_date, end_date) if value]
+            query = QUERIES.sql("activity.log", bool(user_id), bool(start_date), bool(end_date))
             
             cursor.execute(query, params)
             return cursor.fetchall()
@@ -989,28 +2405,11 @@ class DatabaseManager:
         """Update user information."""
         cursor = self.conn.cursor()
         try:
-            updates = []
-            params = []
-            
-            if full_name is not None:
-                updates.append("full_name = ?")
-                params.append(full_name)
-            
-            if email is not None:
-                updates.append("email = ?")
-                params.append(email)
+            fields = (full_name, email, role, is_active)
+            params = [value for value in fields if value is not None]
             
-            if role is not None:
-                updates.append("role = ?")
-                params.append(role)
-            
-            if is_active is not None:
-                updates.append("is_active = ?")
-                params.append(is_active)
-            
-            if updates:
-                updates.append("updated_at = CURRENT_TIMESTAMP")
-                query = f"UPDATE users SET {', '.join(updates)} WHERE id = ?"
+            if params:
+                query = QUERIES.sql("users.update", *(value is not None for value in fields))
                 params.append(user_id)
                 
                 cursor.execute(query, params)
@@ -1111,5 +2510,29 @@ class DatabaseManager:
         self.conn.commit()
         return True
 
+    def check_health(self) -> dict:
+        """Cheap probe that the database file can actually be read"""
+        cursor = self.conn.cursor()
+        start = time.perf_counter()
+        cursor.execute("SELECT COUNT(*) FROM sqlite_master")
+        schema_objects = cursor.fetchone()[0]
+        cursor.execute("PRAGMA journal_mode")
+        journal_mode = cursor.fetchone()[0]
+        return {
+            'schema_objects': schema_objects,
+            'journal_mode': journal_mode,
+            'latency_ms': round((time.perf_counter() - start) * 1000, 3),
+            'statement_cache': self.statement_cache_stats()
+        }
+
+    def statement_cache_stats(self) -> dict:
+        """Compiled statement cache activity on this connection"""
+        return dict(self.conn.statements.stats(), registered=len(QUERIES))
+
+    def close(self):
+        if getattr(self, 'conn', None) is not None:
+            self.conn.close()
+            self.conn = None
+
     def __del__(self):
-        self.conn.close() 
\ No newline at end of file
+        self.close() 
\ No newline at end of file
@@ -0,0 +1,169 @@
+import multiprocessing
+import os
+import sqlite3
+from concurrent.futures import ProcessPoolExecutor
+from .cost_engine import COST_METHODS, DEFAULT_COST_METHOD
+from .timeutil import SECONDS_PER_DAY, day_label, epoch_range
+
+# Each store keeps its own database file; head-office reports run the same
+# partial aggregate in every file and add the partials together. Partials
+# hold only sums and counts so they merge exactly, and averages and shares
+# are worked out once, after the merge. Rows are (key, label, *sums): products are
+# keyed the way transfers match them across stores, by barcode or else by name.
+
+# Below this many stores the queries run in-process; starting workers costs more
+FEDERATION_MIN_PROCESSES = 4
+
+PARTIAL_QUERIES = {
+    "Sales by Store": """
+        SELECT NULL, NULL, COUNT(*), SUM(total_cents)
+        FROM sales
+        WHERE created_epoch BETWEEN ? AND ?
+    """,
+    "Top Selling Products": """
+        SELECT COALESCE(i.barcode, i.name), MIN(i.name), SUM(si.quantity),
+               SUM(si.quantity * si.price_cents)
+        FROM sale_items si
+        JOIN inventory i ON si.product_id = i.id
+        JOIN sales s ON si.sale_id = s.id
+        WHERE s.created_epoch BETWEEN ? AND ?
+        GROUP BY COALESCE(i.barcode, i.name)
+    """,
+    "Sales by Category": """
+        SELECT c.name, c.name, SUM(si.quantity), SUM(si.quantity * si.price_cents)
+        FROM sale_items si
+        JOIN inventory i ON si.product_id = i.id
+        JOIN categories c ON i.category_id = c.id
+        JOIN sales s ON si.sale_id = s.id
+        WHERE s.created_epoch BETWEEN ? AND ?
+        GROUP BY c.name
+    """,
+    "Daily Sales Summary": f"""
+        SELECT created_epoch / {SECONDS_PER_DAY}, NULL, COUNT(*), SUM(total_cents)
+        FROM sales
+        WHERE created_epoch BETWEEN ? AND ?
+        GROUP BY created_epoch / {SECONDS_PER_DAY}
+    """,
+    # {cost} is the sale_items cost column of the store's own costing method
+    "Margin by Product": """
+        SELECT COALESCE(i.barcode, i.name), MIN(i.name), SUM(si.quantity),
+               SUM(si.quantity * si.price_cents), SUM({cost})
+        FROM sale_items si
+        JOIN inventory i ON si.product_id = i.id
+        JOIN sales s ON si.sale_id = s.id
+        WHERE s.created_epoch BETWEEN ? AND ?
+          AND {cost} IS NOT NULL
+        GROUP BY COALESCE(i.barcode, i.name)
+    """,
+}
+FEDERATED_REPORTS = list(PARTIAL_QUERIES)
+# Reports showing each row's share of all sales in the period
+SHARE_REPORTS = ("Top Selling Products", "Sales by Category")
+
+
+def store_partials(code, db_path, report_type, start_epoch, end_epoch):
+    """Run one report's partial aggregate against one store file.
+
+    Runs in a worker process, so it opens its own read-only connection.
+    Returns (rows, sales_total_cents) where rows are (key, label, *sums).
+    """
+    conn = sqlite3.connect(f"file:{db_path}?mode=ro", uri=True)
+    try:
+        query = PARTIAL_QUERIES[report_type]
+        if report_type == "Margin by Product":
+            row = conn.execute("SELECT value FROM settings WHERE key = 'cost_method'").fetchone()
+            method = row[0] if row and row[0] in COST_METHODS else DEFAULT_COST_METHOD
+            query = query.format(cost=f"si.{COST_METHODS[method]}")
+        rows = conn.execute(query, (start_epoch, end_epoch)).fetchall()
+        if report_type == "Sales by Store":
+            rows = [(code, code, *row[2:]) for row in rows]
+        total = 0
+        if report_type in SHARE_REPORTS:
+            total = conn.execute(
+                "SELECT COALESCE(SUM(total_cents), 0) FROM sales WHERE created_epoch BETWEEN ? AND ?",
+                (start_epoch, end_epoch)
+            ).fetchone()[0]
+        return rows, total
+    finally:
+        conn.close()
+
+
+def merge_partials(partials):
+    """Add up (key, label, *sums) rows from every store by key.
+
+    Returns {key: [label, *sums]}, labelled as in the first store having the key.
+    """
+    merged = {}
+    total_cents = 0
+    for rows, total in partials:
+        total_cents += total
+        for key, label, *sums in rows:
+            sums = [value or 0 for value in sums]
+            current = merged.get(key)
+            if current is None:
+                merged[key] = [label, *sums]
+            else:
+                merged[key] = [current[0], *(a + b for a, b in zip(current[1:], sums))]
+    return merged, total_cents
+
+
+def share(part, whole):
+    return part * 100.0 / whole if whole else None
+
+
+def finish_report(report_type, merged, total_cents):
+    """Turn merged sums into rows shaped like get_custom_report's"""
+    if report_type == "Sales by Store":
+        rows = [{'store': code, 'number_of_sales': count, 'total_revenue': cents / 100.0,
+                 'average_sale': cents / 100.0 / count if count else 0.0}
+                for code, count, cents in merged.values()]
+        return sorted(rows, key=lambda row: row['total_revenue'], reverse=True)
+
+    if report_type in SHARE_REPORTS:
+        label = 'product' if report_type == "Top Selling Products" else 'category'
+        quantity = 'quantity_sold' if report_type == "Top Selling Products" else 'items_sold'
+        rows = [{label: name, quantity: sold, 'total_revenue': cents / 100.0,
+                 'sales_percentage': share(cents, total_cents)}
+                for name, sold, cents in merged.values()]
+        order = quantity if report_type == "Top Selling Products" else 'total_revenue'
+        return sorted(rows, key=lambda row: row[order], reverse=True)
+
+    if report_type == "Daily Sales Summary":
+        return [{'date': day_label(day), 'number_of_sales': count, 'total_revenue': cents / 100.0,
+                 'average_sale': cents / 100.0 / count if count else 0.0}
+                for day, (label, count, cents) in sorted(merged.items(), reverse=True)]
+
+    if report_type == "Margin by Product":
+        rows = []
+        for name, sold, revenue, cost in merged.values():
+            net = revenue * 0.77
+            rows.append({'product': name, 'quantity_sold': sold, 'net_revenue': net / 100.0,
+                         'cost_of_goods': cost / 100.0, 'margin': (net - cost) / 100.0,
+                         'margin_percentage': share(net - cost, net)})
+        return sorted(rows, key=lambda row: row['margin'], reverse=True)
+
+    raise ValueError(f"Unknown report type: {report_type}")
+
+
+def federated_report(stores, report_type, start_date, end_date, max_workers=None):
+    """A report over every store in stores, a list of (code, db_path).
+
+    Stores are queried in parallel worker processes once there are
+    FEDERATION_MIN_PROCESSES or more of them.
+    """
+    if report_type not in PARTIAL_QUERIES:
+        raise ValueError(f"Unknown report type: {report_type}")
+    start_epoch, end_epoch = epoch_range(start_date, end_date)
+    jobs = [(code, str(db_path), report_type, start_epoch, end_epoch) for code, db_path in stores]
+
+    workers = min(len(jobs), max_workers or os.cpu_count() or 1)
+    if len(jobs) < FEDERATION_MIN_PROCESSES or workers <= 1:
+        partials = [store_partials(*job) for job in jobs]
+    else:
+        # Spawned rather than forked: the GUI process has Qt and SQLite threads running
+        context = multiprocessing.get_context('spawn')
+        with ProcessPoolExecutor(max_workers=workers, mp_context=context) as pool:
+            partials = list(pool.map(store_partials, *zip(*jobs)))
+
+    merged, total_cents = merge_partials(partials)
+    return finish_report(report_type, merged, total_cents)
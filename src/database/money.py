@@ -0,0 +1,105 @@
+from decimal import Decimal, ROUND_HALF_UP
+from functools import total_ordering
+
+# Minor units per currency unit
+CENTS = 100
+
+
+def to_cents(value):
+    """Round an amount in currency units (float, str, Decimal or Money) to integer cents"""
+    if value is None:
+        return None
+    if isinstance(value, Money):
+        return value.cents
+    if isinstance(value, int):
+        return value * CENTS
+    # str() gives the shortest repr, so 1.005 rounds to 101 rather than 100.49999...
+    return int((Decimal(str(value)) * CENTS).quantize(Decimal(1), rounding=ROUND_HALF_UP))
+
+
+def to_units(cents):
+    """Integer cents back to a float amount for display and the legacy REAL columns"""
+    return None if cents is None else cents / CENTS
+
+
+def round_cents(value):
+    """Round a fractional number of cents half up"""
+    return int(Decimal(str(value)).quantize(Decimal(1), rounding=ROUND_HALF_UP))
+
+
+@total_ordering
+class Money:
+    """An exact amount held in integer cents.
+
+    Adding, subtracting and multiplying by a quantity stay in integers;
+    only rates (tax) round, half up, to the cent. Formats like a float,
+    so f"${amount:.2f}" works unchanged.
+    """
+
+    __slots__ = ('cents',)
+
+    def __init__(self, cents=0):
+        self.cents = int(cents)
+
+    @classmethod
+    def of(cls, value):
+        """Money from an amount in currency units"""
+        return cls(to_cents(value))
+
+    def apply_rate(self, rate):
+        return Money(round_cents(self.cents * rate))
+
+    def __add__(self, other):
+        if isinstance(other, Money):
+            return Money(self.cents + other.cents)
+        if other == 0:
+            # Lets sum() start from its default 0
+            return self
+        return NotImplemented
+
+    __radd__ = __add__
+
+    def __sub__(self, other):
+        if isinstance(other, Money):
+            return Money(self.cents - other.cents)
+        return NotImplemented
+
+    def __mul__(self, quantity):
+        if isinstance(quantity, int):
+            return Money(self.cents * quantity)
+        return NotImplemented
+
+    __rmul__ = __mul__
+
+    def __neg__(self):
+        return Money(-self.cents)
+
+    def __eq__(self, other):
+        if isinstance(other, Money):
+            return self.cents == other.cents
+        return NotImplemented
+
+    def __lt__(self, other):
+        if isinstance(other, Money):
+            return self.cents < other.cents
+        return NotImplemented
+
+    def __hash__(self):
+        return hash(self.cents)
+
+    def __bool__(self):
+        return self.cents != 0
+
+    def __float__(self):
+        return self.cents / CENTS
+
+    def __format__(self, spec):
+        return format(float(self), spec) if spec else str(self)
+
+    def __str__(self):
+        sign = "-" if self.cents < 0 else ""
+        units, cents = divmod(abs(self.cents), CENTS)
+        return f"{sign}{units}.{cents:02d}"
+
+    def __repr__(self):
+        return f"Money('{self}')"
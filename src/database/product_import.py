@@ -0,0 +1,315 @@
+import csv
+import io
+import logging
+import math
+import os
+from decimal import Decimal, ROUND_HALF_UP
+
+try:
+    import openpyxl
+except ImportError:
+    openpyxl = None
+
+logger = logging.getLogger('TerranPOS')
+
+# Rows validated and written per transaction; the write lock is released in between
+IMPORT_CHUNK_SIZE = 5000
+# Bytes of a CSV file looked at to guess its delimiter
+SNIFF_BYTES = 64 * 1024
+
+# Accepted header spellings for each product field
+HEADER_ALIASES = {
+    'name': ('name', 'product', 'product name'),
+    'barcode': ('barcode', 'ean', 'upc', 'gtin'),
+    'category': ('category', 'category name'),
+    'quantity': ('quantity', 'qty', 'stock'),
+    'price': ('price', 'selling price', 'unit price'),
+    'alert_threshold': ('alert threshold', 'reorder level', 'min stock'),
+    'description': ('description', 'notes'),
+}
+REQUIRED_FIELDS = ('name', 'price')
+
+# Columns of a supplier delivery note, for goods receiving
+DELIVERY_HEADER_ALIASES = {
+    'code': ('barcode', 'ean', 'upc', 'gtin', 'code', 'product id'),
+    'quantity': ('quantity', 'qty', 'units'),
+    'purchase_price': ('purchase price', 'cost', 'unit cost', 'cost price'),
+    'selling_price': ('selling price', 'price', 'retail price'),
+    'notes': ('notes', 'lot', 'batch'),
+}
+DELIVERY_REQUIRED_FIELDS = ('code', 'quantity', 'purchase_price')
+
+
+class ProductImportError(Exception):
+    """The file as a whole cannot be imported (format, missing columns)"""
+
+
+class RowReader:
+    """Streams the rows of a CSV or XLSX file without loading it whole"""
+
+    def __init__(self, path):
+        self.path = path
+        self._close = None
+        extension = os.path.splitext(path)[1].lower()
+        if extension == '.csv':
+            self._open_csv()
+        elif extension == '.xlsx':
+            self._open_xlsx()
+        else:
+            raise ProductImportError(f"Unsupported file type: {extension or path}")
+
+    def _open_csv(self):
+        raw = open(self.path, 'rb')
+        self._close = raw.close
+        size = os.path.getsize(self.path) or 1
+        sample = raw.read(SNIFF_BYTES).decode('utf-8-sig', errors='ignore')
+        raw.seek(0)
+        try:
+            dialect = csv.Sniffer().sniff(sample, delimiters=",;\t|")
+        except csv.Error:
+            dialect = csv.excel
+        reader = csv.reader(io.TextIOWrapper(raw, encoding='utf-8-sig', newline=''), dialect)
+        self.header = next(reader, [])
+        self._rows = ((reader.line_num, row) for row in reader)
+        # The text layer reads ahead, so the byte position is approximate
+        self.fraction = lambda: min(raw.tell() / size, 1.0)
+
+    def _open_xlsx(self):
+        if openpyxl is None:
+            raise ProductImportError("Reading .xlsx files requires the openpyxl package")
+        workbook = openpyxl.load_workbook(self.path, read_only=True, data_only=True)
+        self._close = workbook.close
+        sheet = workbook.active
+        rows = sheet.iter_rows(values_only=True)
+        self.header = list(next(rows, ()))
+        total = sheet.max_row or 0
+        self._line = 1
+
+        def numbered():
+            for line, row in enumerate(rows, start=2):
+                self._line = line
+                yield line, list(row)
+
+        self._rows = numbered()
+        self.fraction = lambda: min(self._line / total, 1.0) if total else 0.0
+
+    def __iter__(self):
+        return self._rows
+
+    def close(self):
+        if self._close:
+            self._close()
+            self._close = None
+
+
+def map_header(header, aliases=HEADER_ALIASES, required=REQUIRED_FIELDS):
+    """Column index of each known field, from the file's header row"""
+    columns = {}
+    for index, title in enumerate(header):
+        title = " ".join(str(title or "").replace('_', ' ').lower().split())
+        for field, names in aliases.items():
+            if title in names and field not in columns:
+                columns[field] = index
+    missing = [field for field in required if field not in columns]
+    if missing:
+        raise ProductImportError(f"Missing required column(s): {', '.join(missing)}")
+    return columns
+
+
+def _text(value):
+    if value is None:
+        return None
+    if isinstance(value, float) and value.is_integer():
+        # Spreadsheets store long numeric codes as floats
+        value = int(value)
+    value = str(value).strip()
+    return value or None
+
+
+def _number(value, field):
+    text = _text(value)
+    if text is None:
+        return None
+    try:
+        number = float(text.replace(',', '.')) if isinstance(value, str) else float(value)
+    except ValueError:
+        raise ValueError(f"{field} is not a number: {text}")
+    # float() takes nan and inf, which no comparison rejects
+    if not math.isfinite(number):
+        raise ValueError(f"{field} is not a number: {text}")
+    if number < 0:
+        raise ValueError(f"{field} cannot be negative: {text}")
+    return number
+
+
+def _amount(value, field):
+    """A money amount rounded half up to the cent, once, from its decimal text"""
+    number = _number(value, field)
+    if number is None:
+        return None
+    return float(Decimal(str(number)).quantize(Decimal('0.01'), rounding=ROUND_HALF_UP))
+
+
+def _count(value, field):
+    number = _number(value, field)
+    if number is None:
+        return None
+    if not number.is_integer():
+        raise ValueError(f"{field} must be a whole number: {_text(value)}")
+    return int(number)
+
+
+class ProductImporter:
+    """Bulk product import from a supplier CSV/XLSX catalogue.
+
+    Rows are validated and written IMPORT_CHUNK_SIZE at a time through
+    DatabaseManager.upsert_products, each chunk in its own transaction so
+    tills can still check out between chunks. Products are matched on
+    barcode; category names resolve through an in-memory map and unknown
+    ones are created. Bad rows are skipped and reported with their line.
+    """
+
+    def __init__(self, db_manager, chunk_size=IMPORT_CHUNK_SIZE, create_categories=True):
+        self.db_manager = db_manager
+        self.chunk_size = chunk_size
+        self.create_categories = create_categories
+        self.categories = {}
+
+    def load_categories(self):
+        self.categories = {category[1].strip().lower(): category[0]
+                           for category in self.db_manager.get_all_categories()}
+
+    def resolve_category(self, name):
+        if name is None:
+            return None
+        category_id = self.categories.get(name.lower())
+        if category_id is None:
+            if not self.create_categories:
+                raise ValueError(f"Unknown category: {name}")
+            category_id = self.db_manager.add_category(name)
+            self.categories[name.lower()] = category_id
+        return category_id
+
+    def parse_row(self, values, columns):
+        """Validate one row and return it in upsert_products' tuple shape"""
+        def cell(field):
+            index = columns.get(field)
+            return values[index] if index is not None and index < len(values) else None
+
+        name = _text(cell('name'))
+        if name is None:
+            raise ValueError("name is required")
+        price = _amount(cell('price'), 'price')
+        if price is None:
+            raise ValueError("price is required")
+        return (
+            name,
+            self.resolve_category(_text(cell('category'))),
+            _count(cell('quantity'), 'quantity'),
+            price,
+            _count(cell('alert_threshold'), 'alert threshold'),
+            _text(cell('description')),
+            _text(cell('barcode')),
+        )
+
+    def run(self, path, progress=None, cancelled=None) -> dict:
+        """Import path; progress(rows_done, fraction) is called after each chunk.
+
+        cancelled() is checked between chunks; chunks already written stay.
+        """
+        result = {'rows': 0, 'inserted': 0, 'updated': 0, 'errors': [], 'cancelled': False}
+        reader = RowReader(path)
+        try:
+            columns = map_header(reader.header)
+            self.load_categories()
+            chunk = {}
+            unkeyed = []
+            for line, values in reader:
+                if not any(_text(value) for value in values):
+                    continue
+                result['rows'] += 1
+                try:
+                    product = self.parse_row(values, columns)
+                except ValueError as e:
+                    result['errors'].append((line, str(e)))
+                    continue
+                if product[6]:
+                    # A barcode repeated within a chunk keeps its last row
+                    chunk[product[6]] = product
+                else:
+                    unkeyed.append(product)
+
+                if len(chunk) + len(unkeyed) >= self.chunk_size:
+                    self._write(list(chunk.values()) + unkeyed, result)
+                    chunk, unkeyed = {}, []
+                    if progress:
+                        progress(result['rows'], reader.fraction())
+                    if cancelled and cancelled():
+                        result['cancelled'] = True
+                        break
+            else:
+                if chunk or unkeyed:
+                    self._write(list(chunk.values()) + unkeyed, result)
+                if progress:
+                    progress(result['rows'], 1.0)
+        finally:
+            reader.close()
+
+        logger.info(
+            f"Imported {path}: {result['inserted']} added, {result['updated']} updated, "
+            f"{len(result['errors'])} rejected{' (cancelled)' if result['cancelled'] else ''}"
+        )
+        return result
+
+    def _write(self, products, result):
+        counts = self.db_manager.upsert_products(products)
+        result['inserted'] += counts['inserted']
+        result['updated'] += counts['updated']
+
+
+def read_delivery_note(path, db_manager) -> dict:
+    """Lines of a supplier delivery note resolved to products by barcode or ID.
+
+    Returns {'lines': [...], 'errors': [(line, message), ...]}; each line is
+    a dict ready for DatabaseManager.receive_delivery plus code and name.
+    """
+    lines = []
+    errors = []
+    reader = RowReader(path)
+    try:
+        columns = map_header(reader.header, DELIVERY_HEADER_ALIASES, DELIVERY_REQUIRED_FIELDS)
+
+        def cell(values, field):
+            index = columns.get(field)
+            return values[index] if index is not None and index < len(values) else None
+
+        for line, values in reader:
+            if not any(_text(value) for value in values):
+                continue
+            try:
+                code = _text(cell(values, 'code'))
+                product = db_manager.find_product_by_code(code) if code else None
+                if product is None:
+                    raise ValueError(f"unknown product: {code}")
+                quantity = _count(cell(values, 'quantity'), 'quantity')
+                if not quantity:
+                    raise ValueError("quantity must be at least 1")
+                purchase_price = _number(cell(values, 'purchase_price'), 'purchase price')
+                if purchase_price is None:
+                    raise ValueError("purchase price is required")
+                selling_price = _number(cell(values, 'selling_price'), 'selling price')
+            except ValueError as e:
+                errors.append((line, str(e)))
+                continue
+            lines.append({
+                'product_id': product[0],
+                'code': code,
+                'name': product[1],
+                'quantity': quantity,
+                'purchase_price': round(purchase_price, 2),
+                'selling_price': round(selling_price, 2) if selling_price is not None else None,
+                'notes': _text(cell(values, 'notes')),
+            })
+    finally:
+        reader.close()
+    return {'lines': lines, 'errors': errors}
@@ -0,0 +1,368 @@
+import os
+import threading
+
+# Compiled statements kept per connection (sqlite3's cached_statements)
+STATEMENT_CACHE_SIZE = int(os.environ.get("TERRAN_STATEMENT_CACHE", "256"))
+
+# Stock held by other tills' unexpired reservations for product i.id
+RESERVED_ELSEWHERE = """COALESCE((SELECT SUM(r.quantity) FROM stock_reservations r
+                   WHERE r.product_id = i.id AND r.expires_at > ? AND r.till_id != ?), 0)"""
+
+PRODUCT_SELECT = """SELECT i.*, c.name as category_name
+               FROM inventory i
+               JOIN categories c ON i.category_id = c.id"""
+
+# ID lists are bound as one JSON array so the statement text does not depend on their length
+IDS_PARAM = "(SELECT value FROM json_each(?))"
+
+
+class QueryRegistry:
+    """Named SQL statements, each with one fixed text.
+
+    sqlite3 caches compiled statements per connection keyed by their exact
+    text, so a statement only skips parsing when it is spelled the same way
+    every time. Dynamic filters register a builder instead of SQL; each
+    combination of filters present (the shape) is built once and reused, so
+    there are a bounded number of variants rather than one per call.
+    """
+
+    def __init__(self):
+        self._statements = {}
+        self._builders = {}
+        self._lock = threading.Lock()
+
+    def register(self, name, sql):
+        self._statements[name] = sql
+
+    def register_variants(self, name, builder):
+        """builder(*shape) returns the SQL for one combination of flags"""
+        self._builders[name] = builder
+
+    def sql(self, name, *shape):
+        if not shape:
+            return self._statements[name]
+        key = (name, shape)
+        sql = self._statements.get(key)
+        if sql is None:
+            with self._lock:
+                sql = self._statements.setdefault(key, self._builders[name](*shape))
+        return sql
+
+    def __len__(self):
+        return len(self._statements)
+
+
+QUERIES = QueryRegistry()
+
+QUERIES.register("products.all", PRODUCT_SELECT + " ORDER BY i.name")
+QUERIES.register("products.by_ids", PRODUCT_SELECT + f" WHERE i.id IN {IDS_PARAM}")
+QUERIES.register(
+    "stock.available_many",
+    f"""SELECT i.id, i.quantity - {RESERVED_ELSEWHERE}
+               FROM inventory i
+               WHERE i.id IN {IDS_PARAM}"""
+)
+QUERIES.register(
+    "stock.available_one",
+    f"SELECT i.quantity - {RESERVED_ELSEWHERE} FROM inventory i WHERE i.id = ?"
+)
+QUERIES.register(
+    "sales.decrement_stock",
+    f"""UPDATE inventory AS i
+                       SET quantity = quantity - ?,
+                           updated_at = CURRENT_TIMESTAMP
+                       WHERE i.id = ? AND i.quantity - ? >= {RESERVED_ELSEWHERE}"""
+)
+QUERIES.register(
+    "reservations.delete_for_products",
+    f"""DELETE FROM stock_reservations
+                   WHERE till_id = ? AND product_id IN {IDS_PARAM}"""
+)
+
+# Bulk import rows are (name, category_id, quantity, price, alert_threshold, description,
+# barcode, price_cents); a NULL optional column takes its default on insert and keeps the
+# stored value on update
+IMPORTED_VALUES = "(?1, COALESCE(?2, 1), COALESCE(?3, 0), ?8 / 100.0, COALESCE(?5, 10), ?6, ?7, ?8)"
+QUERIES.register(
+    "products.import_insert",
+    f"""INSERT INTO inventory (name, category_id, quantity, price, alert_threshold,
+                                  description, barcode, price_cents)
+           VALUES {IMPORTED_VALUES}"""
+)
+QUERIES.register(
+    "products.import_upsert",
+    f"""INSERT INTO inventory (name, category_id, quantity, price, alert_threshold,
+                                  description, barcode, price_cents)
+           VALUES {IMPORTED_VALUES}
+           ON CONFLICT (barcode) WHERE barcode IS NOT NULL DO UPDATE
+           SET name = excluded.name,
+               category_id = COALESCE(?2, category_id),
+               quantity = COALESCE(?3, quantity),
+               price = excluded.price,
+               price_cents = excluded.price_cents,
+               alert_threshold = COALESCE(?5, alert_threshold),
+               description = COALESCE(?6, description),
+               updated_at = CURRENT_TIMESTAMP"""
+)
+
+# Goods received note lines, prices in cents; a NULL selling price keeps the product's
+# current price
+SELLING_CENTS = "COALESCE(?5, (SELECT price_cents FROM inventory WHERE id = ?1))"
+QUERIES.register(
+    "deliveries.insert_line",
+    f"""INSERT INTO stock_receiving
+           (product_id, supplier, quantity, purchase_price, selling_price, notes, grn_id,
+            purchase_price_cents, selling_price_cents, received_at, received_epoch)
+           VALUES (?1, ?2, ?3, ?4 / 100.0, {SELLING_CENTS} / 100.0, ?6, ?7, ?4, {SELLING_CENTS},
+                   ?8, ?9)"""
+)
+QUERIES.register(
+    "deliveries.unknown_products",
+    """SELECT DISTINCT value FROM json_each(?)
+           WHERE value NOT IN (SELECT id FROM inventory)"""
+)
+# One statement for the whole delivery; a product on several lines takes the
+# selling price of its last line (SQLite returns the bare column from the MAX row)
+QUERIES.register(
+    "deliveries.apply_to_inventory",
+    """UPDATE inventory AS i
+           SET quantity = i.quantity + d.quantity,
+               price = d.selling_price_cents / 100.0,
+               price_cents = d.selling_price_cents,
+               updated_at = CURRENT_TIMESTAMP
+           FROM (SELECT product_id, SUM(quantity) AS quantity, MAX(id), selling_price_cents
+                 FROM stock_receiving
+                 WHERE grn_id = ?
+                 GROUP BY product_id) AS d
+           WHERE i.id = d.product_id"""
+)
+
+
+# Cost layers: one FIFO layer per receipt line plus a moving average per product, in cents
+QUERIES.register(
+    "costs.add_layers",
+    f"""INSERT INTO cost_layers (receipt_id, product_id, quantity, remaining, unit_cost_cents,
+                                    received_at)
+           SELECT id, product_id, quantity, quantity, purchase_price_cents, received_at
+           FROM stock_receiving
+           WHERE id IN {IDS_PARAM}
+           ORDER BY id"""
+)
+QUERIES.register(
+    "costs.fold_average",
+    f"""INSERT INTO product_costs (product_id, quantity, average_cost_cents)
+           SELECT product_id, SUM(quantity),
+                  CAST(SUM(quantity * purchase_price_cents) AS REAL) / SUM(quantity)
+           FROM stock_receiving
+           WHERE id IN {IDS_PARAM}
+           GROUP BY product_id
+           ON CONFLICT (product_id) DO UPDATE
+           SET average_cost_cents = (quantity * average_cost_cents
+                                     + excluded.quantity * excluded.average_cost_cents)
+                                    / (quantity + excluded.quantity),
+               quantity = quantity + excluded.quantity,
+               updated_at = CURRENT_TIMESTAMP"""
+)
+QUERIES.register(
+    "costs.product_average",
+    "SELECT average_cost_cents FROM product_costs WHERE product_id = ?"
+)
+QUERIES.register(
+    "costs.open_layers",
+    """SELECT id, remaining, unit_cost_cents FROM cost_layers
+           WHERE product_id = ? AND remaining > 0
+           ORDER BY id"""
+)
+QUERIES.register("costs.update_layer", "UPDATE cost_layers SET remaining = ? WHERE id = ?")
+QUERIES.register(
+    "costs.take_average",
+    """UPDATE product_costs
+           SET quantity = MAX(quantity - ?, 0), updated_at = CURRENT_TIMESTAMP
+           WHERE product_id = ?"""
+)
+QUERIES.register(
+    "costs.set_line_cost",
+    "UPDATE sale_items SET cost_fifo_cents = ?, cost_average_cents = ? WHERE id = ?"
+)
+# Receipts sort before sales made at the same second, and sales before stock sent to other stores
+QUERIES.register(
+    "costs.history",
+    """SELECT 0 AS kind, id, product_id, quantity, purchase_price_cents, received_epoch AS at
+           FROM stock_receiving
+           UNION ALL
+           SELECT 1, si.id, si.product_id, si.quantity, NULL, s.created_epoch
+           FROM sale_items si
+           JOIN sales s ON si.sale_id = s.id
+           UNION ALL
+           SELECT 2, id, product_id, -quantity, NULL, created_epoch
+           FROM stock_movements
+           WHERE kind = 'transfer_out'
+           ORDER BY at, kind, id"""
+)
+
+
+# Stock movements: the append-only ledger of stock moved in and out of this store
+QUERIES.register(
+    "movements.insert",
+    """INSERT INTO stock_movements (product_id, kind, quantity, reference, cost_cents, created_epoch)
+           VALUES (?, ?, ?, ?, ?, ?)"""
+)
+QUERIES.register(
+    "movements.for_reference",
+    """SELECT product_id, quantity, cost_cents FROM stock_movements
+           WHERE reference = ? AND kind = ?
+           ORDER BY id"""
+)
+QUERIES.register("movements.on_hand", f"SELECT id, quantity FROM inventory WHERE id IN {IDS_PARAM}")
+# A sale's movements, one per product, costed with the store's method ({cost} is its sale_items column)
+QUERIES.register_variants(
+    "movements.from_sale",
+    lambda cost: f"""INSERT INTO stock_movements
+           (product_id, kind, quantity, reference, cost_cents, created_epoch)
+           SELECT product_id, 'sale', -SUM(quantity), 'sale:' || sale_id, SUM({cost}), ?
+           FROM sale_items
+           WHERE sale_id = ?
+           GROUP BY product_id"""
+)
+QUERIES.register(
+    "movements.from_delivery",
+    """INSERT INTO stock_movements
+           (product_id, kind, quantity, reference, cost_cents, created_epoch)
+           SELECT product_id, ?, SUM(quantity), ?, SUM(quantity * purchase_price_cents), ?
+           FROM stock_receiving
+           WHERE grn_id = ?
+           GROUP BY product_id"""
+)
+# Movements in (after, until] by product, for replaying from a snapshot either way
+QUERIES.register_variants(
+    "movements.replay",
+    lambda ids: f"""SELECT product_id, SUM(quantity) FROM stock_movements
+           WHERE created_epoch > ? AND created_epoch <= ?
+           {f"AND product_id IN {IDS_PARAM}" if ids else ""}
+           GROUP BY product_id"""
+)
+QUERIES.register(
+    "movements.by_kind",
+    """SELECT product_id, kind, SUM(quantity) FROM stock_movements
+           WHERE created_epoch > ? AND created_epoch <= ?
+           GROUP BY product_id, kind"""
+)
+
+
+# Stock snapshots: quantities on hand after every movement up to snapshot_epoch
+QUERIES.register(
+    "snapshots.before",
+    """SELECT id, snapshot_epoch FROM stock_snapshots
+           WHERE snapshot_epoch <= ?
+           ORDER BY snapshot_epoch DESC
+           LIMIT 1"""
+)
+QUERIES.register(
+    "snapshots.after",
+    """SELECT id, snapshot_epoch FROM stock_snapshots
+           WHERE snapshot_epoch > ?
+           ORDER BY snapshot_epoch
+           LIMIT 1"""
+)
+QUERIES.register_variants(
+    "snapshots.lines",
+    lambda ids: f"""SELECT product_id, quantity, unit_cost_cents FROM stock_snapshot_lines
+           WHERE snapshot_id = ?
+           {f"AND product_id IN {IDS_PARAM}" if ids else ""}"""
+)
+# The live inventory serves as the newest snapshot
+QUERIES.register_variants(
+    "snapshots.inventory_lines",
+    lambda ids: f"""SELECT i.id, i.quantity, pc.average_cost_cents
+           FROM inventory i
+           LEFT JOIN product_costs pc ON pc.product_id = i.id
+           {f"WHERE i.id IN {IDS_PARAM}" if ids else ""}"""
+)
+
+
+# Transfers between stores, kept by the head office; products are matched across
+# store databases by barcode, or by name when they have none
+QUERIES.register(
+    "transfers.product_by_barcode",
+    "SELECT id FROM inventory WHERE barcode = ?"
+)
+QUERIES.register(
+    "transfers.product_by_name",
+    "SELECT id FROM inventory WHERE name = ? ORDER BY id LIMIT 1"
+)
+QUERIES.register(
+    "transfers.set_status",
+    f"""UPDATE transfers SET status = ?, last_error = NULL
+           WHERE id = ? AND status IN {IDS_PARAM}"""
+)
+QUERIES.register(
+    "transfers.add_in_transit",
+    """INSERT INTO stock_in_transit (location_code, product_key, quantity)
+           SELECT ?, COALESCE(barcode, product_name), SUM(quantity)
+           FROM transfer_lines
+           WHERE transfer_id = ?
+           GROUP BY COALESCE(barcode, product_name)
+           ON CONFLICT (location_code, product_key) DO UPDATE
+           SET quantity = quantity + excluded.quantity"""
+)
+QUERIES.register(
+    "transfers.take_in_transit",
+    """UPDATE stock_in_transit AS t
+           SET quantity = t.quantity - l.quantity
+           FROM (SELECT COALESCE(barcode, product_name) AS product_key, SUM(quantity) AS quantity
+                 FROM transfer_lines
+                 WHERE transfer_id = ?
+                 GROUP BY COALESCE(barcode, product_name)) AS l
+           WHERE t.location_code = ? AND t.product_key = l.product_key"""
+)
+
+
+def _stock_history(product, start, end, before, limit):
+    query = """
+            SELECT sr.*, i.name as product_name
+            FROM stock_receiving sr
+            JOIN inventory i ON sr.product_id = i.id
+            WHERE 1=1
+        """
+    if product:
+        query += " AND sr.product_id = ?"
+    if start:
+        query += " AND sr.received_epoch >= ?"
+    if end:
+        query += " AND sr.received_epoch <= ?"
+    if before:
+        query += " AND (sr.received_epoch < ? OR (sr.received_epoch = ? AND sr.id < ?))"
+    query += " ORDER BY sr.received_epoch DESC, sr.id DESC"
+    if limit:
+        query += " LIMIT ?"
+    return query
+
+
+def _activity_log(user, start, end):
+    query = """
+                SELECT u.username, l.activity_type, l.module, l.description,
+                       l.ip_address, l.timestamp
+                FROM user_activity_log l
+                JOIN users u ON l.user_id = u.id
+                WHERE 1=1
+            """
+    if user:
+        query += " AND l.user_id = ?"
+    if start:
+        query += " AND l.timestamp_epoch >= ?"
+    if end:
+        query += " AND l.timestamp_epoch <= ?"
+    query += " ORDER BY l.timestamp_epoch DESC"
+    return query
+
+
+def _update_user(full_name, email, role, is_active):
+    columns = [column for column, present in (("full_name", full_name), ("email", email),
+                                              ("role", role), ("is_active", is_active)) if present]
+    updates = [f"{column} = ?" for column in columns] + ["updated_at = CURRENT_TIMESTAMP"]
+    return f"UPDATE users SET {', '.join(updates)} WHERE id = ?"
+
+
+QUERIES.register_variants("stock.history", _stock_history)
+QUERIES.register_variants("activity.log", _activity_log)
+QUERIES.register_variants("users.update", _update_user)
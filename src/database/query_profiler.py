@@ -0,0 +1,287 @@
+import heapq
+import logging
+import os
+import sqlite3
+import sys
+import threading
+import time
+from collections import OrderedDict, deque
+
+logger = logging.getLogger('TerranPOS')
+
+# Profiling is opt-in: stack walking and bookkeeping on every statement cost far more than
+# the statements of a checkout themselves. Also enabled by the profile_queries setting.
+PROFILE_QUERIES = os.environ.get("TERRAN_PROFILE_QUERIES", "0") not in ("", "0")
+# Statements slower than this are logged with their query plan
+SLOW_QUERY_MS = float(os.environ.get("TERRAN_SLOW_QUERY_MS", "100"))
+# Slowest statements kept for the admin dialog
+TOP_N = 50
+# Recent slow statements kept in order of arrival
+SLOW_LOG_SIZE = 200
+
+# Statements EXPLAIN QUERY PLAN can describe
+EXPLAINABLE = ("SELECT", "INSERT", "UPDATE", "DELETE", "WITH", "REPLACE")
+
+# Same form as the co_filename of code in this package, which is not normalised
+DATABASE_DIR = os.path.dirname(__file__)
+
+
+def params_shape(params, many=False):
+    """Describe parameters by type only; values may be personal data or password hashes"""
+    if many:
+        params = list(params)
+        first = params[0] if params else ()
+        return f"{len(params)} x {params_shape(first)}"
+    if not params:
+        return "()"
+    if isinstance(params, dict):
+        return "{" + ", ".join(f"{key}: {type(value).__name__}" for key, value in params.items()) + "}"
+    return "(" + ", ".join(type(value).__name__ for value in params) + ")"
+
+
+def calling_code():
+    """Where a statement came from, e.g. "pos_window.py:filter_products > search_catalog".
+
+    The first frame outside the database package names the screen or
+    service; the outermost frame inside it names the DatabaseManager method.
+    """
+    frame = sys._getframe(1)
+    method = None
+    while frame is not None:
+        filename = frame.f_code.co_filename
+        if not filename.startswith(DATABASE_DIR):
+            caller = f"{os.path.basename(filename)}:{frame.f_code.co_name}"
+            return f"{caller} > {method}" if method else caller
+        method = frame.f_code.co_name
+        frame = frame.f_back
+    return method or "unknown"
+
+
+class QueryProfiler:
+    """Collects statement timings from ProfilingCursor.
+
+    Keeps per-statement totals (grouped by SQL text and the calling code
+    outside the database package), a heap of the TOP_N slowest executions
+    and a bounded log of recent slow statements. Shared by all connections,
+    so it is thread safe.
+    """
+
+    def __init__(self, threshold_ms=SLOW_QUERY_MS, top_n=TOP_N):
+        self.enabled = PROFILE_QUERIES
+        self.threshold_ms = threshold_ms
+        self.top_n = top_n
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self._lock:
+            self._stats = {}
+            self._slowest = []
+            self._slow_log = deque(maxlen=SLOW_LOG_SIZE)
+            self._sequence = 0
+
+    def record(self, conn, sql, params, shape, duration, rows):
+        duration_ms = duration * 1000
+        source = calling_code()
+        text = " ".join(sql.split())
+        details = {
+            'sql': text, 'source': source, 'params': shape, 'rows': rows,
+            'duration_ms': duration_ms, 'at': time.time(), 'plan': ''
+        }
+        with self._lock:
+            stats = self._stats.get((text, source))
+            if stats is None:
+                stats = self._stats[(text, source)] = {
+                    'sql': text, 'source': source, 'count': 0,
+                    'total_ms': 0.0, 'max_ms': 0.0, 'rows': 0
+                }
+            stats['count'] += 1
+            stats['total_ms'] += duration_ms
+            stats['max_ms'] = max(stats['max_ms'], duration_ms)
+            stats['rows'] += rows
+
+            # Min-heap on duration: the root is the fastest of the slowest N
+            self._sequence += 1
+            item = (duration_ms, self._sequence, details)
+            if len(self._slowest) < self.top_n:
+                heapq.heappush(self._slowest, item)
+            elif duration_ms > self._slowest[0][0]:
+                heapq.heapreplace(self._slowest, item)
+
+        if duration_ms >= self.threshold_ms:
+            details['plan'] = self.explain(conn, sql, params)
+            with self._lock:
+                self._slow_log.append(details)
+            logger.warning(
+                f"Slow query ({duration_ms:.1f} ms, {rows} rows) from {source}: {text} "
+                f"params={shape} plan: {details['plan']}"
+            )
+
+    def explain(self, conn, sql, params):
+        """EXPLAIN QUERY PLAN on a plain cursor, so the probe itself is not profiled"""
+        if not sql.lstrip().upper().startswith(EXPLAINABLE) or params is None:
+            return ""
+        try:
+            cursor = sqlite3.Cursor(conn)
+            cursor.execute("EXPLAIN QUERY PLAN " + sql, params)
+            return "; ".join(row[-1] for row in cursor.fetchall())
+        except sqlite3.Error as e:
+            return f"unavailable ({str(e)})"
+
+    def slowest(self):
+        """The slowest statements seen, slowest first"""
+        with self._lock:
+            return [item[2] for item in sorted(self._slowest, reverse=True)]
+
+    def slow_log(self):
+        with self._lock:
+            return list(self._slow_log)
+
+    def statement_stats(self, order_by='total_ms'):
+        """Per statement and caller totals, busiest first"""
+        with self._lock:
+            stats = [dict(s, avg_ms=s['total_ms'] / s['count']) for s in self._stats.values()]
+        return sorted(stats, key=lambda s: s[order_by], reverse=True)
+
+
+QUERY_PROFILER = QueryProfiler()
+
+
+class StatementCacheStats:
+    """Hits and misses of a connection's compiled statement cache.
+
+    sqlite3 keeps the last cached_statements statements, keyed by SQL
+    text, in an LRU but does not report on it, so the same LRU is replayed
+    here on every statement the connection executes.
+    """
+
+    def __init__(self, capacity):
+        self.capacity = capacity
+        self._recent = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def lookup(self, sql):
+        recent = self._recent
+        if sql in recent:
+            recent.move_to_end(sql)
+            self.hits += 1
+            return
+        self.misses += 1
+        if self.capacity <= 0:
+            return
+        recent[sql] = None
+        if len(recent) > self.capacity:
+            recent.popitem(last=False)
+            self.evictions += 1
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {
+            'capacity': self.capacity,
+            'size': len(self._recent),
+            'hits': self.hits,
+            'misses': self.misses,
+            'evictions': self.evictions,
+            'hit_rate': self.hits / lookups if lookups else 0.0
+        }
+
+
+class ProfilingCursor(sqlite3.Cursor):
+    """Cursor timing each statement from execute until its rows are fetched.
+
+    SQLite produces rows lazily, so fetch time is added to the statement;
+    it is recorded when the next statement starts, the rows run out or
+    the cursor is closed.
+    """
+
+    profiler = QUERY_PROFILER
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._pending = None
+
+    def _finish(self):
+        pending = self._pending
+        if pending is not None:
+            self._pending = None
+            sql, params, shape, duration, rows = pending
+            self.profiler.record(self.connection, sql, params, shape, duration, rows)
+
+    def _run(self, method, sql, params, shape):
+        self._finish()
+        start = time.perf_counter()
+        result = method(sql, params)
+        duration = time.perf_counter() - start
+        rows = max(self.rowcount, 0)
+        self._pending = [sql, params, shape, duration, rows]
+        if self.description is None:
+            # No result rows to fetch: DML, DDL, PRAGMA without output
+            self._finish()
+        return result
+
+    def execute(self, sql, params=()):
+        self.connection.statements.lookup(sql)
+        if not self.profiler.enabled:
+            return super().execute(sql, params)
+        return self._run(super().execute, sql, params, params_shape(params))
+
+    def executemany(self, sql, seq_of_params):
+        self.connection.statements.lookup(sql)
+        if not self.profiler.enabled:
+            return super().executemany(sql, seq_of_params)
+        seq_of_params = list(seq_of_params)
+        explain_params = seq_of_params[0] if seq_of_params else None
+        self._finish()
+        start = time.perf_counter()
+        result = super().executemany(sql, seq_of_params)
+        self._pending = [sql, explain_params, params_shape(seq_of_params, many=True),
+                         time.perf_counter() - start, max(self.rowcount, 0)]
+        self._finish()
+        return result
+
+    def _fetched(self, start, rows, exhausted):
+        pending = self._pending
+        if pending is not None:
+            pending[3] += time.perf_counter() - start
+            pending[4] += rows
+            if exhausted:
+                self._finish()
+
+    def fetchone(self):
+        start = time.perf_counter()
+        row = super().fetchone()
+        self._fetched(start, 0 if row is None else 1, row is None)
+        return row
+
+    def fetchmany(self, size=None):
+        start = time.perf_counter()
+        rows = super().fetchmany(self.arraysize if size is None else size)
+        self._fetched(start, len(rows), not rows)
+        return rows
+
+    def fetchall(self):
+        start = time.perf_counter()
+        rows = super().fetchall()
+        self._fetched(start, len(rows), True)
+        return rows
+
+    def close(self):
+        self._finish()
+        super().close()
+
+    def __del__(self):
+        if getattr(self, '_pending', None) is not None:
+            self._finish()
+
+
+class ProfilingConnection(sqlite3.Connection):
+    """Connection factory whose cursors (including conn.execute) are profiled"""
+
+    def __init__(self, *args, cached_statements=128, **kwargs):
+        super().__init__(*args, cached_statements=cached_statements, **kwargs)
+        self.statements = StatementCacheStats(cached_statements)
+
+    def cursor(self, factory=ProfilingCursor):
+        return super().cursor(factory)
@@ -0,0 +1,263 @@
+import logging
+import textwrap
+import threading
+from datetime import datetime
+from .db_manager import DatabaseManager
+from .money import Money, to_cents
+
+logger = logging.getLogger('TerranPOS')
+
+STORE_NAME = "Terran POS System"
+# Characters per line of a 58 mm printer in its standard font
+RECEIPT_WIDTH = 32
+RECEIPT_PAPER_WIDTH_MM = 58
+PRINT_RETRY_SECONDS = 2.0
+MAX_BACKOFF_SECONDS = 60.0
+# A job failing this many times is left in the spool with its error instead of blocking the queue
+MAX_PRINT_ATTEMPTS = 5
+
+ESC = b'\x1b'
+GS = b'\x1d'
+ESCPOS_ALIGN = {'left': 0, 'center': 1, 'right': 2}
+
+
+def build_receipt(sale_id, cart, client_name=None, nif=None, payment=None, tax_rate=0.23) -> dict:
+    """Receipt contents from the checked-out cart, with amounts in cents.
+
+    The result is plain JSON so it can sit in the spool until printed.
+    """
+    payment = payment or {}
+    return {
+        'sale_id': sale_id,
+        'created_at': datetime.now().strftime('%Y-%m-%d %H:%M'),
+        'client_name': client_name or None,
+        'nif': nif or None,
+        'lines': [{'name': line.name, 'quantity': line.quantity,
+                   'price_cents': line.price.cents, 'amount_cents': line.total.cents}
+                  for line in cart],
+        'subtotal_cents': cart.subtotal.cents,
+        'tax_rate': tax_rate,
+        'tax_cents': cart.tax.cents,
+        'total_cents': cart.total.cents,
+        'payment_method': payment.get('method'),
+        'paid_cents': to_cents(payment.get('amount')),
+        'change_cents': to_cents(payment.get('change')),
+        'notes': payment.get('notes') or None,
+    }
+
+
+def layout_receipt(receipt, width=RECEIPT_WIDTH):
+    """Receipt as (text, align, bold) rows of at most width characters"""
+    rows = []
+
+    def add(text='', align='left', bold=False):
+        rows.append((text, align, bold))
+
+    def pair(left, right, bold=False):
+        space = width - len(left) - len(right)
+        if space < 1:
+            add(left, bold=bold)
+            add(right, 'right', bold)
+        else:
+            add(left + " " * space + right, bold=bold)
+
+    add(STORE_NAME, 'center', True)
+    add("=" * width)
+    add(f"Receipt #{receipt['sale_id']}")
+    add(f"Date: {receipt['created_at']}")
+    if receipt['client_name']:
+        add(f"Client: {receipt['client_name']}"[:width])
+    if receipt['nif']:
+        add(f"NIF: {receipt['nif']}")
+    add("-" * width)
+    for line in receipt['lines']:
+        for part in textwrap.wrap(line['name'], width) or ['']:
+            add(part)
+        pair(f"  {line['quantity']} x {Money(line['price_cents'])}", str(Money(line['amount_cents'])))
+    add("-" * width)
+    pair("Subtotal:", str(Money(receipt['subtotal_cents'])))
+    pair(f"Tax ({receipt['tax_rate'] * 100:g}%):", str(Money(receipt['tax_cents'])))
+    pair("TOTAL:", str(Money(receipt['total_cents'])), bold=True)
+    if receipt['payment_method']:
+        pair("Payment:", receipt['payment_method'])
+    if receipt['paid_cents'] is not None:
+        pair("Paid:", str(Money(receipt['paid_cents'])))
+        pair("Change:", str(Money(receipt['change_cents'] or 0)))
+    if receipt['notes']:
+        add("-" * width)
+        for part in textwrap.wrap(receipt['notes'], width):
+            add(part)
+    add("=" * width)
+    add("Thank you for your purchase!", 'center')
+    return rows
+
+
+def encode_escpos(rows, encoding='cp437', feed_lines=4, cut=True) -> bytes:
+    """Raw ESC/POS commands printing the rows, then feeding and cutting the paper"""
+    data = bytearray(ESC + b'@')
+    for text, align, bold in rows:
+        data += ESC + b'a' + bytes([ESCPOS_ALIGN[align]])
+        data += ESC + b'E' + bytes([1 if bold else 0])
+        data += text.encode(encoding, errors='replace') + b'\n'
+    data += ESC + b'a\x00' + ESC + b'd' + bytes([feed_lines])
+    if cut:
+        # Partial cut after feeding to the cutter
+        data += GS + b'V\x42\x00'
+    return bytes(data)
+
+
+class EscPosPrinter:
+    """Writes raw ESC/POS to a device node or file (e.g. /dev/usb/lp0)"""
+
+    def __init__(self, path, width=RECEIPT_WIDTH):
+        self.path = path
+        self.width = width
+
+    def print_receipt(self, receipt):
+        data = encode_escpos(layout_receipt(receipt, self.width))
+        with open(self.path, 'ab') as device:
+            device.write(data)
+
+
+class QtReceiptPrinter:
+    """Draws receipts on a system printer through QPainter.
+
+    The printer, fonts and metrics are set up once and reused for every
+    receipt, and the page is sized to the receipt rather than a fixed
+    3 m roll.
+    """
+
+    def __init__(self, printer_name=''):
+        # Print support is only loaded when something is printed
+        from PyQt6.QtPrintSupport import QPrinter
+        from PyQt6.QtGui import QFont, QFontMetricsF
+
+        self.printer = QPrinter(QPrinter.PrinterMode.HighResolution)
+        if printer_name:
+            self.printer.setPrinterName(printer_name)
+        self.font = QFont("Courier", 9)
+        self.bold_font = QFont(self.font)
+        self.bold_font.setBold(True)
+        self.metrics = QFontMetricsF(self.font, self.printer)
+        self.dpi = self.printer.resolution()
+        self.margin = self.metrics.lineSpacing()
+        paper_width = RECEIPT_PAPER_WIDTH_MM / 25.4 * self.dpi
+        self.width = max(int((paper_width - 2 * self.margin) / self.metrics.horizontalAdvance('M')), 16)
+
+    def print_receipt(self, receipt):
+        from PyQt6.QtCore import QPointF, QSizeF
+        from PyQt6.QtGui import QPageSize, QPainter
+
+        rows = layout_receipt(receipt, self.width)
+        line_spacing = self.metrics.lineSpacing()
+        height = (len(rows) + 2) * line_spacing + 2 * self.margin
+        self.printer.setPageSize(QPageSize(
+            QSizeF(RECEIPT_PAPER_WIDTH_MM, height / self.dpi * 25.4), QPageSize.Unit.Millimeter
+        ))
+        char_width = self.metrics.horizontalAdvance('M')
+
+        painter = QPainter()
+        if not painter.begin(self.printer):
+            raise RuntimeError(f"Could not start printing on {self.printer.printerName() or 'the default printer'}")
+        try:
+            y = self.margin + self.metrics.ascent()
+            for text, align, bold in rows:
+                painter.setFont(self.bold_font if bold else self.font)
+                offset = {'left': 0, 'center': (self.width - len(text)) / 2,
+                          'right': self.width - len(text)}[align]
+                painter.drawText(QPointF(self.margin + max(offset, 0) * char_width, y), text)
+                y += line_spacing
+        finally:
+            painter.end()
+
+
+def printer_for(target):
+    """Printer for a receipt_printer setting: 'escpos:<path>' or 'qt:[printer name]'"""
+    kind, _, name = target.partition(':')
+    if kind == 'escpos' and name:
+        return EscPosPrinter(name)
+    if kind == 'qt':
+        return QtReceiptPrinter(name)
+    raise ValueError(f"Unknown receipt printer: {target}")
+
+
+class ReceiptSpooler(threading.Thread):
+    """Background thread printing the receipts queued in the receipt_spool table.
+
+    Checkout only adds a row to the spool, so the till is free for the next
+    customer while the previous receipt prints. Jobs are printed in order;
+    a failing printer (offline, out of paper) is retried with backoff and
+    jobs stay queued across restarts until printed.
+    """
+
+    def __init__(self, db_path, interval=PRINT_RETRY_SECONDS):
+        super().__init__(name="receipt-spooler", daemon=True)
+        self.db_path = db_path
+        self.interval = interval
+        self._printers = {}
+        self._wake = threading.Event()
+        self._stopping = threading.Event()
+
+    def wake(self):
+        """Print now instead of waiting for the next retry"""
+        self._wake.set()
+
+    def stop(self):
+        self._stopping.set()
+        self._wake.set()
+
+    def run(self):
+        # SQLite connections belong to the thread that opened them
+        db = DatabaseManager(self.db_path, initialize=False)
+        delay = self.interval
+        try:
+            while not self._stopping.is_set():
+                if self.print_pending(db):
+                    delay = self.interval
+                else:
+                    delay = min(delay * 2, MAX_BACKOFF_SECONDS)
+                self._wake.wait(delay)
+                self._wake.clear()
+        finally:
+            db.close()
+
+    def print_pending(self, db) -> bool:
+        """Print queued receipts oldest first; False if a job failed"""
+        for job in db.get_pending_receipts(MAX_PRINT_ATTEMPTS):
+            if self._stopping.is_set():
+                break
+            try:
+                printer = self._printers.get(job['target'])
+                if printer is None:
+                    printer = self._printers[job['target']] = printer_for(job['target'])
+                printer.print_receipt(job['receipt'])
+            except Exception as e:
+                logger.error(f"Error printing receipt for sale #{job['sale_id']}: {str(e)}", exc_info=True)
+                db.mark_receipt_failed(job['spool_id'], str(e))
+                # Drop the printer so it is set up again on the next try
+                self._printers.pop(job['target'], None)
+                return False
+            db.mark_receipt_printed(job['spool_id'])
+        return True
+
+
+_spooler = None
+_spooler_lock = threading.Lock()
+
+
+def get_spooler(db_path) -> ReceiptSpooler:
+    """The process-wide spooler, started on first use.
+
+    One spooler serves every POS window so receipts are never printed twice.
+    """
+    global _spooler
+    with _spooler_lock:
+        if _spooler is None or not _spooler.is_alive():
+            _spooler = ReceiptSpooler(db_path)
+            _spooler.start()
+        return _spooler
+
+
+def stop_spooler():
+    if _spooler is not None:
+        _spooler.stop()
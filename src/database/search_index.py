@@ -0,0 +1,75 @@
+import re
+
+TOKEN_PATTERN = re.compile(r"\w+")
+
+
+def tokenize(text):
+    """Split text into lower-cased word tokens"""
+    return TOKEN_PATTERN.findall((text or "").lower())
+
+
+class PrefixIndex:
+    """Token prefix trie mapping every prefix of every indexed word to product IDs.
+
+    Each trie node stores the IDs of all products having a word that starts
+    with the node's prefix, so a lookup costs O(len(prefix)) regardless of
+    catalogue size. Multi-word queries intersect the per-word sets.
+    """
+
+    def __init__(self):
+        self._root = {}
+        self._tokens = {}
+
+    def add(self, item_id, text):
+        tokens = set(tokenize(text))
+        self._tokens[item_id] = tokens
+        for token in tokens:
+            node = self._root
+            for char in token:
+                node = node.setdefault(char, {})
+                node.setdefault(None, set()).add(item_id)
+
+    def remove(self, item_id):
+        for token in self._tokens.pop(item_id, ()):
+            node = self._root
+            path = []
+            for char in token:
+                child = node.get(char)
+                if child is None:
+                    break
+                path.append((node, char, child))
+                ids = child.get(None)
+                if ids is not None:
+                    ids.discard(item_id)
+                node = child
+            # Prune branches that no longer lead to any product
+            for parent, char, child in reversed(path):
+                if child.get(None) or len(child) > 1:
+                    break
+                del parent[char]
+
+    def lookup(self, prefix):
+        node = self._root
+        for char in prefix:
+            node = node.get(char)
+            if node is None:
+                return set()
+        return node.get(None, set())
+
+    def search(self, query):
+        """Return IDs whose words start with every word of the query, or None for an empty query"""
+        tokens = tokenize(query)
+        if not tokens:
+            return None
+        # Start from the most selective word
+        sets = sorted((self.lookup(token) for token in tokens), key=len)
+        result = set(sets[0])
+        for ids in sets[1:]:
+            result &= ids
+            if not result:
+                break
+        return result
+
+    def clear(self):
+        self._root = {}
+        self._tokens = {}
@@ -0,0 +1,249 @@
+import json
+import logging
+from datetime import datetime, timezone
+from .queries import QUERIES
+from .timeutil import SECONDS_PER_DAY, now_epoch
+
+logger = logging.getLogger('TerranPOS')
+
+# What moved stock, as stored in stock_movements.kind
+MOVEMENT_KINDS = (
+    'opening',       # stock on hand when the product or the ledger was created
+    'receipt',       # goods received from a supplier
+    'sale',          # sold at a till, or synced from one
+    'adjustment',    # quantity edited by hand
+    'import',        # bulk product import
+    'sync',          # catalogue copied from the central server
+    'removal',       # product deleted with stock left
+    'transfer_in',   # received from another store
+    'transfer_out',  # sent to another store
+)
+RECEIVED_KINDS = ('receipt', 'transfer_in')
+SOLD_KINDS = ('sale',)
+
+# A snapshot is taken once the last one is this old, or a new month has begun
+STOCK_SNAPSHOT_INTERVAL_DAYS = 7
+# Set once a database's ledger has been started, so opening it does not try again
+BACKFILLED_SETTING = 'stock_ledger_backfilled'
+# Upper bound for replaying back from the live inventory
+MAX_EPOCH = 2 ** 63 - 1
+
+
+def _month(epoch):
+    moment = datetime.fromtimestamp(epoch, timezone.utc)
+    return moment.year, moment.month
+
+
+class StockLedger:
+    """Writes stock_movements and answers point-in-time stock questions.
+
+    Every change to inventory.quantity is recorded as a signed movement in
+    the transaction making it, so the stock of any product at any moment is
+    the sum of its movements up to then. Snapshots of every product's
+    quantity are taken periodically; a historical query starts from the
+    snapshot nearest the moment asked for (the live inventory counting as
+    the newest one) and replays only the movements in between, forwards or
+    backwards.
+    """
+
+    def record(self, cursor, movements, created=None):
+        """Insert (product_id, kind, quantity, reference, cost_cents) movements, skipping zero ones"""
+        created = created or now_epoch()
+        cursor.executemany(
+            QUERIES.sql("movements.insert"),
+            [(product_id, kind, quantity, reference, cost, created)
+             for product_id, kind, quantity, reference, cost in movements if quantity]
+        )
+
+    def on_hand(self, cursor, product_ids) -> dict:
+        """Current quantity of each product, read before overwriting it"""
+        cursor.execute(QUERIES.sql("movements.on_hand"), (json.dumps(list(product_ids)),))
+        return dict(cursor.fetchall())
+
+    def record_changes(self, cursor, kind, before, product_ids=(), reference=None):
+        """Record the difference between the quantities in before and the stored ones.
+
+        For writes that overwrite quantities rather than adding to them.
+        product_ids adds products that did not exist before; a product no
+        longer in inventory has gone to zero.
+        """
+        ids = list(dict.fromkeys([*before, *product_ids]))
+        after = self.on_hand(cursor, ids)
+        self.record(cursor, [(product_id, kind, after.get(product_id, 0) - before.get(product_id, 0),
+                              reference, None) for product_id in ids])
+
+    def _base(self, cursor, at):
+        """The snapshot to replay from for a moment: (snapshot_id or 'inventory' or None, epoch).
+
+        None is the empty store before the first movement.
+        """
+        now = now_epoch()
+        if at >= now:
+            return 'inventory', MAX_EPOCH
+        cursor.execute(QUERIES.sql("snapshots.before"), (at,))
+        before = cursor.fetchone()
+        if before is None:
+            cursor.execute("SELECT MIN(created_epoch) FROM stock_movements")
+            first = cursor.fetchone()[0]
+            before = (None, min(first - 1, at) if first is not None else at)
+        if before[1] == at:
+            return before
+        cursor.execute(QUERIES.sql("snapshots.after"), (at,))
+        after = cursor.fetchone() or ('inventory', now)
+        if after[1] - at >= at - before[1]:
+            return before
+        return after if after[0] != 'inventory' else ('inventory', MAX_EPOCH)
+
+    def stock_at(self, cursor, at, product_ids=None) -> dict:
+        """{product_id: [quantity, unit_cost_cents]} on hand at epoch at.
+
+        unit_cost_cents is the moving average kept with the snapshot used,
+        None when it had none. Products with no stock are left out.
+        """
+        base, base_epoch = self._base(cursor, at)
+        ids = (json.dumps(list(product_ids)),) if product_ids is not None else ()
+        stock = {}
+        if base == 'inventory':
+            cursor.execute(QUERIES.sql("snapshots.inventory_lines", bool(ids)), ids)
+        elif base is not None:
+            cursor.execute(QUERIES.sql("snapshots.lines", bool(ids)), (base, *ids))
+        if base is not None:
+            stock = {product_id: [quantity, cost] for product_id, quantity, cost in cursor.fetchall()}
+
+        # Forwards from an earlier snapshot, or backwards from a later one
+        if base_epoch <= at:
+            bounds, sign = (base_epoch, at), 1
+        else:
+            bounds, sign = (at, base_epoch), -1
+        cursor.execute(QUERIES.sql("movements.replay", bool(ids)), (*bounds, *ids))
+        for product_id, quantity in cursor.fetchall():
+            line = stock.setdefault(product_id, [0, None])
+            line[0] += sign * quantity
+        return {product_id: line for product_id, line in stock.items() if line[0]}
+
+    def movements_by_kind(self, cursor, start, end) -> dict:
+        """{product_id: {kind: quantity}} moved in (start, end]"""
+        cursor.execute(QUERIES.sql("movements.by_kind"), (start, end))
+        moved = {}
+        for product_id, kind, quantity in cursor.fetchall():
+            moved.setdefault(product_id, {})[kind] = quantity
+        return moved
+
+    def snapshot(self, conn, at=None) -> int:
+        """Store every product's stock at epoch at (default: the last whole second).
+
+        Taken under the write lock, so no movement can land in the second
+        being snapshotted afterwards. Returns the snapshot ID.
+        """
+        cursor = conn.cursor()
+        try:
+            cursor.execute("BEGIN IMMEDIATE")
+            at = at if at is not None else now_epoch() - 1
+            cursor.execute("SELECT id FROM stock_snapshots WHERE snapshot_epoch = ?", (at,))
+            existing = cursor.fetchone()
+            if existing:
+                conn.rollback()
+                return existing[0]
+            stock = self.stock_at(cursor, at)
+            cursor.execute(
+                """INSERT INTO stock_snapshots (snapshot_epoch, product_count, total_quantity)
+                   VALUES (?, ?, ?)""",
+                (at, len(stock), sum(quantity for quantity, cost in stock.values()))
+            )
+            snapshot_id = cursor.lastrowid
+            cursor.executemany(
+                """INSERT INTO stock_snapshot_lines (snapshot_id, product_id, quantity, unit_cost_cents)
+                   VALUES (?, ?, ?, ?)""",
+                [(snapshot_id, product_id, quantity, cost)
+                 for product_id, (quantity, cost) in stock.items()]
+            )
+            conn.commit()
+        except Exception as e:
+            conn.rollback()
+            logger.error(f"Error taking stock snapshot: {str(e)}", exc_info=True)
+            raise
+        logger.info(f"Took stock snapshot {snapshot_id} of {len(stock)} products")
+        return snapshot_id
+
+    def snapshot_due(self, cursor, interval_days=STOCK_SNAPSHOT_INTERVAL_DAYS) -> bool:
+        cursor.execute("SELECT MAX(snapshot_epoch) FROM stock_snapshots")
+        last = cursor.fetchone()[0]
+        if last is None:
+            cursor.execute("SELECT 1 FROM stock_movements LIMIT 1")
+            return cursor.fetchone() is not None
+        now = now_epoch()
+        return now - last >= interval_days * SECONDS_PER_DAY or _month(now) != _month(last)
+
+    def backfill(self, conn, cost_column) -> int:
+        """Start the ledger of a database whose stock changed before it was kept.
+
+        Past receipts and sales are written as movements at the time they
+        happened, and each product gets an opening movement before them
+        making its balance come out at today's quantity. Only runs on a
+        ledger holding nothing but transfers; snapshots are dropped. Marks
+        the database with BACKFILLED_SETTING either way. Returns the number
+        of movements written.
+        """
+        cursor = conn.cursor()
+        try:
+            cursor.execute("BEGIN IMMEDIATE")
+            cursor.execute(
+                """INSERT OR REPLACE INTO settings (key, value, updated_at)
+                   VALUES (?, '1', CURRENT_TIMESTAMP)""",
+                (BACKFILLED_SETTING,)
+            )
+            cursor.execute(
+                "SELECT 1 FROM stock_movements WHERE kind NOT IN ('transfer_in', 'transfer_out') LIMIT 1"
+            )
+            if cursor.fetchone():
+                conn.commit()
+                return 0
+            cursor.execute("SELECT COALESCE(MAX(id), 0) FROM stock_movements")
+            last_id = cursor.fetchone()[0]
+            cursor.execute("DELETE FROM stock_snapshot_lines")
+            cursor.execute("DELETE FROM stock_snapshots")
+            # Receipts of transfers already have their transfer_in movement
+            cursor.execute(
+                """INSERT INTO stock_movements
+                   (product_id, kind, quantity, reference, cost_cents, created_epoch)
+                   SELECT sr.product_id, 'receipt', sr.quantity, 'receipt:' || sr.id,
+                          sr.quantity * sr.purchase_price_cents, sr.received_epoch
+                   FROM stock_receiving sr
+                   LEFT JOIN goods_received_notes g ON sr.grn_id = g.id
+                   WHERE NOT EXISTS (SELECT 1 FROM stock_movements m
+                                     WHERE m.kind = 'transfer_in' AND m.reference = g.reference)
+                   ORDER BY sr.received_epoch, sr.id"""
+            )
+            cursor.execute(
+                f"""INSERT INTO stock_movements
+                    (product_id, kind, quantity, reference, cost_cents, created_epoch)
+                    SELECT si.product_id, 'sale', -SUM(si.quantity), 'sale:' || s.id,
+                           SUM(si.{cost_column}), s.created_epoch
+                    FROM sale_items si
+                    JOIN sales s ON si.sale_id = s.id
+                    GROUP BY s.id, si.product_id
+                    ORDER BY s.created_epoch, s.id"""
+            )
+            # Products deleted since also balance out, at zero
+            cursor.execute("SELECT MIN(created_epoch) FROM stock_movements")
+            first = cursor.fetchone()[0]
+            cursor.execute(
+                """INSERT INTO stock_movements
+                   (product_id, kind, quantity, reference, cost_cents, created_epoch)
+                   SELECT product_id, 'opening', SUM(quantity), NULL, NULL, ?
+                   FROM (SELECT id AS product_id, quantity FROM inventory
+                         UNION ALL
+                         SELECT product_id, -quantity FROM stock_movements)
+                   GROUP BY product_id
+                   HAVING SUM(quantity) != 0""",
+                ((first if first is not None else now_epoch()) - 1,)
+            )
+            cursor.execute("SELECT COUNT(*) FROM stock_movements WHERE id > ?", (last_id,))
+            written = cursor.fetchone()[0]
+            conn.commit()
+        except Exception as e:
+            conn.rollback()
+            logger.error(f"Error backfilling the stock ledger: {str(e)}", exc_info=True)
+            raise
+        logger.info(f"Backfilled {written} stock movements")
+        return written
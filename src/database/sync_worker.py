@@ -0,0 +1,125 @@
+import logging
+import threading
+from .db_manager import DatabaseManager
+
+try:
+    import httpx
+except ImportError:
+    httpx = None
+
+logger = logging.getLogger('TerranPOS')
+
+SYNC_INTERVAL_SECONDS = 2.0
+MAX_BACKOFF_SECONDS = 60.0
+REQUEST_TIMEOUT_SECONDS = 10.0
+# Journaled sales sent per request
+SYNC_BATCH_SIZE = 100
+
+
+class SyncWorker(threading.Thread):
+    """Background thread keeping an offline-first till in step with the central API.
+
+    Checkout only writes the local database; sales land in the outbox in the
+    same transaction. This thread pushes the outbox in batches (each sale
+    carries an idempotency key, so a retry after a lost response is safe),
+    then pulls the catalogue changes after its version cursor. While the
+    server is unreachable it backs off and the till keeps selling.
+    """
+
+    def __init__(self, db_path, server_url, interval=SYNC_INTERVAL_SECONDS):
+        super().__init__(name="sync-worker", daemon=True)
+        self.db_path = db_path
+        self.server_url = server_url.rstrip("/")
+        self.interval = interval
+        self.online = False
+        self._wake = threading.Event()
+        self._stopping = threading.Event()
+
+    def wake(self):
+        """Sync now instead of waiting for the next interval"""
+        self._wake.set()
+
+    def stop(self):
+        self._stopping.set()
+        self._wake.set()
+
+    def run(self):
+        if httpx is None:
+            logger.warning("httpx is not installed, sales will not be synced to the server")
+            return
+
+        # SQLite connections belong to the thread that opened them
+        db = DatabaseManager(self.db_path, initialize=False)
+        delay = self.interval
+        try:
+            with httpx.Client(base_url=self.server_url, timeout=REQUEST_TIMEOUT_SECONDS) as client:
+                while not self._stopping.is_set():
+                    try:
+                        self.sync_once(db, client)
+                        self.online = True
+                        delay = self.interval
+                    except httpx.HTTPError as e:
+                        if self.online:
+                            logger.warning(f"Sync server unreachable, working offline: {str(e)}")
+                        self.online = False
+                        delay = min(delay * 2, MAX_BACKOFF_SECONDS)
+                    except Exception as e:
+                        logger.error(f"Error syncing with server: {str(e)}", exc_info=True)
+                        delay = min(delay * 2, MAX_BACKOFF_SECONDS)
+                    self._wake.wait(delay)
+                    self._wake.clear()
+        finally:
+            db.close()
+
+    def sync_once(self, db, client):
+        """Push pending sales, then pull catalogue changes"""
+        pushed = self.push_sales(db, client)
+        pulled = self.pull_catalog(db, client)
+        if pushed or pulled:
+            logger.info(f"Synced {pushed} sales, {pulled} catalogue changes")
+        return pushed, pulled
+
+    def push_sales(self, db, client):
+        pushed = 0
+        while True:
+            pending = db.get_pending_sales(SYNC_BATCH_SIZE)
+            if not pending:
+                break
+            sales = [{key: value for key, value in entry.items() if key != 'outbox_id'}
+                     for entry in pending]
+            try:
+                response = client.post("/sync/sales", json={"sales": sales})
+                response.raise_for_status()
+            except httpx.HTTPError as e:
+                db.mark_sales_failed([entry['outbox_id'] for entry in pending], str(e))
+                raise
+
+            results = response.json()["results"]
+            db.mark_sales_synced(results)
+            for result in results:
+                if result["conflicts"]:
+                    # The server keeps the sale and goes negative; the catalogue
+                    # pull below brings its stock figures back to this till
+                    logger.warning(
+                        f"Sale {result['idempotency_key']} oversold products {result['conflicts']} on the server"
+                    )
+            pushed += len(pending)
+            if len(pending) < SYNC_BATCH_SIZE:
+                break
+        return pushed
+
+    def pull_catalog(self, db, client):
+        since = int(db.get_setting('sync_catalog_version') or 0)
+        pulled = 0
+        while True:
+            response = client.get("/sync/catalog", params={"since": since})
+            response.raise_for_status()
+            changes = response.json()
+            if changes["products"] or changes["removed"]:
+                pulled += db.apply_catalog_changes(changes["products"], changes["removed"],
+                                                   changes.get("categories", []))
+            since = changes["version"]
+            db.update_setting('sync_catalog_version', str(since))
+            if not changes["more"]:
+                break
+        return pulled
@@ -0,0 +1,71 @@
+import time
+from datetime import date, datetime, timezone
+
+# Timestamps are stored as integer seconds since the Unix epoch, UTC, next to
+# the CURRENT_TIMESTAMP text columns they were migrated from
+SECONDS_PER_DAY = 86400
+TEXT_FORMAT = '%Y-%m-%d %H:%M:%S'
+
+
+def now_epoch() -> int:
+    return int(time.time())
+
+
+def to_epoch(value):
+    """Seconds since the epoch for a datetime, date, ISO string or number.
+
+    Naive values are taken as UTC, like SQLite's CURRENT_TIMESTAMP; a date
+    is its midnight.
+    """
+    if value is None or value == '':
+        return None
+    if isinstance(value, (int, float)):
+        return int(value)
+    if isinstance(value, str):
+        value = datetime.fromisoformat(value.strip())
+    elif not isinstance(value, datetime):
+        if not isinstance(value, date):
+            # QDate and QDateTime from the Qt pickers
+            value = value.toPyDate() if hasattr(value, 'toPyDate') else value.toPyDateTime()
+        if not isinstance(value, datetime):
+            value = datetime(value.year, value.month, value.day)
+    if value.tzinfo is None:
+        value = value.replace(tzinfo=timezone.utc)
+    return int(value.timestamp())
+
+
+def _is_day(value):
+    if isinstance(value, str):
+        return len(value.strip()) == 10
+    if hasattr(value, 'toPyDate'):
+        return True
+    return isinstance(value, date) and not isinstance(value, datetime)
+
+
+def epoch_range(start, end):
+    """Inclusive (start, end) epoch bounds for a report filter.
+
+    An end given as a bare day covers that whole day, so a range from a
+    date picker includes the sales made on its last day.
+    """
+    start_epoch = to_epoch(start)
+    end_epoch = to_epoch(end)
+    if end_epoch is not None and _is_day(end):
+        end_epoch += SECONDS_PER_DAY - 1
+    return start_epoch, end_epoch
+
+
+def from_epoch(epoch):
+    """Epoch seconds in the CURRENT_TIMESTAMP text format"""
+    if epoch is None:
+        return None
+    return datetime.fromtimestamp(epoch, timezone.utc).strftime(TEXT_FORMAT)
+
+
+def day_number(epoch):
+    """UTC day since the epoch, the bucket daily reports group on"""
+    return epoch // SECONDS_PER_DAY
+
+
+def day_label(day):
+    return datetime.fromtimestamp(day * SECONDS_PER_DAY, timezone.utc).strftime('%Y-%m-%d')
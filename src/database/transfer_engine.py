@@ -0,0 +1,264 @@
+import json
+import logging
+import uuid
+from .queries import QUERIES
+
+logger = logging.getLogger('TerranPOS')
+
+# dispatching and receiving mark a phase whose store side may or may not have
+# committed; recover() finishes them, which is safe because a store applies
+# each side of a transfer at most once
+TRANSFER_STATES = ('pending', 'dispatching', 'in_transit', 'receiving', 'received', 'cancelled')
+
+
+class TransferEngine:
+    """Moves stock between store databases in two phases (head office side).
+
+    Dispatch takes the stock out of the source store and counts it as in
+    transit to the destination; receive books it into the destination as a
+    goods received note. Each store records its side in its stock_movements
+    ledger, in the same transaction as the stock change and keyed by the
+    transfer, so a phase retried after a failure is applied once. Between
+    the phases the stock is only in stock_in_transit, never on hand in both
+    stores or in neither.
+    """
+
+    def __init__(self, db):
+        self.db = db
+
+    def create(self, from_location: str, to_location: str, lines, notes: str = None,
+               created_by: int = None) -> int:
+        """Record a pending transfer of (product_id, quantity) lines, IDs as in the source store"""
+        if from_location == to_location:
+            raise ValueError("A transfer needs two different stores")
+        known = {location['code'] for location in self.db.get_locations()}
+        for code in (from_location, to_location):
+            if code not in known:
+                raise ValueError(f"Unknown location: {code}")
+        quantities = {}
+        for product_id, quantity in lines:
+            if quantity <= 0:
+                raise ValueError(f"Quantity must be positive for product ID {product_id}")
+            quantities[product_id] = quantities.get(product_id, 0) + quantity
+        if not quantities:
+            raise ValueError("A transfer needs at least one line")
+
+        # Products are matched in the destination by barcode, or by name without one
+        source = self.db.open_location(from_location)
+        try:
+            cursor = source.conn.cursor()
+            cursor.execute(QUERIES.sql("products.by_ids"), (json.dumps(list(quantities)),))
+            products = {row[0]: row for row in cursor.fetchall()}
+        finally:
+            source.close()
+        unknown = [product_id for product_id in quantities if product_id not in products]
+        if unknown:
+            raise ValueError(f"Unknown product ID(s) at {from_location}: {', '.join(map(str, unknown))}")
+
+        cursor = self.db.conn.cursor()
+        try:
+            cursor.execute("BEGIN IMMEDIATE")
+            cursor.execute(
+                """INSERT INTO transfers (transfer_key, from_location, to_location, notes, created_by)
+                   VALUES (?, ?, ?, ?, ?)""",
+                (str(uuid.uuid4()), from_location, to_location, notes, created_by)
+            )
+            transfer_id = cursor.lastrowid
+            cursor.executemany(
+                """INSERT INTO transfer_lines (transfer_id, product_id, barcode, product_name, quantity)
+                   VALUES (?, ?, ?, ?, ?)""",
+                [(transfer_id, product_id, products[product_id][9], products[product_id][1], quantity)
+                 for product_id, quantity in quantities.items()]
+            )
+            self.db.conn.commit()
+        except Exception as e:
+            self.db.conn.rollback()
+            raise e
+        return transfer_id
+
+    def get(self, transfer_id: int) -> dict:
+        cursor = self.db.conn.cursor()
+        cursor.execute(
+            """SELECT id, transfer_key, from_location, to_location, status, notes, last_error,
+                      created_at, dispatched_at, received_at
+               FROM transfers WHERE id = ?""",
+            (transfer_id,)
+        )
+        row = cursor.fetchone()
+        if not row:
+            raise ValueError(f"Unknown transfer: {transfer_id}")
+        columns = ['id', 'transfer_key', 'from_location', 'to_location', 'status', 'notes',
+                   'last_error', 'created_at', 'dispatched_at', 'received_at']
+        return dict(zip(columns, row))
+
+    def lines(self, transfer_id: int) -> list:
+        cursor = self.db.conn.cursor()
+        cursor.execute(
+            """SELECT product_id, barcode, product_name, quantity, cost_cents
+               FROM transfer_lines WHERE transfer_id = ? ORDER BY id""",
+            (transfer_id,)
+        )
+        columns = ['product_id', 'barcode', 'product_name', 'quantity', 'cost_cents']
+        return [dict(zip(columns, row)) for row in cursor.fetchall()]
+
+    def by_status(self, status: str = None, limit: int = 100) -> list:
+        cursor = self.db.conn.cursor()
+        cursor.execute(
+            """SELECT id, from_location, to_location, status, created_at, dispatched_at, received_at
+               FROM transfers
+               WHERE status = ? OR ? IS NULL
+               ORDER BY id DESC
+               LIMIT ?""",
+            (status, status, limit)
+        )
+        columns = ['id', 'from_location', 'to_location', 'status', 'created_at',
+                   'dispatched_at', 'received_at']
+        return [dict(zip(columns, row)) for row in cursor.fetchall()]
+
+    def _enter(self, transfer_id, from_states, state):
+        """Move a transfer into state if it is in one of from_states"""
+        cursor = self.db.conn.cursor()
+        cursor.execute(QUERIES.sql("transfers.set_status"), (state, transfer_id, json.dumps(from_states)))
+        self.db.conn.commit()
+        if cursor.rowcount == 0:
+            transfer = self.get(transfer_id)
+            raise ValueError(f"Transfer {transfer_id} is {transfer['status']}")
+        return self.get(transfer_id)
+
+    def _fail(self, transfer_id, state, error):
+        """Return a transfer whose store side did not commit to its previous state"""
+        cursor = self.db.conn.cursor()
+        cursor.execute(
+            "UPDATE transfers SET status = ?, last_error = ? WHERE id = ?",
+            (state, error, transfer_id)
+        )
+        self.db.conn.commit()
+
+    def dispatch(self, transfer_id: int):
+        """Take the stock out of the source store and put it in transit"""
+        transfer = self._enter(transfer_id, ['pending', 'dispatching'], 'dispatching')
+        lines = self.lines(transfer_id)
+
+        source = self.db.open_location(transfer['from_location'])
+        try:
+            moved = source.apply_transfer_out(
+                transfer['transfer_key'], [(line['product_id'], line['quantity']) for line in lines]
+            )
+        except ValueError as e:
+            # Refused by the store (e.g. not enough stock): nothing was applied
+            self._fail(transfer_id, 'pending', str(e))
+            raise
+        finally:
+            source.close()
+
+        cursor = self.db.conn.cursor()
+        try:
+            cursor.execute("BEGIN IMMEDIATE")
+            cursor.executemany(
+                "UPDATE transfer_lines SET cost_cents = ? WHERE transfer_id = ? AND product_id = ?",
+                [(cost, transfer_id, product_id) for product_id, quantity, cost in moved]
+            )
+            cursor.execute(
+                """UPDATE transfers SET status = 'in_transit', dispatched_at = CURRENT_TIMESTAMP
+                   WHERE id = ?""",
+                (transfer_id,)
+            )
+            cursor.execute(QUERIES.sql("transfers.add_in_transit"), (transfer['to_location'], transfer_id))
+            self.db.conn.commit()
+        except Exception as e:
+            self.db.conn.rollback()
+            raise e
+        logger.info(f"Dispatched transfer {transfer_id} from {transfer['from_location']} "
+                    f"to {transfer['to_location']}")
+
+    def receive(self, transfer_id: int, received_by: int = None) -> int:
+        """Book an in-transit transfer into the destination store; returns its GRN ID there"""
+        transfer = self._enter(transfer_id, ['in_transit', 'receiving'], 'receiving')
+        lines = self.lines(transfer_id)
+
+        destination = self.db.open_location(transfer['to_location'])
+        try:
+            grn_id = destination.apply_transfer_in(
+                transfer['transfer_key'], transfer['from_location'], lines, received_by
+            )
+        except ValueError as e:
+            self._fail(transfer_id, 'in_transit', str(e))
+            raise
+        finally:
+            destination.close()
+
+        cursor = self.db.conn.cursor()
+        try:
+            cursor.execute("BEGIN IMMEDIATE")
+            cursor.execute(
+                """UPDATE transfers SET status = 'received', received_at = CURRENT_TIMESTAMP
+                   WHERE id = ?""",
+                (transfer_id,)
+            )
+            cursor.execute(QUERIES.sql("transfers.take_in_transit"), (transfer_id, transfer['to_location']))
+            cursor.execute(
+                "DELETE FROM stock_in_transit WHERE location_code = ? AND quantity <= 0",
+                (transfer['to_location'],)
+            )
+            self.db.conn.commit()
+        except Exception as e:
+            self.db.conn.rollback()
+            raise e
+        logger.info(f"Received transfer {transfer_id} at {transfer['to_location']}")
+        return grn_id
+
+    def cancel(self, transfer_id: int):
+        """Cancel a transfer that has not been dispatched"""
+        self._enter(transfer_id, ['pending'], 'cancelled')
+
+    def recover(self) -> int:
+        """Finish transfers left between phases, e.g. after a crash; returns how many were finished"""
+        finished = 0
+        for state, finish in (('dispatching', self.dispatch), ('receiving', self.receive)):
+            for transfer in self.by_status(state, limit=-1):
+                try:
+                    finish(transfer['id'])
+                    finished += 1
+                except Exception as e:
+                    logger.error(f"Error recovering transfer {transfer['id']}: {str(e)}", exc_info=True)
+        return finished
+
+    def in_transit(self, location_code: str) -> dict:
+        """Stock on its way to a store, by product (barcode, or name without one)"""
+        cursor = self.db.conn.cursor()
+        cursor.execute(
+            "SELECT product_key, quantity FROM stock_in_transit WHERE location_code = ?",
+            (location_code,)
+        )
+        return dict(cursor.fetchall())
+
+    def stock_position(self, product_key: str) -> list:
+        """On hand and in transit for one product at every active store.
+
+        Each figure is a single keyed lookup: the store's inventory row and
+        the head office's in-transit row.
+        """
+        cursor = self.db.conn.cursor()
+        position = []
+        for location in self.db.get_locations():
+            store = self.db.open_location(location['code'])
+            try:
+                store_cursor = store.conn.cursor()
+                store_cursor.execute("SELECT quantity FROM inventory WHERE barcode = ?", (product_key,))
+                row = store_cursor.fetchone()
+                if row is None:
+                    store_cursor.execute(
+                        "SELECT quantity FROM inventory WHERE name = ? ORDER BY id LIMIT 1", (product_key,)
+                    )
+                    row = store_cursor.fetchone()
+            finally:
+                store.close()
+            cursor.execute(
+                "SELECT quantity FROM stock_in_transit WHERE location_code = ? AND product_key = ?",
+                (location['code'], product_key)
+            )
+            transit = cursor.fetchone()
+            position.append({'location': location['code'], 'name': location['name'],
+                             'on_hand': row[0] if row else None,
+                             'in_transit': transit[0] if transit else 0})
+        return position
@@ -1,20 +1,47 @@
 import sys
+from startup import StartupTimeline
+
+# Started before the heavy imports so they show up in the timeline
+timeline = StartupTimeline()
+
 from PyQt6.QtWidgets import QApplication
 from database.db_manager import DatabaseManager
 from views.main_window import MainWindow
 
 def main():
+    timeline.mark("imports")
+
     # Create the application
     app = QApplication(sys.argv)
-    
+    timeline.mark("qapplication")
+
     # Initialize database
     db_manager = DatabaseManager()
-    
+    timeline.mark("database")
+
+    # Tills attached to a central server sync in the background
+    sync_worker = None
+    server_url = db_manager.get_setting('sync_server_url')
+    if server_url:
+        from database.sync_worker import SyncWorker
+        sync_worker = SyncWorker(db_manager.db_path, server_url)
+        sync_worker.start()
+
+    # Receipts left unprinted by the last session print in the background
+    if db_manager.get_spool_status()['pending']:
+        from database.receipt_spool import get_spooler
+        get_spooler(db_manager.db_path)
+
     # Create main window (it will show login window)
-    window = MainWindow(db_manager)
-    
+    window = MainWindow(db_manager, timeline)
+
     # Start the event loop
-    sys.exit(app.exec())
+    exit_code = app.exec()
+    if sync_worker:
+        sync_worker.stop()
+    from database.receipt_spool import stop_spooler
+    stop_spooler()
+    sys.exit(exit_code)
 
 if __name__ == "__main__":
-    main() 
\ No newline at end of file
+    main()
\ No newline at end of file
@@ -0,0 +1,105 @@
+import importlib.abc
+import logging
+import os
+import sys
+import time
+
+logger = logging.getLogger('TerranPOS')
+
+# Set to trace module imports during startup (also on with python -X importtime)
+TRACE_IMPORTS = bool(os.environ.get("TERRAN_STARTUP_TRACE")) or 'importtime' in sys._xoptions
+# Slowest imports listed in the startup log
+TOP_IMPORTS = 15
+
+
+class _TimedLoader(importlib.abc.Loader):
+    """Wraps a module loader to time exec_module, like -X importtime"""
+
+    def __init__(self, loader, tracer, name):
+        self.loader = loader
+        self.tracer = tracer
+        self.name = name
+
+    def create_module(self, spec):
+        return self.loader.create_module(spec)
+
+    def exec_module(self, module):
+        tracer = self.tracer
+        tracer.stack.append(0.0)
+        start = time.perf_counter()
+        try:
+            self.loader.exec_module(module)
+        finally:
+            cumulative = time.perf_counter() - start
+            nested = tracer.stack.pop()
+            if tracer.stack:
+                tracer.stack[-1] += cumulative
+            tracer.imports.append((self.name, cumulative - nested, cumulative))
+
+    def __getattr__(self, name):
+        return getattr(self.loader, name)
+
+
+class ImportTracer(importlib.abc.MetaPathFinder):
+    """Records self and cumulative import time per module while installed"""
+
+    def __init__(self):
+        self.imports = []
+        self.stack = []
+
+    def find_spec(self, fullname, path, target=None):
+        for finder in sys.meta_path:
+            if finder is self or not hasattr(finder, 'find_spec'):
+                continue
+            spec = finder.find_spec(fullname, path, target)
+            if spec is not None:
+                if spec.loader is not None and hasattr(spec.loader, 'exec_module'):
+                    spec.loader = _TimedLoader(spec.loader, self, fullname)
+                return spec
+        return None
+
+    def install(self):
+        sys.meta_path.insert(0, self)
+
+    def uninstall(self):
+        if self in sys.meta_path:
+            sys.meta_path.remove(self)
+
+    def slowest(self, count=TOP_IMPORTS):
+        return sorted(self.imports, key=lambda entry: entry[2], reverse=True)[:count]
+
+
+class StartupTimeline:
+    """Named milestones from process start to the login screen's first paint"""
+
+    def __init__(self, trace_imports=TRACE_IMPORTS):
+        self.start = time.perf_counter()
+        self.marks = []
+        self.tracer = None
+        if trace_imports:
+            self.tracer = ImportTracer()
+            self.tracer.install()
+
+    def mark(self, label):
+        self.marks.append((label, time.perf_counter()))
+
+    def summary(self):
+        """Milestones as (label, ms since start, ms since previous mark)"""
+        rows = []
+        previous = self.start
+        for label, at in self.marks:
+            rows.append((label, (at - self.start) * 1000, (at - previous) * 1000))
+            previous = at
+        return rows
+
+    def finish(self):
+        """Stop tracing and write the timeline to the application log"""
+        if self.tracer:
+            self.tracer.uninstall()
+        lines = [f"  {label:<24}{total:>9.1f} ms  (+{step:.1f} ms)"
+                 for label, total, step in self.summary()]
+        if self.tracer:
+            lines.append("  slowest imports (self / cumulative):")
+            lines.extend(f"    {self_time * 1000:>8.1f} {cumulative * 1000:>8.1f} ms  {name}"
+                         for name, self_time, cumulative in self.tracer.slowest())
+        logger.info("Startup timeline:\n" + "\n".join(lines))
@@ -1,14 +1,19 @@
 from PyQt6.QtWidgets import (QMainWindow, QWidget, QVBoxLayout, QHBoxLayout,
-                           QLabel, QPushButton, QTableWidget, QTableWidgetItem,
+                           QLabel, QPushButton, QTableWidget, QTableWidgetItem, QCheckBox,
                            QDialog, QLineEdit, QSpinBox, QDoubleSpinBox,
                            QMessageBox, QFormLayout, QHeaderView, QComboBox,
-                           QFrame, QStatusBar, QTabWidget, QTextEdit, QFileDialog)
-from PyQt6.QtCore import Qt, pyqtSignal
+                           QFrame, QStatusBar, QTabWidget, QTextEdit, QFileDialog,
+                           QTableView, QStyledItemDelegate, QStyleOptionButton,
+                           QStyle, QApplication, QProgressDialog)
+from PyQt6.QtCore import (Qt, pyqtSignal, QAbstractTableModel, QModelIndex, QEvent, QRect,
+                          QTimer, QThread)
 from PyQt6.QtGui import QColor, QIcon
 import logging
 from datetime import datetime
 import sqlite3
 import csv
+from database.db_manager import DatabaseManager
+from database.product_import import ProductImporter, read_delivery_note
 
 logger = logging.getLogger('TerranPOS')
 
@@ -73,6 +78,208 @@ class StockReceiveDialog(QDialog):
             'notes': self.notes_input.toPlainText()
         }
 
+class GoodsReceivedDialog(QDialog):
+    """A whole supplier delivery, entered by scanning or from the supplier's CSV"""
+    
+    HEADERS = ["Code", "Product", "Quantity", "Purchase Price", "Selling Price", "Notes"]
+    EDITABLE_COLUMNS = {2: 'quantity', 3: 'purchase_price', 4: 'selling_price', 5: 'notes'}
+    
+    def __init__(self, parent=None, db_manager=None):
+        super().__init__(parent)
+        self.db_manager = db_manager
+        self.lines = []
+        self.setWindowTitle("Receive Delivery")
+        self.setModal(True)
+        self.setMinimumSize(900, 600)
+        
+        layout = QVBoxLayout(self)
+        
+        # Delivery note header
+        header = QFormLayout()
+        self.supplier_input = QLineEdit()
+        header.addRow("Supplier:", self.supplier_input)
+        self.reference_input = QLineEdit()
+        self.reference_input.setPlaceholderText("Delivery note number")
+        header.addRow("Reference:", self.reference_input)
+        self.notes_input = QLineEdit()
+        header.addRow("Notes:", self.notes_input)
+        layout.addLayout(header)
+        
+        # Entry: one scan adds one unit of the product
+        entry = QHBoxLayout()
+        self.scan_input = QLineEdit()
+        self.scan_input.setPlaceholderText("Scan or type a barcode / product ID and press Enter")
+        self.scan_input.returnPressed.connect(self.on_scan)
+        entry.addWidget(self.scan_input)
+        # Enter belongs to the scanner, not to a default button
+        load_btn = QPushButton("Load CSV...")
+        load_btn.setAutoDefault(False)
+        load_btn.clicked.connect(self.load_delivery_note)
+        entry.addWidget(load_btn)
+        remove_btn = QPushButton("Remove Line")
+        remove_btn.setAutoDefault(False)
+        remove_btn.clicked.connect(self.remove_selected_line)
+        entry.addWidget(remove_btn)
+        layout.addLayout(entry)
+        
+        self.lines_table = QTableWidget()
+        self.lines_table.setColumnCount(len(self.HEADERS))
+        self.lines_table.setHorizontalHeaderLabels(self.HEADERS)
+        self.lines_table.horizontalHeader().setSectionResizeMode(1, QHeaderView.ResizeMode.Stretch)
+        self.lines_table.itemChanged.connect(self.on_item_changed)
+        layout.addWidget(self.lines_table)
+        
+        self.totals_label = QLabel()
+        layout.addWidget(self.totals_label)
+        
+        buttons = QHBoxLayout()
+        buttons.addStretch()
+        receive_btn = QPushButton("Receive")
+        receive_btn.setAutoDefault(False)
+        receive_btn.clicked.connect(self.accept)
+        cancel_btn = QPushButton("Cancel")
+        cancel_btn.setAutoDefault(False)
+        cancel_btn.clicked.connect(self.reject)
+        buttons.addWidget(receive_btn)
+        buttons.addWidget(cancel_btn)
+        layout.addLayout(buttons)
+        
+        self.update_totals()
+        self.scan_input.setFocus()
+    
+    def add_line(self, product, quantity=1, purchase_price=None, selling_price=None,
+                 notes=None, code=None):
+        self.lines.append({
+            'product_id': product[0],
+            'code': code or product[9] or str(product[0]),
+            'name': product[1],
+            'quantity': quantity,
+            'purchase_price': purchase_price,
+            'selling_price': selling_price,
+            'notes': notes
+        })
+    
+    def on_scan(self):
+        code = self.scan_input.text().strip()
+        self.scan_input.clear()
+        if not code:
+            return
+        product = self.db_manager.find_product_by_code(code)
+        if product is None:
+            QMessageBox.warning(self, "Unknown Product", f"No product with barcode or ID {code}")
+            return
+        
+        # Repeated scans of the same product add to its line
+        for row, line in enumerate(self.lines):
+            if line['product_id'] == product[0]:
+                line['quantity'] += 1
+                self.set_cell(row, 2, line['quantity'])
+                self.lines_table.selectRow(row)
+                self.update_totals()
+                return
+        self.add_line(product, code=code)
+        self.show_lines()
+        self.lines_table.selectRow(len(self.lines) - 1)
+    
+    def load_delivery_note(self):
+        file_name, _ = QFileDialog.getOpenFileName(
+            self, "Load Delivery Note", "",
+            "Delivery Notes (*.csv *.xlsx);;CSV Files (*.csv);;Excel Files (*.xlsx)"
+        )
+        if not file_name:
+            return
+        try:
+            note = read_delivery_note(file_name, self.db_manager)
+        except Exception as e:
+            logger.error(f"Error reading delivery note: {str(e)}", exc_info=True)
+            QMessageBox.critical(self, "Error", f"Failed to read delivery note: {str(e)}")
+            return
+        
+        self.lines.extend(note['lines'])
+        self.show_lines()
+        if note['errors']:
+            shown = "\n".join(f"Line {line}: {message}" for line, message in note['errors'][:20])
+            QMessageBox.warning(
+                self, "Delivery Note",
+                f"{len(note['lines'])} lines loaded, {len(note['errors'])} skipped:\n\n{shown}"
+            )
+    
+    def remove_selected_line(self):
+        rows = sorted({index.row() for index in self.lines_table.selectedIndexes()}, reverse=True)
+        for row in rows:
+            del self.lines[row]
+        if rows:
+            self.show_lines()
+    
+    def set_cell(self, row, column, value):
+        self.lines_table.blockSignals(True)
+        if isinstance(value, float):
+            value = f"{value:.2f}"
+        item = QTableWidgetItem("" if value is None else str(value))
+        if column not in self.EDITABLE_COLUMNS:
+            item.setFlags(item.flags() & ~Qt.ItemFlag.ItemIsEditable)
+        self.lines_table.setItem(row, column, item)
+        self.lines_table.blockSignals(False)
+    
+    def show_lines(self):
+        self.lines_table.setRowCount(len(self.lines))
+        for row, line in enumerate(self.lines):
+            for column, value in enumerate((line['code'], line['name'], line['quantity'],
+                                            line['purchase_price'], line['selling_price'],
+                                            line['notes'])):
+                self.set_cell(row, column, value)
+        self.update_totals()
+    
+    def on_item_changed(self, item):
+        field = self.EDITABLE_COLUMNS.get(item.column())
+        if field is None:
+            return
+        line = self.lines[item.row()]
+        text = item.text().strip()
+        try:
+            if field == 'notes':
+                value = text or None
+            elif field == 'quantity':
+                value = int(text)
+                if value <= 0:
+                    raise ValueError
+            elif text:
+                value = round(float(text.replace(',', '.')), 2)
+                if value < 0:
+                    raise ValueError
+            else:
+                value = None
+        except ValueError:
+            # Put back the last valid value
+            self.set_cell(item.row(), item.column(), line[field])
+            return
+        line[field] = value
+        self.update_totals()
+    
+    def update_totals(self):
+        units = sum(line['quantity'] for line in self.lines)
+        cost = sum(line['quantity'] * (line['purchase_price'] or 0) for line in self.lines)
+        self.totals_label.setText(f"{len(self.lines)} lines, {units} units, total cost ${cost:.2f}")
+    
+    def accept(self):
+        if not self.lines:
+            QMessageBox.warning(self, "Receive Delivery", "Scan or load at least one line")
+            return
+        missing = [line['name'] for line in self.lines if line['purchase_price'] is None]
+        if missing:
+            QMessageBox.warning(self, "Receive Delivery",
+                                f"Enter a purchase price for: {', '.join(missing[:10])}")
+            return
+        super().accept()
+    
+    def get_delivery_data(self):
+        return {
+            'supplier': self.supplier_input.text().strip() or None,
+            'reference': self.reference_input.text().strip() or None,
+            'notes': self.notes_input.text().strip() or None,
+            'lines': self.lines
+        }
+
 class CategoryDialog(QDialog):
     def __init__(self, parent=None, category=None):
         super().__init__(parent)
@@ -122,6 +329,8 @@ class AddEditProductDialog(QDialog):
         
         # Create input fields
         self.name_input = QLineEdit()
+        self.barcode_input = QLineEdit()
+        self.barcode_input.setPlaceholderText("Scan or type barcode (optional)")
         self.category_combo = QComboBox()
         self.quantity_input = QSpinBox()
         self.quantity_input.setRange(0, 100000)
@@ -144,6 +353,7 @@ class AddEditProductDialog(QDialog):
         
         # Add fields to layout
         layout.addRow("Product Name:", self.name_input)
+        layout.addRow("Barcode:", self.barcode_input)
         layout.addRow("Category:", self.category_combo)
         layout.addRow("Quantity:", self.quantity_input)
         layout.addRow("Price:", self.price_input)
@@ -169,6 +379,7 @@ class AddEditProductDialog(QDialog):
             self.price_input.setValue(product[4])  # price
             self.alert_threshold.setValue(product[5])  # alert_threshold
             self.description_input.setText(product[6] or "")  # description
+            self.barcode_input.setText(product[9] or "")  # barcode
             
             # Set category
             index = self.category_combo.findData(product[2])  # category_id
@@ -219,7 +430,8 @@ class AddEditProductDialog(QDialog):
             'quantity': self.quantity_input.value(),
             'price': self.price_input.value(),
             'alert_threshold': self.alert_threshold.value(),
-            'description': self.description_input.toPlainText()
+            'description': self.description_input.toPlainText(),
+            'barcode': self.barcode_input.text().strip()
         }
 
 class CategoryManagementDialog(QDialog):
@@ -413,14 +625,268 @@ class LowStockDialog(QDialog):
             receive_btn.clicked.connect(lambda checked, p=product: self.parent().receive_stock(p))
             self.table.setCellWidget(row, 4, receive_btn)
 
+class InventoryTableModel(QAbstractTableModel):
+    """Product rows for the inventory view, patched in place from catalogue deltas"""
+    
+    HEADERS = ["ID", "Name", "Category", "Quantity", "Price",
+               "Alert Threshold", "Last Updated", "Actions"]
+    ACTIONS_COLUMN = 7
+    
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self.products = []
+        self.rows = {}
+    
+    def load(self, products):
+        self.beginResetModel()
+        self.products = list(products)
+        self.rows = {product[0]: row for row, product in enumerate(self.products)}
+        self.endResetModel()
+    
+    def rowCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(self.products)
+    
+    def columnCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(self.HEADERS)
+    
+    def headerData(self, section, orientation, role=Qt.ItemDataRole.DisplayRole):
+        if orientation == Qt.Orientation.Horizontal and role == Qt.ItemDataRole.DisplayRole:
+            return self.HEADERS[section]
+        return None
+    
+    def data(self, index, role=Qt.ItemDataRole.DisplayRole):
+        if not index.isValid():
+            return None
+        product = self.products[index.row()]
+        column = index.column()
+        
+        if role == Qt.ItemDataRole.DisplayRole:
+            if column == 0:
+                return str(product[0])
+            elif column == 1:
+                return product[1]
+            elif column == 2:
+                return product[-1]
+            elif column == 3:
+                return str(product[3])
+            elif column == 4:
+                return f"${product[4]:.2f}"
+            elif column == 5:
+                return str(product[5])
+            elif column == 6:
+                return str(product[8])
+        elif role == Qt.ItemDataRole.BackgroundRole:
+            if column == 3 and product[3] <= product[5]:  # If quantity <= alert_threshold
+                return QColor("#8B0000")
+        elif role == Qt.ItemDataRole.UserRole:
+            return product
+        return None
+    
+    def product_at(self, row):
+        return self.products[row]
+    
+    def remove_product(self, product_id):
+        """Drop a product's row in O(1): the last row moves into its place.
+        
+        Row order is not kept (changed products are appended anyway), so
+        no other row has to be renumbered.
+        """
+        row = self.rows.pop(product_id, None)
+        if row is None:
+            return
+        last = len(self.products) - 1
+        self.beginRemoveRows(QModelIndex(), last, last)
+        moved = self.products.pop()
+        self.endRemoveRows()
+        if row != last:
+            self.products[row] = moved
+            self.rows[moved[0]] = row
+            self.dataChanged.emit(self.index(row, 0), self.index(row, self.ACTIONS_COLUMN - 1))
+    
+    def apply_delta(self, delta, accepts=None):
+        """Apply changed/removed product rows, touching only the affected rows.
+        
+        ``accepts`` is the active filter; changed products that no longer
+        pass it leave the model and newly matching ones are appended.
+        """
+        for product_id in delta['removed']:
+            self.remove_product(product_id)
+        
+        for product in delta['changed']:
+            row = self.rows.get(product[0])
+            if accepts is not None and not accepts(product):
+                self.remove_product(product[0])
+            elif row is None:
+                row = len(self.products)
+                self.beginInsertRows(QModelIndex(), row, row)
+                self.products.append(product)
+                self.rows[product[0]] = row
+                self.endInsertRows()
+            else:
+                self.products[row] = product
+                self.dataChanged.emit(self.index(row, 0), self.index(row, self.ACTIONS_COLUMN - 1))
+
+class StockHistoryModel(QAbstractTableModel):
+    """Stock receiving history, newest first, fetched a page at a time as the view scrolls"""
+    
+    HEADERS = ["Date", "Product", "Supplier", "Quantity",
+               "Purchase Price", "Selling Price", "Notes"]
+    PAGE_SIZE = 200
+    
+    def __init__(self, db_manager, parent=None):
+        super().__init__(parent)
+        self.db_manager = db_manager
+        self.records = []
+        self.product_id = None
+        self.days = None
+        self.exhausted = True
+    
+    def set_filter(self, product_id=None, days=None):
+        """Restart the history for one product (or all) over the last ``days`` days"""
+        self.beginResetModel()
+        self.records = []
+        self.product_id = product_id
+        self.days = days
+        self.exhausted = False
+        self.endResetModel()
+        self.fetchMore(QModelIndex())
+    
+    def canFetchMore(self, parent=QModelIndex()):
+        return not parent.isValid() and not self.exhausted
+    
+    def fetchMore(self, parent=QModelIndex()):
+        if parent.isValid() or self.exhausted:
+            return
+        # Keyset cursor: continue after the oldest row already loaded
+        before = (self.records[-1][7], self.records[-1][0]) if self.records else None
+        page = self.db_manager.get_stock_history(
+            self.product_id,
+            before=before,
+            limit=self.PAGE_SIZE,
+            days=self.days
+        )
+        if len(page) < self.PAGE_SIZE:
+            self.exhausted = True
+        if page:
+            first = len(self.records)
+            self.beginInsertRows(QModelIndex(), first, first + len(page) - 1)
+            self.records.extend(page)
+            self.endInsertRows()
+    
+    def prepend(self, record):
+        if self.product_id is not None and record[1] != self.product_id:
+            return
+        self.beginInsertRows(QModelIndex(), 0, 0)
+        self.records.insert(0, record)
+        self.endInsertRows()
+    
+    def rowCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(self.records)
+    
+    def columnCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(self.HEADERS)
+    
+    def headerData(self, section, orientation, role=Qt.ItemDataRole.DisplayRole):
+        if orientation == Qt.Orientation.Horizontal and role == Qt.ItemDataRole.DisplayRole:
+            return self.HEADERS[section]
+        return None
+    
+    def data(self, index, role=Qt.ItemDataRole.DisplayRole):
+        if not index.isValid() or role != Qt.ItemDataRole.DisplayRole:
+            return None
+        record = self.records[index.row()]
+        column = index.column()
+        if column == 0:
+            return str(record[7])  # Date
+        elif column == 1:
+            return record[-1]  # Product name
+        elif column == 2:
+            return record[2]  # Supplier
+        elif column == 3:
+            return str(record[3])  # Quantity
+        elif column == 4:
+            return f"${record[4]:.2f}"  # Purchase Price
+        elif column == 5:
+            return f"${record[5]:.2f}"  # Selling Price
+        elif column == 6:
+            return record[6] or ""  # Notes
+        return None
+
+class ProductActionsDelegate(QStyledItemDelegate):
+    """Paints Edit/Receive/Delete buttons instead of creating a widget per row"""
+    
+    action_triggered = pyqtSignal(str, int)
+    ACTIONS = [("edit", "Edit"), ("receive", "Receive"), ("delete", "Delete")]
+    
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        # Off on a synced till, whose products are changed on the central server
+        self.enabled = True
+    
+    def button_rects(self, rect):
+        width = rect.width() // len(self.ACTIONS)
+        return [QRect(rect.x() + i * width + 2, rect.y() + 2, width - 4, rect.height() - 4)
+                for i in range(len(self.ACTIONS))]
+    
+    def paint(self, painter, option, index):
+        for rect, (_, label) in zip(self.button_rects(option.rect), self.ACTIONS):
+            button = QStyleOptionButton()
+            button.rect = rect
+            button.text = label
+            button.state = QStyle.StateFlag.State_Enabled if self.enabled else QStyle.StateFlag.State_None
+            QApplication.style().drawControl(QStyle.ControlElement.CE_PushButton, button, painter)
+    
+    def editorEvent(self, event, model, option, index):
+        if self.enabled and event.type() == QEvent.Type.MouseButtonRelease:
+            for rect, (action, _) in zip(self.button_rects(option.rect), self.ACTIONS):
+                if rect.contains(event.position().toPoint()):
+                    self.action_triggered.emit(action, index.row())
+                    return True
+        return False
+
+class ProductImportWorker(QThread):
+    """Runs a product import on its own database connection off the GUI thread"""
+    
+    progress = pyqtSignal(int, float)
+    import_finished = pyqtSignal(dict)
+    import_failed = pyqtSignal(str)
+    
+    def __init__(self, db_path, file_path, parent=None):
+        super().__init__(parent)
+        self.db_path = db_path
+        self.file_path = file_path
+        self.cancelled = False
+    
+    def cancel(self):
+        self.cancelled = True
+    
+    def run(self):
+        # SQLite connections belong to the thread that opened them
+        db_manager = DatabaseManager(self.db_path, initialize=False)
+        try:
+            result = ProductImporter(db_manager).run(
+                self.file_path,
+                progress=self.progress.emit,
+                cancelled=lambda: self.cancelled
+            )
+            self.import_finished.emit(result)
+        except Exception as e:
+            logger.error(f"Error importing products: {str(e)}", exc_info=True)
+            self.import_failed.emit(str(e))
+        finally:
+            db_manager.close()
+
 class InventoryWindow(QMainWindow):
     def __init__(self, db_manager, current_user):
         super().__init__()
         self.db_manager = db_manager
         self.current_user = current_user
+        self.low_stock_ids = set()
         self.setup_ui()
         self.load_inventory()
-        self.check_low_stock()
+        
+        # Keep the table in sync with catalogue changes
+        self.db_manager.subscribe_catalog(self.on_catalog_changed)
         
         # Log window access
         self.db_manager.log_user_activity(
@@ -459,11 +925,22 @@ class InventoryWindow(QMainWindow):
         add_btn.clicked.connect(self.add_product)
         toolbar.addWidget(add_btn)
         
-        # Receive Stock button
-        receive_btn = QPushButton("Receive Stock")
-        receive_btn.clicked.connect(self.receive_stock)
+        # Import Products button
+        import_btn = QPushButton("Import Products")
+        import_btn.clicked.connect(self.import_products)
+        toolbar.addWidget(import_btn)
+        
+        # Receive Delivery button: a whole supplier delivery in one go
+        receive_btn = QPushButton("Receive Delivery")
+        receive_btn.clicked.connect(self.receive_delivery)
         toolbar.addWidget(receive_btn)
         
+        # A synced till takes its products and their stock from the central server
+        if self.db_manager.outbox_enabled:
+            for button in (add_btn, import_btn, receive_btn):
+                button.setEnabled(False)
+                button.setToolTip("Products are managed on the central server")
+        
         # Categories button
         categories_btn = QPushButton("Manage Categories")
         categories_btn.clicked.connect(self.manage_categories)
@@ -475,10 +952,14 @@ class InventoryWindow(QMainWindow):
         refresh_btn.clicked.connect(self.load_inventory)
         toolbar.addWidget(refresh_btn)
         
-        # Search box
+        # Search box (debounced so typing does not refilter on every keystroke)
+        self.search_timer = QTimer(self)
+        self.search_timer.setSingleShot(True)
+        self.search_timer.setInterval(200)
+        self.search_timer.timeout.connect(self.filter_inventory)
         self.search_input = QLineEdit()
         self.search_input.setPlaceholderText("Search products...")
-        self.search_input.textChanged.connect(self.filter_inventory)
+        self.search_input.textChanged.connect(self.search_timer.start)
         toolbar.addWidget(self.search_input)
         
         # Add category filter
@@ -488,6 +969,12 @@ class InventoryWindow(QMainWindow):
         self.category_filter.currentIndexChanged.connect(self.filter_inventory)
         toolbar.addWidget(self.category_filter)
         
+        # Low stock only filter
+        self.low_stock_filter = QCheckBox("Low stock only")
+        self.low_stock_filter.setStyleSheet("color: white;")
+        self.low_stock_filter.toggled.connect(self.filter_inventory)
+        toolbar.addWidget(self.low_stock_filter)
+        
         # Add low stock alert button with counter
         self.low_stock_btn = QPushButton("Low Stock (0)")
         self.low_stock_btn.clicked.connect(self.show_low_stock_dialog)
@@ -499,13 +986,15 @@ class InventoryWindow(QMainWindow):
         products_layout.addLayout(toolbar)
         
         # Create inventory table
-        self.inventory_table = QTableWidget()
-        self.inventory_table.setColumnCount(8)
-        self.inventory_table.setHorizontalHeaderLabels([
-            "ID", "Name", "Category", "Quantity", "Price", 
-            "Alert Threshold", "Last Updated", "Actions"
-        ])
+        self.inventory_model = InventoryTableModel(self)
+        self.inventory_table = QTableView()
+        self.inventory_table.setModel(self.inventory_model)
         self.inventory_table.horizontalHeader().setSectionResizeMode(1, QHeaderView.ResizeMode.Stretch)
+        self.inventory_table.setColumnWidth(InventoryTableModel.ACTIONS_COLUMN, 220)
+        self.actions_delegate = ProductActionsDelegate(self.inventory_table)
+        self.actions_delegate.action_triggered.connect(self.on_product_action)
+        self.actions_delegate.enabled = not self.db_manager.outbox_enabled
+        self.inventory_table.setItemDelegateForColumn(InventoryTableModel.ACTIONS_COLUMN, self.actions_delegate)
         products_layout.addWidget(self.inventory_table)
         
         # Add products tab
@@ -514,14 +1003,33 @@ class InventoryWindow(QMainWindow):
         # Add stock history tab
         history_tab = QWidget()
         history_layout = QVBoxLayout(history_tab)
-        self.history_table = QTableWidget()
-        self.history_table.setColumnCount(7)
-        self.history_table.setHorizontalHeaderLabels([
-            "Date", "Product", "Supplier", "Quantity", 
-            "Purchase Price", "Selling Price", "Notes"
-        ])
+        
+        history_filters = QHBoxLayout()
+        self.history_product_filter = QComboBox()
+        self.history_product_filter.addItem("All Products", None)
+        history_filters.addWidget(self.history_product_filter)
+        
+        self.history_window_filter = QComboBox()
+        for label, days in [("Last 30 days", 30), ("Last 90 days", 90),
+                            ("Last 12 months", 365), ("All time", None)]:
+            self.history_window_filter.addItem(label, days)
+        self.history_window_filter.setCurrentIndex(1)
+        history_filters.addWidget(self.history_window_filter)
+        history_filters.addStretch()
+        history_layout.addLayout(history_filters)
+        
+        self.history_model = StockHistoryModel(self.db_manager, self)
+        self.history_table = QTableView()
+        self.history_table.setModel(self.history_model)
         history_layout.addWidget(self.history_table)
         tabs.addTab(history_tab, "Stock History")
+        self.history_product_filter.currentIndexChanged.connect(self.load_stock_history)
+        self.history_window_filter.currentIndexChanged.connect(self.load_stock_history)
+        
+        # Double-clicking a product drills down into its stock history
+        self.tabs = tabs
+        self.history_tab = history_tab
+        self.inventory_table.doubleClicked.connect(self.show_product_history)
         
         # Add tabs to main layout
         layout.addWidget(tabs)
@@ -549,15 +1057,15 @@ class InventoryWindow(QMainWindow):
             QTabBar::tab:selected {
                 background-color: #444444;
             }
-            QTableWidget {
+            QTableWidget, QTableView {
                 background-color: #333333;
                 color: white;
                 gridline-color: #555555;
             }
-            QTableWidget::item {
+            QTableWidget::item, QTableView::item {
                 padding: 5px;
             }
-            QTableWidget::item:selected {
+            QTableWidget::item:selected, QTableView::item:selected {
                 background-color: #555555;
             }
             QHeaderView::section {
@@ -607,16 +1115,25 @@ class InventoryWindow(QMainWindow):
         """)
     
     def load_category_filter(self):
+        selected = self.category_filter.currentData()
+        self.category_filter.blockSignals(True)
         self.category_filter.clear()
         self.category_filter.addItem("All Categories", None)
         categories = self.db_manager.get_all_categories()
         for category in categories:
             self.category_filter.addItem(category[1], category[0])
+        self.category_filter.setCurrentIndex(max(self.category_filter.findData(selected), 0))
+        self.category_filter.blockSignals(False)
     
     def check_low_stock(self):
         low_stock = self.db_manager.get_low_stock_products()
-        self.low_stock_btn.setText(f"Low Stock ({len(low_stock)})")
-        if len(low_stock) > 0:
+        self.low_stock_ids = {product[0] for product in low_stock}
+        self.update_low_stock_badge()
+    
+    def update_low_stock_badge(self):
+        count = len(self.low_stock_ids)
+        self.low_stock_btn.setText(f"Low Stock ({count})")
+        if count > 0:
             self.low_stock_btn.setStyleSheet("background-color: #8B0000;")
         else:
             self.low_stock_btn.setStyleSheet("")
@@ -632,17 +1149,19 @@ class InventoryWindow(QMainWindow):
         
         try:
             dialog = CategoryManagementDialog(self, self.db_manager)
-            if dialog.exec() == QDialog.DialogCode.Accepted:
-                self.load_category_filter()
-                self.load_inventory()
-                
-                # Log activity
-                self.db_manager.log_user_activity(
-                    self.current_user['id'],
-                    "manage",
-                    "inventory",
-                    "Managed product categories"
-                )
+            dialog.exec()
+            
+            # Product rows are refreshed through catalogue deltas
+            self.load_category_filter()
+            self.filter_inventory()
+            
+            # Log activity
+            self.db_manager.log_user_activity(
+                self.current_user['id'],
+                "manage",
+                "inventory",
+                "Managed product categories"
+            )
         
         except Exception as e:
             logger.error(f"Error managing categories: {str(e)}", exc_info=True)
@@ -650,52 +1169,7 @@ class InventoryWindow(QMainWindow):
     
     def load_inventory(self):
         try:
-            products = self.db_manager.get_all_products()
-            self.inventory_table.setRowCount(len(products))
-            
-            for row, product in enumerate(products):
-                # ID
-                id_item = QTableWidgetItem(str(product[0]))
-                id_item.setFlags(id_item.flags() & ~Qt.ItemFlag.ItemIsEditable)
-                self.inventory_table.setItem(row, 0, id_item)
-                
-                # Name
-                self.inventory_table.setItem(row, 1, QTableWidgetItem(product[1]))
-                
-                # Category
-                self.inventory_table.setItem(row, 2, QTableWidgetItem(product[-1]))
-                
-                # Quantity
-                quantity_item = QTableWidgetItem(str(product[3]))
-                if product[3] <= product[5]:  # If quantity <= alert_threshold
-                    quantity_item.setBackground(QColor("#8B0000"))
-                self.inventory_table.setItem(row, 3, quantity_item)
-                
-                # Price
-                self.inventory_table.setItem(row, 4, QTableWidgetItem(f"${product[4]:.2f}"))
-                
-                # Alert Threshold
-                self.inventory_table.setItem(row, 5, QTableWidgetItem(str(product[5])))
-                
-                # Last Updated
-                self.inventory_table.setItem(row, 6, QTableWidgetItem(str(product[8])))
-                
-                # Action buttons
-                actions_widget = QWidget()
-                actions_layout = QHBoxLayout(actions_widget)
-                actions_layout.setContentsMargins(4, 4, 4, 4)
-                
-                edit_btn = QPushButton("Edit")
-                edit_btn.clicked.connect(lambda checked, p=product: self.edit_product(p))
-                receive_btn = QPushButton("Receive")
-                receive_btn.clicked.connect(lambda checked, p=product: self.receive_stock(p))
-                delete_btn = QPushButton("Delete")
-                delete_btn.clicked.connect(lambda checked, p=product: self.delete_product(p))
-                
-                actions_layout.addWidget(edit_btn)
-                actions_layout.addWidget(receive_btn)
-                actions_layout.addWidget(delete_btn)
-                self.inventory_table.setCellWidget(row, 7, actions_widget)
+            products = self.filter_inventory()
             
             # Load stock history
             self.load_stock_history()
@@ -709,46 +1183,81 @@ class InventoryWindow(QMainWindow):
             logger.error(f"Error loading inventory: {str(e)}", exc_info=True)
             QMessageBox.critical(self, "Error", f"Failed to load inventory: {str(e)}")
     
+    def show_product_history(self, index):
+        if index.column() == InventoryTableModel.ACTIONS_COLUMN:
+            return
+        product = self.inventory_model.product_at(index.row())
+        filter_index = self.history_product_filter.findData(product[0])
+        if filter_index < 0:
+            self.history_product_filter.addItem(product[1], product[0])
+            filter_index = self.history_product_filter.count() - 1
+        # Setting the index triggers load_stock_history
+        self.history_product_filter.setCurrentIndex(filter_index)
+        self.tabs.setCurrentWidget(self.history_tab)
+    
+    def on_product_action(self, action, row):
+        product = self.inventory_model.product_at(row)
+        if action == "edit":
+            self.edit_product(product)
+        elif action == "receive":
+            self.receive_stock(product)
+        elif action == "delete":
+            self.delete_product(product)
+    
+    def on_catalog_changed(self, delta):
+        """Patch only the rows touched by a catalogue delta"""
+        if delta['reset']:
+            self.load_category_filter()
+            self.load_inventory()
+            return
+        
+        self.inventory_model.apply_delta(delta, self.product_matches_filter)
+        
+        # Keep the low stock badge in step without rescanning the catalogue
+        for product_id in delta['removed']:
+            self.low_stock_ids.discard(product_id)
+        for product in delta['changed']:
+            if product[3] <= product[5]:
+                self.low_stock_ids.add(product[0])
+            else:
+                self.low_stock_ids.discard(product[0])
+        self.update_low_stock_badge()
+    
+    def closeEvent(self, event):
+        self.db_manager.unsubscribe_catalog(self.on_catalog_changed)
+        super().closeEvent(event)
+    
     def load_stock_history(self):
         try:
-            history = self.db_manager.get_stock_history()
-            self.history_table.setRowCount(len(history))
-            
-            for row, record in enumerate(history):
-                self.history_table.setItem(row, 0, QTableWidgetItem(str(record[7])))  # Date
-                self.history_table.setItem(row, 1, QTableWidgetItem(record[-1]))  # Product name
-                self.history_table.setItem(row, 2, QTableWidgetItem(record[2]))  # Supplier
-                self.history_table.setItem(row, 3, QTableWidgetItem(str(record[3])))  # Quantity
-                self.history_table.setItem(row, 4, QTableWidgetItem(f"${record[4]:.2f}"))  # Purchase Price
-                self.history_table.setItem(row, 5, QTableWidgetItem(f"${record[5]:.2f}"))  # Selling Price
-                self.history_table.setItem(row, 6, QTableWidgetItem(record[6] or ""))  # Notes
+            self.history_model.set_filter(
+                self.history_product_filter.currentData(),
+                self.history_window_filter.currentData()
+            )
         except Exception as e:
             logger.error(f"Error loading stock history: {str(e)}", exc_info=True)
             QMessageBox.critical(self, "Error", f"Failed to load stock history: {str(e)}")
     
+    def current_filters(self):
+        return {
+            'search_text': self.search_input.text().strip(),
+            'category_id': self.category_filter.currentData(),
+            'low_stock_only': self.low_stock_filter.isChecked()
+        }
+    
+    def product_matches_filter(self, product):
+        return self.db_manager.product_matches_filter(product, **self.current_filters())
+    
     def filter_inventory(self):
-        search_text = self.search_input.text().lower()
-        selected_category = self.category_filter.currentData()
-        
-        for row in range(self.inventory_table.rowCount()):
-            show_row = True
-            
-            # Category filter
-            if selected_category is not None:
-                category_item = self.inventory_table.item(row, 2)
-                if category_item and int(self.inventory_table.item(row, 0).text()) != selected_category:
-                    show_row = False
-            
-            # Text search
-            if show_row and search_text:
-                show_row = False
-                for col in range(1, 5):  # Search in name, category, quantity, and price columns
-                    item = self.inventory_table.item(row, col)
-                    if item and search_text in item.text().lower():
-                        show_row = True
-                        break
-            
-            self.inventory_table.setRowHidden(row, not show_row)
+        """Show only the products matching search, category and low stock filters.
+        
+        Matching runs against the catalogue indexes and the model only
+        receives the matching rows, so the view never walks hidden rows.
+        """
+        self.search_timer.stop()
+        products = self.db_manager.filter_products(**self.current_filters())
+        self.inventory_model.load(products)
+        self.status_bar.showMessage(f"Showing {len(products)} products")
+        return products
     
     def receive_stock(self, product):
         if not self.check_permission('inventory_edit'):
@@ -760,8 +1269,8 @@ class InventoryWindow(QMainWindow):
             if dialog.exec() == QDialog.DialogCode.Accepted:
                 stock_data = dialog.get_stock_data()
                 
-                # Add stock receiving record
-                self.db_manager.add_stock_receiving(
+                # Add stock receiving record; the product row arrives as a catalogue delta
+                receipt_id = self.db_manager.add_stock_receiving(
                     product[0],
                     stock_data['supplier'],
                     stock_data['quantity'],
@@ -778,14 +1287,50 @@ class InventoryWindow(QMainWindow):
                     f"Received stock for product: {product[1]}"
                 )
                 
-                self.load_inventory()
-                self.check_low_stock()
+                receipt = self.db_manager.get_stock_receipt(receipt_id)
+                if receipt:
+                    self.history_model.prepend(receipt)
                 self.status_bar.showMessage("Stock received successfully")
         
         except Exception as e:
             logger.error(f"Error receiving stock: {str(e)}", exc_info=True)
             QMessageBox.critical(self, "Error", f"Failed to receive stock: {str(e)}")
     
+    def receive_delivery(self):
+        if not self.check_permission('inventory_edit'):
+            QMessageBox.warning(self, "Access Denied", "You don't have permission to receive stock")
+            return
+        
+        try:
+            dialog = GoodsReceivedDialog(self, self.db_manager)
+            if dialog.exec() == QDialog.DialogCode.Accepted:
+                delivery = dialog.get_delivery_data()
+                
+                # One transaction for the whole delivery; product rows arrive as a catalogue delta
+                grn_id = self.db_manager.receive_delivery(
+                    delivery['supplier'],
+                    delivery['lines'],
+                    delivery['reference'],
+                    delivery['notes'],
+                    self.current_user['id']
+                )
+                
+                # Log activity
+                self.db_manager.log_user_activity(
+                    self.current_user['id'],
+                    "receive",
+                    "inventory",
+                    f"Received delivery {delivery['reference'] or grn_id} "
+                    f"({len(delivery['lines'])} lines) from {delivery['supplier'] or 'unknown supplier'}"
+                )
+                
+                self.load_stock_history()
+                self.status_bar.showMessage(f"Delivery received: {len(delivery['lines'])} lines")
+        
+        except Exception as e:
+            logger.error(f"Error receiving delivery: {str(e)}", exc_info=True)
+            QMessageBox.critical(self, "Error", f"Failed to receive delivery: {str(e)}")
+    
     def add_product(self):
         if not self.check_permission('inventory_add'):
             QMessageBox.warning(self, "Access Denied", "You don't have permission to add products")
@@ -803,7 +1348,8 @@ class InventoryWindow(QMainWindow):
                     product_data['price'],
                     product_data['category_id'],
                     product_data['alert_threshold'],
-                    product_data['description']
+                    product_data['description'],
+                    product_data['barcode']
                 )
                 
                 # Log activity
@@ -814,8 +1360,6 @@ class InventoryWindow(QMainWindow):
                     f"Added product: {product_data['name']}"
                 )
                 
-                self.load_inventory()
-                self.check_low_stock()
                 self.status_bar.showMessage("Product added successfully")
         
         except Exception as e:
@@ -840,7 +1384,8 @@ class InventoryWindow(QMainWindow):
                     product_data['price'],
                     product_data['category_id'],
                     product_data['alert_threshold'],
-                    product_data['description']
+                    product_data['description'],
+                    product_data['barcode']
                 )
                 
                 # Log activity
@@ -851,14 +1396,95 @@ class InventoryWindow(QMainWindow):
                     f"Updated product: {product_data['name']}"
                 )
                 
-                self.load_inventory()
-                self.check_low_stock()
                 self.status_bar.showMessage("Product updated successfully")
         
         except Exception as e:
             logger.error(f"Error updating product: {str(e)}", exc_info=True)
             QMessageBox.critical(self, "Error", f"Failed to update product: {str(e)}")
     
+    def import_products(self):
+        if not self.check_permission('inventory_add'):
+            QMessageBox.warning(self, "Access Denied", "You don't have permission to add products")
+            return
+        
+        file_path, _ = QFileDialog.getOpenFileName(
+            self, "Import Products", "",
+            "Product Catalogues (*.csv *.xlsx);;CSV Files (*.csv);;Excel Files (*.xlsx)"
+        )
+        if not file_path:
+            return
+        
+        self.import_progress = QProgressDialog("Importing products...", "Cancel", 0, 1000, self)
+        self.import_progress.setWindowTitle("Import Products")
+        self.import_progress.setWindowModality(Qt.WindowModality.WindowModal)
+        self.import_progress.setMinimumDuration(0)
+        
+        self.import_worker = ProductImportWorker(self.db_manager.db_path, file_path, self)
+        self.import_worker.progress.connect(self.on_import_progress)
+        self.import_worker.import_finished.connect(
+            lambda result: self.on_import_finished(file_path, result))
+        self.import_worker.import_failed.connect(self.on_import_failed)
+        self.import_progress.canceled.connect(self.import_worker.cancel)
+        self.import_worker.start()
+    
+    def on_import_progress(self, rows, fraction):
+        self.import_progress.setLabelText(f"Importing products... {rows} rows read")
+        self.import_progress.setValue(int(fraction * 1000))
+    
+    def on_import_finished(self, file_path, result):
+        self.import_progress.close()
+        errors = result['errors']
+        
+        # The import committed on another connection; reload from the database
+        self.load_category_filter()
+        self.load_inventory()
+        
+        self.db_manager.log_user_activity(
+            self.current_user['id'],
+            "import",
+            "inventory",
+            f"Imported products from {file_path}: {result['inserted']} added, "
+            f"{result['updated']} updated, {len(errors)} rejected"
+        )
+        
+        summary = (f"{result['rows']} rows read\n"
+                   f"{result['inserted']} products added\n"
+                   f"{result['updated']} products updated\n"
+                   f"{len(errors)} rows rejected")
+        if result['cancelled']:
+            summary = "Import cancelled; rows before the cancel were saved.\n\n" + summary
+        if not errors:
+            QMessageBox.information(self, "Import Complete", summary)
+            return
+        
+        shown = "\n".join(f"Line {line}: {message}" for line, message in errors[:10])
+        reply = QMessageBox.question(
+            self, "Import Complete",
+            f"{summary}\n\n{shown}\n\nSave the full list of rejected rows?",
+            QMessageBox.StandardButton.Yes | QMessageBox.StandardButton.No
+        )
+        if reply == QMessageBox.StandardButton.Yes:
+            self.save_import_errors(errors)
+    
+    def on_import_failed(self, message):
+        self.import_progress.close()
+        QMessageBox.critical(self, "Error", f"Failed to import products: {message}")
+    
+    def save_import_errors(self, errors):
+        file_name, _ = QFileDialog.getSaveFileName(
+            self, "Save Rejected Rows", "import_errors.csv", "CSV Files (*.csv)"
+        )
+        if not file_name:
+            return
+        try:
+            with open(file_name, 'w', newline='') as f:
+                writer = csv.writer(f)
+                writer.writerow(["Line", "Error"])
+                writer.writerows(errors)
+        except Exception as e:
+            logger.error(f"Error saving import errors: {str(e)}", exc_info=True)
+            QMessageBox.critical(self, "Error", f"Failed to save rejected rows: {str(e)}")
+    
     def delete_product(self, product):
         if not self.check_permission('inventory_delete'):
             QMessageBox.warning(self, "Access Denied", "You don't have permission to delete products")
@@ -884,8 +1510,6 @@ class InventoryWindow(QMainWindow):
                     f"Deleted product: {product[1]}"
                 )
                 
-                self.load_inventory()
-                self.check_low_stock()
                 self.status_bar.showMessage("Product deleted successfully")
         
         except Exception as e:
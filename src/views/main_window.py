@@ -1,17 +1,16 @@
 from PyQt6.QtWidgets import (QMainWindow, QWidget, QVBoxLayout, QHBoxLayout, QMenuBar, QStatusBar,
                            QLabel, QFrame, QSizePolicy, QMenu, QDialog, QLineEdit, QFormLayout,
-                           QPushButton, QMessageBox)
-from PyQt6.QtCore import Qt, QTimer
+                           QPushButton, QMessageBox, QTabWidget, QTableWidget, QTableWidgetItem,
+                           QHeaderView, QDoubleSpinBox, QCheckBox)
+from PyQt6.QtCore import Qt, QTimer, QEvent
 from PyQt6.QtGui import QFont, QAction
 from datetime import datetime
+import importlib
 import logging
 import os
-from .inventory_window import InventoryWindow
-from .pos_window import POSWindow
-from .reports_window import ReportsWindow
-from .backup_window import BackupWindow
+import sys
+import time
 from .login_window import LoginWindow, ChangePasswordDialog
-from .user_management_window import UserManagementWindow
 
 # Set up logging
 log_dir = "logs"
@@ -26,6 +25,34 @@ logging.basicConfig(
 
 logger = logging.getLogger('TerranPOS')
 
+# Feature windows are imported on first use so login does not wait for them
+VIEW_MODULES = {
+    'pos': ('pos_window', 'POSWindow'),
+    'inventory': ('inventory_window', 'InventoryWindow'),
+    'reports': ('reports_window', 'ReportsWindow'),
+    'backup': ('backup_window', 'BackupWindow'),
+    'user_management': ('user_management_window', 'UserManagementWindow'),
+}
+# Permission needed before a window is worth preloading after login
+VIEW_PERMISSIONS = {
+    'pos': 'pos_access',
+    'inventory': 'inventory_view',
+    'reports': 'reports_view',
+    'backup': 'backup_create',
+    'user_management': 'user_view',
+}
+
+def load_view(name):
+    """Import a feature window's module on first use and return its class"""
+    module_name, class_name = VIEW_MODULES[name]
+    qualified = f"{__package__}.{module_name}"
+    module = sys.modules.get(qualified)
+    if module is None:
+        start = time.perf_counter()
+        module = importlib.import_module(qualified)
+        logger.info(f"Loaded {module_name} in {(time.perf_counter() - start) * 1000:.1f} ms")
+    return getattr(module, class_name)
+
 class CompanyInfoDialog(QDialog):
     def __init__(self, parent=None):
         super().__init__(parent)
@@ -51,14 +78,118 @@ class CompanyInfoDialog(QDialog):
         buttons.addWidget(cancel_btn)
         layout.addRow(buttons)
 
+class QueryProfilerDialog(QDialog):
+    """Slowest statements and per-screen query totals from the query profiler"""
+    
+    def __init__(self, parent=None, db_manager=None):
+        super().__init__(parent)
+        self.db_manager = db_manager
+        self.profiler = db_manager.profiler
+        self.setWindowTitle("Query Profiler")
+        self.setMinimumSize(1000, 600)
+        
+        layout = QVBoxLayout(self)
+        
+        # Slow query threshold
+        threshold_layout = QHBoxLayout()
+        # Off by default: profiling slows every statement down
+        self.enabled_check = QCheckBox("Profile statements")
+        self.enabled_check.setChecked(self.profiler.enabled)
+        self.enabled_check.toggled.connect(self.update_enabled)
+        threshold_layout.addWidget(self.enabled_check)
+        threshold_layout.addWidget(QLabel("Log statements slower than:"))
+        self.threshold_input = QDoubleSpinBox()
+        self.threshold_input.setRange(0.1, 60000)
+        self.threshold_input.setSuffix(" ms")
+        self.threshold_input.setValue(self.profiler.threshold_ms)
+        self.threshold_input.valueChanged.connect(self.update_threshold)
+        threshold_layout.addWidget(self.threshold_input)
+        threshold_layout.addStretch()
+        self.cache_label = QLabel()
+        threshold_layout.addWidget(self.cache_label)
+        layout.addLayout(threshold_layout)
+        
+        tabs = QTabWidget()
+        self.slowest_table = QTableWidget()
+        self.slowest_table.setColumnCount(6)
+        self.slowest_table.setHorizontalHeaderLabels([
+            "Duration (ms)", "Rows", "Source", "Parameters", "Statement", "Query Plan"
+        ])
+        tabs.addTab(self.slowest_table, "Slowest Statements")
+        
+        self.stats_table = QTableWidget()
+        self.stats_table.setColumnCount(7)
+        self.stats_table.setHorizontalHeaderLabels([
+            "Total (ms)", "Calls", "Avg (ms)", "Max (ms)", "Rows", "Source", "Statement"
+        ])
+        tabs.addTab(self.stats_table, "By Statement")
+        layout.addWidget(tabs)
+        
+        for table in (self.slowest_table, self.stats_table):
+            table.setEditTriggers(QTableWidget.EditTrigger.NoEditTriggers)
+            table.horizontalHeader().setSectionResizeMode(QHeaderView.ResizeMode.ResizeToContents)
+        
+        buttons = QHBoxLayout()
+        refresh_btn = QPushButton("Refresh")
+        refresh_btn.clicked.connect(self.load_statements)
+        reset_btn = QPushButton("Reset")
+        reset_btn.clicked.connect(self.reset_statements)
+        close_btn = QPushButton("Close")
+        close_btn.clicked.connect(self.accept)
+        buttons.addWidget(refresh_btn)
+        buttons.addWidget(reset_btn)
+        buttons.addStretch()
+        buttons.addWidget(close_btn)
+        layout.addLayout(buttons)
+        
+        self.load_statements()
+    
+    def load_statements(self):
+        cache = self.db_manager.statement_cache_stats()
+        self.cache_label.setText(
+            f"Statement cache: {cache['size']}/{cache['capacity']} compiled, "
+            f"{cache['hits']} hits, {cache['misses']} misses ({cache['hit_rate']:.1%} hit rate)"
+        )
+        
+        slowest = self.profiler.slowest()
+        self.slowest_table.setRowCount(len(slowest))
+        for row, entry in enumerate(slowest):
+            values = [f"{entry['duration_ms']:.2f}", str(entry['rows']), entry['source'],
+                      entry['params'], entry['sql'], entry['plan']]
+            for column, value in enumerate(values):
+                self.slowest_table.setItem(row, column, QTableWidgetItem(value))
+        
+        stats = self.profiler.statement_stats()
+        self.stats_table.setRowCount(len(stats))
+        for row, entry in enumerate(stats):
+            values = [f"{entry['total_ms']:.2f}", str(entry['count']), f"{entry['avg_ms']:.3f}",
+                      f"{entry['max_ms']:.2f}", str(entry['rows']), entry['source'], entry['sql']]
+            for column, value in enumerate(values):
+                self.stats_table.setItem(row, column, QTableWidgetItem(value))
+    
+    def reset_statements(self):
+        self.profiler.reset()
+        self.load_statements()
+    
+    def update_enabled(self, enabled):
+        self.profiler.enabled = enabled
+        self.db_manager.update_setting('profile_queries', '1' if enabled else '0')
+    
+    def update_threshold(self, value):
+        self.profiler.threshold_ms = value
+        self.db_manager.update_setting('slow_query_ms', str(value))
+
 class MainWindow(QMainWindow):
-    def __init__(self, db_manager):
+    def __init__(self, db_manager, timeline=None):
         super().__init__()
         logger.info("Initializing Main Window")
         try:
             self.db_manager = db_manager
+            self.timeline = timeline
             self.current_user = None
             self.session_token = None
+            self.ui_ready = False
+            self.pending_preloads = []
             
             # Initialize login window
             self.login_window = LoginWindow(self.db_manager)
@@ -69,14 +200,9 @@ class MainWindow(QMainWindow):
             self.session_timer.timeout.connect(self.check_session)
             self.session_timer.start(60000)  # Check every minute
             
-            # Initialize UI (but don't show it yet)
-            self.setup_ui()
-            
-            # Check system date
-            self.check_system_date()
-            
-            # Ensure main window is hidden and show only login window
+            # Show login first; the main UI is built once login has painted
             self.hide()
+            self.login_window.installEventFilter(self)
             self.login_window.show()
             
             logger.info("Main Window initialized successfully")
@@ -84,6 +210,46 @@ class MainWindow(QMainWindow):
             logger.error(f"Error initializing Main Window: {str(e)}", exc_info=True)
             QMessageBox.critical(None, "Error", f"Failed to initialize application: {str(e)}")
     
+    def eventFilter(self, obj, event):
+        if obj is self.login_window and event.type() == QEvent.Type.Paint:
+            self.login_window.removeEventFilter(self)
+            if self.timeline:
+                self.timeline.mark("login first paint")
+            QTimer.singleShot(0, self.finish_startup)
+        return super().eventFilter(obj, event)
+    
+    def finish_startup(self):
+        """Work deferred until the login screen is on screen"""
+        self.ensure_ui()
+        self.check_system_date()
+        if self.timeline:
+            self.timeline.mark("main window ready")
+            self.timeline.finish()
+            self.timeline = None
+    
+    def ensure_ui(self):
+        """Build the main window UI on first need"""
+        if not self.ui_ready:
+            self.setup_ui()
+            self.ui_ready = True
+    
+    def preload_views(self):
+        """Import the windows this user may open, one per event loop pass"""
+        self.pending_preloads = [
+            name for name in VIEW_MODULES
+            if self.check_permission(VIEW_PERMISSIONS[name])
+        ]
+        QTimer.singleShot(0, self.preload_next_view)
+    
+    def preload_next_view(self):
+        if not self.pending_preloads or not self.current_user:
+            return
+        try:
+            load_view(self.pending_preloads.pop(0))
+        except Exception as e:
+            logger.error(f"Error preloading window: {str(e)}", exc_info=True)
+        QTimer.singleShot(0, self.preload_next_view)
+    
     def setup_ui(self):
         self.setWindowTitle("Terran Systems")
         self.setMinimumSize(1024, 768)
@@ -167,6 +333,11 @@ class MainWindow(QMainWindow):
             change_password_action.triggered.connect(self.change_password)
             menu_menu.addAction(change_password_action)
             
+            # Query Profiler (requires settings_edit permission)
+            query_profiler_action = QAction("Query Profiler", self)
+            query_profiler_action.triggered.connect(self.open_query_profiler)
+            menu_menu.addAction(query_profiler_action)
+            
             menu_menu.addSeparator()
             
             # Logout
@@ -197,6 +368,7 @@ class MainWindow(QMainWindow):
             self.menu_actions = {
                 'company_info': company_info_action,
                 'user_management': user_management_action,
+                'query_profiler': query_profiler_action,
                 'pos': self.pos_action,
                 'inventory': self.inventory_action,
                 'reports': self.reports_action,
@@ -221,6 +393,7 @@ class MainWindow(QMainWindow):
             # Update menu items
             self.menu_actions['company_info'].setVisible('settings_view' in allowed_actions)
             self.menu_actions['user_management'].setVisible('user_view' in allowed_actions)
+            self.menu_actions['query_profiler'].setVisible('settings_edit' in allowed_actions)
             self.menu_actions['pos'].setVisible('pos_access' in allowed_actions)
             self.menu_actions['inventory'].setVisible('inventory_view' in allowed_actions)
             self.menu_actions['reports'].setVisible('reports_view' in allowed_actions)
@@ -253,6 +426,7 @@ class MainWindow(QMainWindow):
         """Handle successful login"""
         self.current_user = user_data
         self.session_token = user_data['session_token']
+        self.ensure_ui()
         
         # Update UI based on permissions
         self.update_menu_permissions()
@@ -262,6 +436,9 @@ class MainWindow(QMainWindow):
         
         # Show main window
         self.show()
+        
+        # Import permitted windows while the user reads the main screen
+        self.preload_views()
     
     def logout(self):
         """Log out current user"""
@@ -333,18 +510,32 @@ class MainWindow(QMainWindow):
             return
         
         try:
+            UserManagementWindow = load_view('user_management')
             self.user_management_window = UserManagementWindow(self.db_manager, self.current_user)
             self.user_management_window.show()
         except Exception as e:
             logger.error(f"Error opening user management: {str(e)}", exc_info=True)
             QMessageBox.critical(self, "Error", "Failed to open user management")
     
+    def open_query_profiler(self):
+        if not self.check_permission('settings_edit'):
+            QMessageBox.warning(self, "Access Denied", "You don't have permission to view the query profiler")
+            return
+        
+        try:
+            dialog = QueryProfilerDialog(self, self.db_manager)
+            dialog.exec()
+        except Exception as e:
+            logger.error(f"Error opening query profiler: {str(e)}", exc_info=True)
+            QMessageBox.critical(self, "Error", f"Failed to open query profiler: {str(e)}")
+    
     def open_pos_window(self):
         if not self.check_permission('pos_access'):
             QMessageBox.warning(self, "Access Denied", "You don't have permission to access POS")
             return
         
         try:
+            POSWindow = load_view('pos')
             self.pos_window = POSWindow(self.db_manager, self.current_user)
             self.pos_window.show()
         except Exception as e:
@@ -357,6 +548,7 @@ class MainWindow(QMainWindow):
             return
         
         try:
+            InventoryWindow = load_view('inventory')
             self.inventory_window = InventoryWindow(self.db_manager, self.current_user)
             self.inventory_window.show()
         except Exception as e:
@@ -369,6 +561,7 @@ class MainWindow(QMainWindow):
             return
         
         try:
+            ReportsWindow = load_view('reports')
             self.reports_window = ReportsWindow(self.db_manager, self.current_user)
             self.reports_window.show()
         except Exception as e:
@@ -381,6 +574,7 @@ class MainWindow(QMainWindow):
             return
         
         try:
+            BackupWindow = load_view('backup')
             self.backup_window = BackupWindow(self.db_manager, self.current_user)
             self.backup_window.show()
         except Exception as e:
@@ -3,16 +3,32 @@ from PyQt6.QtWidgets import (QMainWindow, QWidget, QVBoxLayout, QHBoxLayout,
                            QDialog, QLineEdit, QSpinBox, QDoubleSpinBox,
                            QMessageBox, QFormLayout, QHeaderView, QComboBox,
                            QFrame, QStatusBar, QTabWidget, QTextEdit, QGridLayout,
-                           QScrollArea)
-from PyQt6.QtCore import Qt, pyqtSignal, QSizeF
-from PyQt6.QtGui import QColor, QIcon, QFont, QPainter, QPageSize
-from PyQt6.QtPrintSupport import QPrintDialog, QPrinter
+                           QScrollArea, QTableView, QStyledItemDelegate,
+                           QStyleOptionButton, QStyle, QApplication,
+                           QAbstractItemView)
+from PyQt6.QtCore import (Qt, pyqtSignal, QTimer, QAbstractTableModel,
+                          QModelIndex, QEvent, QRect)
+from PyQt6.QtGui import QColor, QIcon, QFont
 import logging
-from datetime import datetime
 import sqlite3
+import time
+from database.db_manager import RESERVATION_TTL_SECONDS
+from database.money import Money
+from database.receipt_spool import build_receipt, get_spooler, layout_receipt
 
 logger = logging.getLogger('TerranPOS')
 
+# Search is run this long after the last keystroke
+SEARCH_DEBOUNCE_MS = 150
+# Keystrokes closer together than this (seconds) are treated as a barcode scanner burst
+SCANNER_KEY_INTERVAL = 0.035
+SCANNER_MIN_LENGTH = 4
+# Product cards are only built for the first results; refine the search to see more
+MAX_VISIBLE_PRODUCTS = 120
+TAX_RATE = 0.23
+# Characters per line of the on-screen receipt
+RECEIPT_PREVIEW_WIDTH = 40
+
 class PaymentDialog(QDialog):
     def __init__(self, parent=None, total_amount=0.0):
         super().__init__(parent)
@@ -168,16 +184,303 @@ class ClientInfoDialog(QDialog):
             'nif': self.nif_input.text()
         }
 
+class CartLine:
+    """A single product line in the cart"""
+    
+    __slots__ = ('product_id', 'name', 'price', 'quantity', 'stock')
+    
+    def __init__(self, product_id, name, price, quantity, stock):
+        self.product_id = product_id
+        self.name = name
+        self.price = Money.of(price)
+        self.quantity = quantity
+        self.stock = stock
+    
+    @property
+    def total(self):
+        return self.price * self.quantity
+
+
+class Cart:
+    """Cart lines keyed by product ID, in the order they were added.
+    
+    The subtotal is kept in integer cents and adjusted by each change, so it
+    never has to be summed over the lines again and does not drift.
+    """
+    
+    def __init__(self):
+        self.lines = {}
+        self._order = []
+        self._rows = {}
+        self._subtotal_cents = 0
+    
+    def __len__(self):
+        return len(self._order)
+    
+    def __iter__(self):
+        return (self.lines[product_id] for product_id in self._order)
+    
+    def __contains__(self, product_id):
+        return product_id in self.lines
+    
+    def get(self, product_id):
+        return self.lines.get(product_id)
+    
+    def line_at(self, row):
+        return self.lines[self._order[row]]
+    
+    def row_of(self, product_id):
+        return self._rows.get(product_id)
+    
+    @property
+    def subtotal(self):
+        return Money(self._subtotal_cents)
+    
+    @property
+    def tax(self):
+        return self.subtotal.apply_rate(TAX_RATE)
+    
+    @property
+    def total(self):
+        return self.subtotal + self.tax
+    
+    def add(self, product, quantity=1, stock=None):
+        """Add a product row, returning (row, created) or None if stock is insufficient.
+        
+        ``stock`` is the quantity available to this till, defaulting to the
+        product's stock level.
+        """
+        product_id = product[0]
+        stock = product[3] if stock is None else stock
+        line = self.lines.get(product_id)
+        if line is not None:
+            line.stock = stock
+            if line.quantity + quantity > line.stock:
+                return None
+            line.quantity += quantity
+            self._subtotal_cents += line.price.cents * quantity
+            return self._rows[product_id], False
+        
+        if quantity > stock:
+            return None
+        line = CartLine(product_id, product[1], product[4], quantity, stock)
+        self.lines[product_id] = line
+        self._rows[product_id] = len(self._order)
+        self._order.append(product_id)
+        self._subtotal_cents += line.total.cents
+        return self._rows[product_id], True
+    
+    def set_quantity(self, product_id, quantity):
+        line = self.lines[product_id]
+        self._subtotal_cents += line.price.cents * (quantity - line.quantity)
+        line.quantity = quantity
+        return self._rows[product_id]
+    
+    def remove(self, product_id):
+        """Remove a line and return the row it occupied.
+        
+        Unlike the other edits this is O(lines in the cart): the lines keep
+        the order they were scanned in, as the cashier and receipt show
+        them, so those below the removed one are renumbered. A cart holds
+        one sale's lines, so this stays small.
+        """
+        line = self.lines.pop(product_id)
+        row = self._rows.pop(product_id)
+        del self._order[row]
+        # Lines below the removed one shift up by one
+        for other_id in self._order[row:]:
+            self._rows[other_id] -= 1
+        self._subtotal_cents -= line.total.cents
+        return row
+    
+    def clear(self):
+        self.lines = {}
+        self._order = []
+        self._rows = {}
+        self._subtotal_cents = 0
+    
+    def items(self):
+        """Cart lines as dicts in the format expected by create_sale"""
+        return [{
+            'id': line.product_id,
+            'name': line.name,
+            'price': float(line.price),
+            'quantity': line.quantity
+        } for line in self]
+
+
+class CartTableModel(QAbstractTableModel):
+    """Table model over a Cart that only signals the rows a change touches.
+    
+    ``reserve(product_id, quantity)`` is consulted before a quantity edit is
+    accepted so the stock hold always matches the cart.
+    """
+    
+    HEADERS = ["ID", "Product", "Price", "Quantity", "Total", "Actions"]
+    QUANTITY_COLUMN = 3
+    TOTAL_COLUMN = 4
+    ACTIONS_COLUMN = 5
+    
+    totals_changed = pyqtSignal()
+    
+    def __init__(self, cart, reserve=None, parent=None):
+        super().__init__(parent)
+        self.cart = cart
+        self.reserve = reserve
+    
+    def rowCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(self.cart)
+    
+    def columnCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(self.HEADERS)
+    
+    def headerData(self, section, orientation, role=Qt.ItemDataRole.DisplayRole):
+        if orientation == Qt.Orientation.Horizontal and role == Qt.ItemDataRole.DisplayRole:
+            return self.HEADERS[section]
+        return None
+    
+    def data(self, index, role=Qt.ItemDataRole.DisplayRole):
+        if not index.isValid():
+            return None
+        line = self.cart.line_at(index.row())
+        column = index.column()
+        
+        if role == Qt.ItemDataRole.DisplayRole:
+            if column == 0:
+                return str(line.product_id)
+            elif column == 1:
+                return line.name
+            elif column == 2:
+                return f"${line.price:.2f}"
+            elif column == 3:
+                return str(line.quantity)
+            elif column == 4:
+                return f"${line.total:.2f}"
+        elif role == Qt.ItemDataRole.EditRole and column == self.QUANTITY_COLUMN:
+            return line.quantity
+        return None
+    
+    def flags(self, index):
+        flags = super().flags(index)
+        if index.isValid() and index.column() == self.QUANTITY_COLUMN:
+            flags |= Qt.ItemFlag.ItemIsEditable
+        return flags
+    
+    def setData(self, index, value, role=Qt.ItemDataRole.EditRole):
+        if not index.isValid() or index.column() != self.QUANTITY_COLUMN:
+            return False
+        line = self.cart.line_at(index.row())
+        quantity = int(value)
+        if quantity < 1 or quantity > line.stock or quantity == line.quantity:
+            return False
+        if self.reserve is not None and not self.reserve(line.product_id, quantity):
+            return False
+        self.set_quantity(line.product_id, quantity)
+        return True
+    
+    def _line_changed(self, row):
+        self.dataChanged.emit(self.index(row, self.QUANTITY_COLUMN), self.index(row, self.TOTAL_COLUMN))
+        self.totals_changed.emit()
+    
+    def add_product(self, product, quantity=1, stock=None):
+        """Add a product, returning False when there is not enough stock"""
+        product_id = product[0]
+        if product_id not in self.cart:
+            if quantity > (product[3] if stock is None else stock):
+                return False
+            row = len(self.cart)
+            self.beginInsertRows(QModelIndex(), row, row)
+            self.cart.add(product, quantity, stock)
+            self.endInsertRows()
+            self.totals_changed.emit()
+            return True
+        
+        result = self.cart.add(product, quantity, stock)
+        if result is None:
+            return False
+        self._line_changed(result[0])
+        return True
+    
+    def set_quantity(self, product_id, quantity):
+        self._line_changed(self.cart.set_quantity(product_id, quantity))
+    
+    def remove_product(self, product_id):
+        row = self.cart.row_of(product_id)
+        if row is None:
+            return
+        self.beginRemoveRows(QModelIndex(), row, row)
+        self.cart.remove(product_id)
+        self.endRemoveRows()
+        self.totals_changed.emit()
+    
+    def clear(self):
+        self.beginResetModel()
+        self.cart.clear()
+        self.endResetModel()
+        self.totals_changed.emit()
+
+
+class CartQuantityDelegate(QStyledItemDelegate):
+    """Spin box editor limited to the stock available for the line"""
+    
+    def createEditor(self, parent, option, index):
+        line = index.model().cart.line_at(index.row())
+        editor = QSpinBox(parent)
+        editor.setRange(1, max(line.stock, 1))
+        return editor
+    
+    def setEditorData(self, editor, index):
+        editor.setValue(index.data(Qt.ItemDataRole.EditRole))
+    
+    def setModelData(self, editor, model, index):
+        editor.interpretText()
+        model.setData(index, editor.value())
+
+
+class CartRemoveDelegate(QStyledItemDelegate):
+    """Paints a Remove button instead of creating a widget per row"""
+    
+    remove_clicked = pyqtSignal(int)
+    
+    def button_rect(self, rect):
+        return QRect(rect.x() + 2, rect.y() + 2, rect.width() - 4, rect.height() - 4)
+    
+    def paint(self, painter, option, index):
+        button = QStyleOptionButton()
+        button.rect = self.button_rect(option.rect)
+        button.text = "Remove"
+        button.state = QStyle.StateFlag.State_Enabled
+        QApplication.style().drawControl(QStyle.ControlElement.CE_PushButton, button, painter)
+    
+    def editorEvent(self, event, model, option, index):
+        if event.type() == QEvent.Type.MouseButtonRelease:
+            if self.button_rect(option.rect).contains(event.position().toPoint()):
+                self.remove_clicked.emit(index.row())
+                return True
+        return False
+
 class POSWindow(QMainWindow):
     def __init__(self, db_manager, current_user):
         super().__init__()
         self.db_manager = db_manager
         self.current_user = current_user
-        self.cart_items = []
+        self.cart = Cart()
         self.client_info = {'name': '', 'nif': ''}
+        self.product_cards = {}
+        self.visible_product_ids = []
+        self.key_times = []
         self.setup_ui()
         self.load_products()
         
+        # Keep the cart's stock holds alive while the till is open
+        self.reservation_timer = QTimer(self)
+        self.reservation_timer.setInterval(RESERVATION_TTL_SECONDS * 1000 // 3)
+        self.reservation_timer.timeout.connect(self.renew_reservations)
+        self.reservation_timer.start()
+        
+        # Keep product cards in sync with catalogue changes
+        self.db_manager.subscribe_catalog(self.on_catalog_changed)
+        
         # Log window access
         self.db_manager.log_user_activity(
             self.current_user['id'],
@@ -212,9 +515,16 @@ class POSWindow(QMainWindow):
         self.category_filter.currentIndexChanged.connect(self.filter_products)
         filter_layout.addWidget(self.category_filter)
         
+        # Typing is debounced; Enter looks up an exact barcode/ID first (scanners end with Enter)
+        self.search_timer = QTimer(self)
+        self.search_timer.setSingleShot(True)
+        self.search_timer.setInterval(SEARCH_DEBOUNCE_MS)
+        self.search_timer.timeout.connect(self.filter_products)
+        
         self.search_input = QLineEdit()
-        self.search_input.setPlaceholderText("Search products...")
-        self.search_input.textChanged.connect(self.filter_products)
+        self.search_input.setPlaceholderText("Search or scan products...")
+        self.search_input.textEdited.connect(self.on_search_edited)
+        self.search_input.returnPressed.connect(self.on_search_return)
         filter_layout.addWidget(self.search_input)
         
         left_layout.addLayout(filter_layout)
@@ -245,12 +555,17 @@ class POSWindow(QMainWindow):
         cart_label.setFont(QFont("Arial", 12, QFont.Weight.Bold))
         right_layout.addWidget(cart_label)
         
-        self.cart_table = QTableWidget()
-        self.cart_table.setColumnCount(6)
-        self.cart_table.setHorizontalHeaderLabels([
-            "ID", "Product", "Price", "Quantity", "Total", "Actions"
-        ])
+        self.cart_model = CartTableModel(self.cart, self.db_manager.reserve_stock, self)
+        self.cart_model.totals_changed.connect(self.update_totals)
+        self.cart_table = QTableView()
+        self.cart_table.setModel(self.cart_model)
+        self.cart_table.setEditTriggers(QAbstractItemView.EditTrigger.AllEditTriggers)
         self.cart_table.horizontalHeader().setSectionResizeMode(1, QHeaderView.ResizeMode.Stretch)
+        self.cart_table.setItemDelegateForColumn(
+            CartTableModel.QUANTITY_COLUMN, CartQuantityDelegate(self.cart_table))
+        remove_delegate = CartRemoveDelegate(self.cart_table)
+        remove_delegate.remove_clicked.connect(self.remove_from_cart)
+        self.cart_table.setItemDelegateForColumn(CartTableModel.ACTIONS_COLUMN, remove_delegate)
         right_layout.addWidget(self.cart_table)
         
         # Totals
@@ -300,12 +615,12 @@ class POSWindow(QMainWindow):
             QLabel {
                 color: white;
             }
-            QTableWidget {
+            QTableWidget, QTableView {
                 background-color: #333333;
                 color: white;
                 gridline-color: #555555;
             }
-            QTableWidget::item {
+            QTableWidget::item, QTableView::item {
                 padding: 5px;
             }
             QHeaderView::section {
@@ -341,11 +656,16 @@ class POSWindow(QMainWindow):
         """)
     
     def load_categories(self):
+        selected_category = self.category_filter.currentData()
+        self.category_filter.blockSignals(True)
         self.category_filter.clear()
         self.category_filter.addItem("All Categories", None)
         categories = self.db_manager.get_all_categories()
         for category in categories:
             self.category_filter.addItem(category[1], category[0])
+        index = self.category_filter.findData(selected_category)
+        self.category_filter.setCurrentIndex(max(index, 0))
+        self.category_filter.blockSignals(False)
     
     def load_products(self):
         try:
@@ -355,141 +675,224 @@ class POSWindow(QMainWindow):
                 widget = item.widget()
                 if widget:
                     widget.deleteLater()
+            self.product_cards = {}
+            self.visible_product_ids = []
             
-            # Get products
-            products = self.db_manager.get_all_products()
-            row = 0
-            col = 0
-            max_cols = 3
-            
-            for product in products:
-                if product[3] > 0:  # Only show products with stock
-                    product_card = QFrame()
-                    product_card.setFrameShape(QFrame.Shape.StyledPanel)
-                    card_layout = QVBoxLayout(product_card)
-                    
-                    # Product name
-                    name_label = QLabel(product[1])
-                    name_label.setFont(QFont("Arial", 10, QFont.Weight.Bold))
-                    name_label.setAlignment(Qt.AlignmentFlag.AlignCenter)
-                    card_layout.addWidget(name_label)
-                    
-                    # Price
-                    price_label = QLabel(f"${product[4]:.2f}")
-                    price_label.setAlignment(Qt.AlignmentFlag.AlignCenter)
-                    card_layout.addWidget(price_label)
-                    
-                    # Stock
-                    stock_label = QLabel(f"In stock: {product[3]}")
-                    stock_label.setAlignment(Qt.AlignmentFlag.AlignCenter)
-                    card_layout.addWidget(stock_label)
-                    
-                    # Add to cart button
-                    add_btn = QPushButton("Add to Cart")
-                    add_btn.clicked.connect(lambda checked, p=product: self.add_to_cart(p))
-                    card_layout.addWidget(add_btn)
-                    
-                    self.products_grid.addWidget(product_card, row, col)
-                    
-                    col += 1
-                    if col >= max_cols:
-                        col = 0
-                        row += 1
-            
-            # Add stretch to fill empty space
-            self.products_grid.setRowStretch(row + 1, 1)
-            self.products_grid.setColumnStretch(max_cols, 1)
+            self.filter_products()
             
         except Exception as e:
             logger.error(f"Error loading products: {str(e)}", exc_info=True)
             QMessageBox.critical(self, "Error", f"Failed to load products: {str(e)}")
     
+    def create_product_card(self, product):
+        product_card = QFrame()
+        product_card.setFrameShape(QFrame.Shape.StyledPanel)
+        card_layout = QVBoxLayout(product_card)
+        
+        # Product name
+        name_label = QLabel(product[1])
+        name_label.setFont(QFont("Arial", 10, QFont.Weight.Bold))
+        name_label.setAlignment(Qt.AlignmentFlag.AlignCenter)
+        card_layout.addWidget(name_label)
+        
+        # Price
+        price_label = QLabel(f"${product[4]:.2f}")
+        price_label.setAlignment(Qt.AlignmentFlag.AlignCenter)
+        card_layout.addWidget(price_label)
+        
+        # Stock
+        stock_label = QLabel(f"In stock: {product[3]}")
+        stock_label.setAlignment(Qt.AlignmentFlag.AlignCenter)
+        card_layout.addWidget(stock_label)
+        
+        # Add to cart button (looks the product up again so stock is current)
+        add_btn = QPushButton("Add to Cart")
+        add_btn.clicked.connect(lambda checked, product_id=product[0]: self.add_product_to_cart(product_id))
+        card_layout.addWidget(add_btn)
+        
+        product_card.name_label = name_label
+        product_card.price_label = price_label
+        product_card.stock_label = stock_label
+        return product_card
+    
+    def update_product_card(self, card, product):
+        card.name_label.setText(product[1])
+        card.price_label.setText(f"${product[4]:.2f}")
+        card.stock_label.setText(f"In stock: {product[3]}")
+    
+    def layout_product_cards(self, product_ids):
+        """Show the cards for the given products, in order, reusing cards already built"""
+        max_cols = 3
+        previous = set(self.visible_product_ids)
+        while self.products_grid.count():
+            self.products_grid.takeAt(0)
+        
+        row = 0
+        col = 0
+        for product_id in product_ids:
+            card = self.product_cards[product_id]
+            self.products_grid.addWidget(card, row, col)
+            card.setVisible(True)
+            col += 1
+            if col >= max_cols:
+                col = 0
+                row += 1
+        
+        # Only cards that dropped out of the results need hiding
+        for product_id in previous.difference(product_ids):
+            card = self.product_cards.get(product_id)
+            if card:
+                card.setVisible(False)
+        
+        # Add stretch to fill empty space
+        self.products_grid.setRowStretch(row + 1, 1)
+        self.products_grid.setColumnStretch(max_cols, 1)
+        self.visible_product_ids = list(product_ids)
+    
+    def on_catalog_changed(self, delta):
+        """Apply a catalogue delta to the product cards"""
+        if delta['reset']:
+            self.load_categories()
+            self.load_products()
+            return
+        
+        visible = set(self.visible_product_ids)
+        matching = None
+        refilter = False
+        for product_id in delta['removed']:
+            card = self.product_cards.pop(product_id, None)
+            if card:
+                card.deleteLater()
+            refilter = refilter or product_id in visible
+        
+        for product in delta['changed']:
+            card = self.product_cards.get(product[0])
+            if card:
+                self.update_product_card(card, product)
+            # Re-run the search when a product enters or leaves the results
+            # (stock reaching zero, rename, new product)
+            if not refilter:
+                if matching is None:
+                    matching = {p[0] for p in self.db_manager.search_catalog(
+                        self.search_input.text(), self.category_filter.currentData(), in_stock_only=True)}
+                refilter = (product[0] in matching) != (product[0] in visible)
+        
+        if refilter:
+            self.filter_products()
+    
+    def closeEvent(self, event):
+        self.db_manager.unsubscribe_catalog(self.on_catalog_changed)
+        self.reservation_timer.stop()
+        self.db_manager.release_reservations()
+        super().closeEvent(event)
+    
+    def on_search_edited(self, text):
+        now = time.perf_counter()
+        if not text:
+            self.key_times = []
+        else:
+            self.key_times.append(now)
+            self.key_times = self.key_times[-len(text):]
+        self.search_timer.start()
+    
+    def is_scanner_burst(self):
+        """True when the current input arrived at scanner speed rather than typing speed"""
+        times = self.key_times
+        if len(times) < SCANNER_MIN_LENGTH:
+            return False
+        average_interval = (times[-1] - times[0]) / (len(times) - 1)
+        return average_interval <= SCANNER_KEY_INTERVAL
+    
+    def on_search_return(self):
+        code = self.search_input.text().strip()
+        if not code:
+            return
+        burst = self.is_scanner_burst()
+        
+        # Fast path: exact barcode/ID goes straight into the cart
+        product = self.db_manager.find_product_by_code(code)
+        if product:
+            self.search_timer.stop()
+            self.search_input.clear()
+            self.key_times = []
+            self.add_to_cart(product)
+            self.filter_products()
+            return
+        
+        if burst:
+            self.search_timer.stop()
+            self.search_input.selectAll()
+            self.status_bar.showMessage(f"Unknown barcode: {code}")
+            return
+        
+        # Typed query: a single result is added, otherwise just search now
+        self.search_timer.stop()
+        results = self.filter_products()
+        if len(results) == 1:
+            self.add_to_cart(results[0])
+    
     def filter_products(self):
-        search_text = self.search_input.text().lower()
+        """Run the search and show the first matching in-stock products"""
+        self.search_timer.stop()
         selected_category = self.category_filter.currentData()
+        results = self.db_manager.search_catalog(
+            self.search_input.text(),
+            selected_category,
+            in_stock_only=True
+        )
         
-        for row in range(self.products_grid.rowCount()):
-            for col in range(self.products_grid.columnCount()):
-                item = self.products_grid.itemAtPosition(row, col)
-                if item and item.widget():
-                    widget = item.widget()
-                    product_name = widget.findChild(QLabel).text().lower()
-                    
-                    show_widget = True
-                    if search_text and search_text not in product_name:
-                        show_widget = False
-                    
-                    widget.setVisible(show_widget)
+        shown = results[:MAX_VISIBLE_PRODUCTS]
+        for product in shown:
+            card = self.product_cards.get(product[0])
+            if card is None:
+                self.product_cards[product[0]] = self.create_product_card(product)
+        self.layout_product_cards([product[0] for product in shown])
+        
+        if len(results) > len(shown):
+            self.status_bar.showMessage(
+                f"Showing {len(shown)} of {len(results)} products - refine your search"
+            )
+        else:
+            self.status_bar.showMessage(f"{len(results)} products")
+        return results
+    
+    def add_product_to_cart(self, product_id):
+        product = self.db_manager.get_product(product_id)
+        if not product:
+            QMessageBox.warning(self, "Warning", "Product is no longer available")
+            return
+        self.add_to_cart(product)
     
     def add_to_cart(self, product):
-        # Check if product is already in cart
-        for item in self.cart_items:
-            if item['id'] == product[0]:
-                if item['quantity'] < product[3]:  # Check stock
-                    item['quantity'] += 1
-                    self.update_cart_display()
-                else:
-                    QMessageBox.warning(self, "Warning", "Not enough stock available")
-                return
+        product_id = product[0]
+        line = self.cart.get(product_id)
+        quantity = (line.quantity if line else 0) + 1
         
-        # Add new item to cart
-        self.cart_items.append({
-            'id': product[0],
-            'name': product[1],
-            'price': product[4],
-            'quantity': 1
-        })
-        self.update_cart_display()
-    
-    def update_cart_display(self):
-        self.cart_table.setRowCount(len(self.cart_items))
-        
-        subtotal = 0
-        for row, item in enumerate(self.cart_items):
-            # ID
-            self.cart_table.setItem(row, 0, QTableWidgetItem(str(item['id'])))
-            
-            # Product name
-            self.cart_table.setItem(row, 1, QTableWidgetItem(item['name']))
-            
-            # Price
-            self.cart_table.setItem(row, 2, QTableWidgetItem(f"${item['price']:.2f}"))
-            
-            # Quantity
-            quantity_spin = QSpinBox()
-            quantity_spin.setRange(1, 100)
-            quantity_spin.setValue(item['quantity'])
-            quantity_spin.valueChanged.connect(lambda value, r=row: self.update_quantity(r, value))
-            self.cart_table.setCellWidget(row, 3, quantity_spin)
-            
-            # Total
-            total = item['price'] * item['quantity']
-            subtotal += total
-            self.cart_table.setItem(row, 4, QTableWidgetItem(f"${total:.2f}"))
-            
-            # Remove button
-            remove_btn = QPushButton("Remove")
-            remove_btn.clicked.connect(lambda checked, r=row: self.remove_from_cart(r))
-            self.cart_table.setCellWidget(row, 5, remove_btn)
-        
-        # Update totals
-        tax = subtotal * 0.23  # 23% tax
-        total = subtotal + tax
-        
-        self.subtotal_label.setText(f"${subtotal:.2f}")
-        self.tax_label.setText(f"${tax:.2f}")
-        self.total_label.setText(f"${total:.2f}")
+        # Cheap check first, then hold the stock so other tills cannot sell it
+        available = self.db_manager.available_to_sell([product_id]).get(product_id, 0)
+        if quantity > available or not self.db_manager.reserve_stock(product_id, quantity):
+            QMessageBox.warning(self, "Warning", "Not enough stock available")
+            return
+        self.cart_model.add_product(product, stock=available)
+        row = self.cart.row_of(product[0])
+        self.cart_table.scrollTo(self.cart_model.index(row, 0))
     
-    def update_quantity(self, row, value):
-        self.cart_items[row]['quantity'] = value
-        self.update_cart_display()
+    def update_totals(self):
+        self.subtotal_label.setText(f"${self.cart.subtotal:.2f}")
+        self.tax_label.setText(f"${self.cart.tax:.2f}")
+        self.total_label.setText(f"${self.cart.total:.2f}")
     
     def remove_from_cart(self, row):
-        self.cart_items.pop(row)
-        self.update_cart_display()
+        product_id = self.cart.line_at(row).product_id
+        self.db_manager.release_reservation(product_id)
+        self.cart_model.remove_product(product_id)
+    
+    def renew_reservations(self):
+        if len(self.cart):
+            self.db_manager.renew_reservations()
     
     def clear_cart(self):
-        if self.cart_items:
+        if len(self.cart):
             reply = QMessageBox.question(
                 self, "Confirm Clear",
                 "Are you sure you want to clear the cart?",
@@ -497,8 +900,8 @@ class POSWindow(QMainWindow):
             )
             
             if reply == QMessageBox.StandardButton.Yes:
-                self.cart_items.clear()
-                self.update_cart_display()
+                self.db_manager.release_reservations()
+                self.cart_model.clear()
     
     def edit_client_info(self):
         dialog = ClientInfoDialog(self)
@@ -508,7 +911,7 @@ class POSWindow(QMainWindow):
             self.client_label.setText(f"Client: {name_display}")
     
     def checkout(self):
-        if not self.cart_items:
+        if not len(self.cart):
             QMessageBox.warning(self, "Error", "Cart is empty")
             return
         
@@ -517,36 +920,34 @@ class POSWindow(QMainWindow):
             QMessageBox.warning(self, "Access Denied", "You don't have permission to process sales")
             return
         
-        # Calculate total
-        subtotal = sum(item['price'] * item['quantity'] for item in self.cart_items)
-        tax = subtotal * 0.23
-        total = subtotal + tax
-        
         # Show payment dialog
-        payment_dialog = PaymentDialog(self, total)
+        payment_dialog = PaymentDialog(self, float(self.cart.total))
         if payment_dialog.exec() == QDialog.DialogCode.Accepted:
             payment_data = payment_dialog.get_payment_data()
             
             try:
                 # Create sale in database
                 sale_id = self.db_manager.create_sale(
-                    self.cart_items,
+                    self.cart.items(),
                     self.client_info['name'],
                     self.client_info['nif']
                 )
                 
                 if sale_id:
-                    # Show receipt
-                    self.show_receipt(sale_id, payment_data)
+                    # The receipt comes from the cart just sold rather than a re-read of the sale
+                    receipt = build_receipt(
+                        sale_id,
+                        self.cart,
+                        self.client_info['name'],
+                        self.client_info['nif'],
+                        payment_data,
+                        TAX_RATE
+                    )
                     
                     # Clear cart and client info
-                    self.cart_items.clear()
+                    self.cart_model.clear()
                     self.client_info = {'name': '', 'nif': ''}
                     self.client_label.setText("Client: Not specified")
-                    self.update_cart_display()
-                    
-                    # Refresh product display
-                    self.load_products()
                     
                     # Log activity
                     self.db_manager.log_user_activity(
@@ -557,6 +958,13 @@ class POSWindow(QMainWindow):
                     )
                     
                     self.status_bar.showMessage("Sale completed successfully")
+                    
+                    # Print straight away on a configured receipt printer, otherwise show it
+                    target = self.db_manager.get_setting('receipt_printer')
+                    if target:
+                        self.spool_receipt(receipt, target)
+                    else:
+                        self.show_receipt(receipt)
                 else:
                     raise Exception("Failed to create sale in database")
                 
@@ -564,83 +972,29 @@ class POSWindow(QMainWindow):
                 logger.error(f"Error completing sale: {str(e)}", exc_info=True)
                 QMessageBox.critical(self, "Error", f"Failed to complete sale: {str(e)}")
     
-    def show_receipt(self, sale_id, payment_data):
+    def show_receipt(self, receipt):
         try:
-            sale_details = self.db_manager.get_sale_details(sale_id)
-            if not sale_details:
-                raise ValueError("No sale details found")
+            dialog = QDialog(self)
+            dialog.setWindowTitle(f"Receipt #{receipt['sale_id']}")
+            # Not modal, so the next customer can be served with the receipt still open
+            dialog.setAttribute(Qt.WidgetAttribute.WA_DeleteOnClose)
+            dialog.setMinimumWidth(400)
             
-            receipt = QDialog(self)
-            receipt.setWindowTitle("Receipt")
-            receipt.setModal(True)
-            receipt.setMinimumWidth(400)
+            layout = QVBoxLayout(dialog)
             
-            layout = QVBoxLayout(receipt)
-            
-            # Company info
-            company_label = QLabel("Terran POS System")
-            company_label.setFont(QFont("Arial", 12, QFont.Weight.Bold))
-            company_label.setAlignment(Qt.AlignmentFlag.AlignCenter)
-            layout.addWidget(company_label)
-            
-            # Receipt details
             details_text = QTextEdit()
             details_text.setReadOnly(True)
-            
-            receipt_content = []
-            receipt_content.append("=" * 40)
-            receipt_content.append(f"Receipt #{sale_details[0][0]}")  # sale_id
-            receipt_content.append(f"Date: {datetime.now().strftime('%Y-%m-%d %H:%M')}")
-            receipt_content.append("-" * 40)
-            
-            if sale_details[0][1]:  # client_name
-                receipt_content.append(f"Client: {sale_details[0][1]}")
-            if sale_details[0][2]:  # nif
-                receipt_content.append(f"NIF: {sale_details[0][2]}")
-            
-            receipt_content.append("-" * 40)
-            receipt_content.append("Items:")
-            
-            subtotal = 0
-            for detail in sale_details:
-                quantity = detail[5]  # quantity
-                price = detail[6]    # price_at_sale
-                product_name = detail[7]  # product_name
-                amount = quantity * price
-                receipt_content.append(
-                    f"{product_name}\n"
-                    f"  {quantity} x ${price:.2f} = ${amount:.2f}"
-                )
-                subtotal += amount
-            
-            tax = subtotal * 0.23
-            total = subtotal + tax
-            
-            receipt_content.append("-" * 40)
-            receipt_content.append(f"Subtotal: ${subtotal:.2f}")
-            receipt_content.append(f"Tax (23%): ${tax:.2f}")
-            receipt_content.append(f"Total: ${total:.2f}")
-            receipt_content.append(f"Payment Method: {payment_data['method']}")
-            receipt_content.append(f"Amount Paid: ${payment_data['amount']:.2f}")
-            receipt_content.append(f"Change: ${payment_data['change']:.2f}")
-            
-            if payment_data['notes']:
-                receipt_content.append("-" * 40)
-                receipt_content.append("Notes:")
-                receipt_content.append(payment_data['notes'])
-            
-            receipt_content.append("=" * 40)
-            receipt_content.append("Thank you for your purchase!")
-            
-            details_text.setText("\n".join(receipt_content))
+            details_text.setFont(QFont("Courier", 10))
+            details_text.setText("\n".join(text.center(RECEIPT_PREVIEW_WIDTH) if align == 'center' else text
+                                           for text, align, bold in layout_receipt(receipt, RECEIPT_PREVIEW_WIDTH)))
             layout.addWidget(details_text)
             
             # Print button
             print_btn = QPushButton("Print")
-            print_btn.clicked.connect(lambda: self.print_receipt(receipt_content))
+            print_btn.clicked.connect(lambda: self.print_receipt(receipt, dialog))
             layout.addWidget(print_btn)
             
-            receipt.setStyleSheet("""
+            dialog.setStyleSheet("""
                 QDialog {
                     background-color: #2b2b2b;
                     color: white;
@@ -663,121 +1017,36 @@ class POSWindow(QMainWindow):
                 }
             """)
             
-            receipt.exec()
+            dialog.show()
             
         except Exception as e:
             logger.error(f"Error showing receipt: {str(e)}", exc_info=True)
             QMessageBox.critical(self, "Error", f"Failed to show receipt: {str(e)}")
     
-    def print_receipt(self, receipt_content):
+    def print_receipt(self, receipt, parent=None):
+        """Ask which printer to use, then leave the printing to the spooler"""
         try:
-            # Create printer
-            printer = QPrinter(QPrinter.PrinterMode.ScreenResolution)
+            # Print support is only loaded when something is printed
+            from PyQt6.QtPrintSupport import QPrintDialog, QPrinter
             
-            # Set custom page size for 58mm receipt printer (58mm = ~2.28 inches)
-            custom_width_mm = 58
-            custom_height_mm = 3000  # Long enough for most receipts
-            custom_page_size = QPageSize(QSizeF(custom_width_mm, custom_height_mm), QPageSize.Unit.Millimeter)
-            printer.setPageSize(custom_page_size)
-            
-            # Show printer dialog
-            dialog = QPrintDialog(printer, self)
+            printer = QPrinter()
+            dialog = QPrintDialog(printer, parent or self)
             if dialog.exec() != QDialog.DialogCode.Accepted:
                 return
+            self.spool_receipt(receipt, f"qt:{printer.printerName()}")
             
-            # Create painter
-            painter = QPainter()
-            if not painter.begin(printer):
-                QMessageBox.critical(self, "Error", "Could not start printing")
-                return
-            
-            try:
-                # Set up font and metrics
-                font = QFont("Courier", 9)  # Monospace font for receipt
-                painter.setFont(font)
-                
-                # Calculate metrics
-                metrics = painter.fontMetrics()
-                line_spacing = metrics.lineSpacing()
-                
-                # Get page rect in device pixels
-                page_rect = printer.pageRect(QPrinter.Unit.DevicePixel)
-                margin_x = page_rect.width() * 0.1  # 10% margin
-                margin_y = line_spacing
-                
-                # Calculate available width for text
-                available_width = page_rect.width() - (2 * margin_x)
-                current_y = margin_y
-                
-                # Function to wrap text to fit receipt width
-                def wrap_text(text):
-                    words = text.split()
-                    if not words:
-                        return []
-                    lines = []
-                    current_line = words[0]
-                    
-                    for word in words[1:]:
-                        test_line = current_line + " " + word
-                        if metrics.horizontalAdvance(test_line) <= available_width:
-                            current_line = test_line
-                        else:
-                            lines.append(current_line)
-                            current_line = word
-                    
-                    if current_line:
-                        lines.append(current_line)
-                    return lines
-                
-                # Print each line
-                for line in receipt_content:
-                    # Center align the company name and thank you message
-                    if line.startswith("Terran POS") or line.startswith("Thank you"):
-                        text_width = metrics.horizontalAdvance(line)
-                        x = (page_rect.width() - text_width) / 2
-                        painter.drawText(int(x), int(current_y), line)
-                        current_y += line_spacing
-                        continue
-                    
-                    # For separator lines, adjust to width
-                    if set(line).issubset({'-', '='}):
-                        separator_char = line[0]
-                        num_chars = int(available_width / metrics.horizontalAdvance(separator_char))
-                        line = separator_char * num_chars
-                        painter.drawText(int(margin_x), int(current_y), line)
-                        current_y += line_spacing
-                        continue
-                    
-                    # Handle regular lines
-                    if metrics.horizontalAdvance(line) > available_width:
-                        # Wrap long lines
-                        wrapped_lines = wrap_text(line)
-                        for wrapped_line in wrapped_lines:
-                            painter.drawText(int(margin_x), int(current_y), wrapped_line)
-                            current_y += line_spacing
-                    else:
-                        painter.drawText(int(margin_x), int(current_y), line)
-                        current_y += line_spacing
-                    
-                    # Check if we need a new page
-                    if current_y >= page_rect.height() - margin_y:
-                        printer.newPage()
-                        current_y = margin_y
-                
-                painter.end()
-                self.status_bar.showMessage("Receipt printed successfully")
-                
-            except Exception as e:
-                painter.end()
-                raise e
-                
         except Exception as e:
             logger.error(f"Error printing receipt: {str(e)}", exc_info=True)
             QMessageBox.critical(self, "Error", f"Failed to print receipt: {str(e)}")
-            
-    def format_receipt_line(self, left_text, right_text, width):
-        """Helper function to format a line with left and right aligned text"""
-        space_between = width - len(left_text) - len(right_text)
-        if space_between > 0:
-            return left_text + " " * space_between + right_text
-        return left_text + " " + right_text 
\ No newline at end of file
+    
+    def spool_receipt(self, receipt, target):
+        """Queue the receipt for the background spooler; printing never blocks the till"""
+        self.db_manager.spool_receipt(receipt['sale_id'], target, receipt)
+        get_spooler(self.db_manager.db_path).wake()
+        status = self.db_manager.get_spool_status()
+        message = f"Receipt #{receipt['sale_id']} sent to printer"
+        if status['pending'] > 1:
+            message += f" ({status['pending']} waiting)"
+        if status['last_error']:
+            message += f" - printer error: {status['last_error']}"
+        self.status_bar.showMessage(message)
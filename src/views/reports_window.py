@@ -3,18 +3,231 @@ from PyQt6.QtWidgets import (QMainWindow, QWidget, QVBoxLayout, QHBoxLayout,
                            QDialog, QLineEdit, QSpinBox, QDoubleSpinBox,
                            QMessageBox, QFormLayout, QHeaderView, QComboBox,
                            QFrame, QStatusBar, QTabWidget, QTextEdit, QCalendarWidget,
-                           QFileDialog, QGroupBox)
-from PyQt6.QtCore import Qt, QDate
-from PyQt6.QtGui import QFont, QColor, QTextDocument
-from PyQt6.QtPrintSupport import QPrinter, QPrintDialog
+                           QFileDialog, QGroupBox, QProgressDialog)
+from PyQt6.QtCore import Qt, QDate, QRectF, QThread, pyqtSignal
+from PyQt6.QtGui import QFont, QColor, QFontMetricsF, QPainter, QPageLayout, QPageSize
 import logging
 from datetime import datetime, timedelta
 import csv
 import json
 import os
+from database.db_manager import DatabaseManager
+from database.federation import FEDERATED_REPORTS
 
 logger = logging.getLogger('TerranPOS')
 
+# Column headers of each custom report, in the order get_custom_report returns its values
+CUSTOM_REPORT_HEADERS = {
+    "Top Selling Products": ["Product", "Quantity Sold", "Total Revenue", "% of Sales"],
+    "Sales by Category": ["Category", "Items Sold", "Total Revenue", "% of Sales"],
+    "Sales by Payment Method": ["Payment Method", "Number of Sales", "Total Amount"],
+    "Stock Movement": ["Product", "Initial Stock", "Received", "Sold", "Current Stock"],
+    "Stock Valuation": ["Product", "Category", "Quantity", "Unit Cost", "Value"],
+    "Daily Sales Summary": ["Date", "Number of Sales", "Total Revenue", "Average Sale"],
+    "Margin by Product": ["Product", "Quantity Sold", "Net Revenue", "Cost of Goods", "Margin", "Margin %"],
+    "Sales by Store": ["Store", "Number of Sales", "Total Revenue", "Average Sale"],
+}
+
+# Printed layout of the streamed reports: title and (row key, header, relative width, is money)
+PRINT_LAYOUTS = {
+    'sales': ("Sales Report", [
+        ('date', "Date", 3, False), ('id', "Receipt #", 1.5, False), ('client_name', "Client", 4, False),
+        ('items', "Items", 1.2, False), ('total_amount', "Total", 2, True), ('payment_method', "Payment", 2, False),
+    ]),
+    'inventory': ("Inventory Report", [
+        ('name', "Product", 5, False), ('category', "Category", 3, False), ('stock', "Stock", 1.5, False),
+        ('price', "Price", 2, True), ('value', "Value", 2, True), ('status', "Status", 2, False),
+    ]),
+    'financial': ("Financial Report", [
+        ('date', "Date", 3, False), ('description', "Description", 5, False),
+        ('gross_amount', "Gross Amount", 2, True), ('tax', "Tax", 2, True), ('net_amount', "Net Amount", 2, True),
+        ('cost_of_goods', "Cost of Goods", 2, True), ('margin', "Margin", 2, True),
+    ]),
+}
+# Reports tab index to the report it prints
+PRINT_TABS = ['sales', 'inventory', 'financial', 'custom']
+# Rows painted between progress updates
+PRINT_PROGRESS_ROWS = 250
+
+
+def format_cell(value, money=False):
+    if value is None:
+        return "-"
+    if money or isinstance(value, float):
+        return f"${value:.2f}"
+    return str(value)
+
+
+class ReportPainter:
+    """Paints a table report page by page on a QPrinter or QPdfWriter.
+
+    Rows are drawn as they arrive and each page repeats the column headers,
+    so nothing but the current page is held while a report is printed.
+    """
+    
+    def __init__(self, device, title, subtitle, headers, weights):
+        self.device = device
+        self.title = title
+        self.subtitle = subtitle
+        self.headers = headers
+        self.painter = QPainter()
+        if not self.painter.begin(device):
+            raise RuntimeError("Could not start printing")
+        
+        self.font = QFont("Arial", 8)
+        self.header_font = QFont("Arial", 8, QFont.Weight.Bold)
+        self.title_font = QFont("Arial", 14, QFont.Weight.Bold)
+        self.metrics = QFontMetricsF(self.font, device)
+        self.title_metrics = QFontMetricsF(self.title_font, device)
+        
+        # The painter's origin is the top left of the printable area
+        page = device.pageLayout().paintRectPixels(device.resolution())
+        self.width = page.width()
+        self.bottom = page.height() - self.metrics.lineSpacing() * 2
+        self.row_height = self.metrics.lineSpacing() * 1.4
+        self.padding = self.metrics.horizontalAdvance(" ")
+        
+        self.columns = []
+        x = 0.0
+        for weight in weights:
+            width = self.width * weight / sum(weights)
+            self.columns.append((x, width))
+            x += width
+        
+        self.pages = 0
+        self.y = None
+    
+    def new_page(self):
+        if self.pages:
+            self.device.newPage()
+        self.pages += 1
+        self.y = 0.0
+        
+        if self.pages == 1:
+            self.painter.setFont(self.title_font)
+            self.painter.drawText(QRectF(0, 0, self.width, self.title_metrics.lineSpacing()),
+                                  Qt.AlignmentFlag.AlignLeft, self.title)
+            self.y += self.title_metrics.lineSpacing()
+            self.painter.setFont(self.font)
+            self.painter.drawText(QRectF(0, self.y, self.width, self.row_height),
+                                  Qt.AlignmentFlag.AlignLeft, self.subtitle)
+            self.y += self.row_height * 1.5
+        
+        self.painter.setFont(self.font)
+        self.painter.drawText(QRectF(0, self.bottom, self.width, self.metrics.lineSpacing() * 2),
+                              Qt.AlignmentFlag.AlignRight | Qt.AlignmentFlag.AlignBottom,
+                              f"Page {self.pages}")
+        
+        self.painter.setFont(self.header_font)
+        self.draw_cells(self.headers)
+        self.painter.drawLine(0, int(self.y), int(self.width), int(self.y))
+        self.painter.setFont(self.font)
+    
+    def draw_cells(self, texts):
+        for (x, width), text in zip(self.columns, texts):
+            text = self.metrics.elidedText(text, Qt.TextElideMode.ElideRight, width - 2 * self.padding)
+            self.painter.drawText(QRectF(x + self.padding, self.y, width - 2 * self.padding, self.row_height),
+                                  Qt.AlignmentFlag.AlignLeft | Qt.AlignmentFlag.AlignVCenter, text)
+        self.y += self.row_height
+    
+    def add_row(self, texts):
+        if self.y is None or self.y + self.row_height > self.bottom:
+            self.new_page()
+        self.draw_cells(texts)
+    
+    def finish(self):
+        """End the document; returns the number of pages"""
+        if self.y is None:
+            self.new_page()
+            self.draw_cells(["No data for this period"])
+        self.painter.end()
+        return self.pages
+
+
+class ReportPrintWorker(QThread):
+    """Streams a report from its own database connection onto a printer or PDF file"""
+    
+    progress = pyqtSignal(int, int)
+    print_finished = pyqtSignal(int, int, bool)
+    print_failed = pyqtSignal(str)
+    
+    def __init__(self, db_path, report, start_date, end_date, printer=None, pdf_path=None,
+                 custom_type=None, all_stores=False, parent=None):
+        super().__init__(parent)
+        self.db_path = db_path
+        self.report = report
+        self.start_date = start_date
+        self.end_date = end_date
+        self.printer = printer
+        self.pdf_path = pdf_path
+        self.custom_type = custom_type
+        self.all_stores = all_stores
+        self.cancelled = False
+    
+    def cancel(self):
+        self.cancelled = True
+    
+    def run(self):
+        # SQLite connections belong to the thread that opened them
+        db_manager = DatabaseManager(self.db_path, initialize=False)
+        try:
+            if self.report == 'custom':
+                title = self.custom_type
+                headers = CUSTOM_REPORT_HEADERS[self.custom_type]
+                weights = [3] + [2] * (len(headers) - 1)
+                # Custom reports are aggregates (a row per product, category or day)
+                if self.all_stores:
+                    title += " - All Stores"
+                    data = db_manager.get_federated_report(self.custom_type, self.start_date, self.end_date)
+                else:
+                    data = db_manager.get_custom_report(self.custom_type, self.start_date, self.end_date)
+                total = len(data)
+                rows = ([format_cell(value) for value in row.values()] for row in data)
+            else:
+                title, columns = PRINT_LAYOUTS[self.report]
+                headers = [header for key, header, weight, money in columns]
+                weights = [weight for key, header, weight, money in columns]
+                total = db_manager.count_report(self.report, self.start_date, self.end_date)
+                rows = ([format_cell(row[key], money) for key, header, weight, money in columns]
+                        for row in db_manager.iter_report(self.report, self.start_date, self.end_date))
+            
+            device = self.printer
+            if device is None:
+                # QPdfWriter is a QObject, so it is created on this thread
+                from PyQt6.QtGui import QPdfWriter
+                device = QPdfWriter(self.pdf_path)
+                device.setResolution(300)
+                device.setPageSize(QPageSize(QPageSize.PageSizeId.A4))
+                device.setTitle(title)
+                device.setPageOrientation(QPageLayout.Orientation.Landscape if len(headers) > 6
+                                          else QPageLayout.Orientation.Portrait)
+            
+            subtitle = (f"{self.start_date} to {self.end_date} - "
+                        f"generated {datetime.now().strftime('%Y-%m-%d %H:%M')}")
+            if self.report == 'inventory':
+                subtitle = f"Generated {datetime.now().strftime('%Y-%m-%d %H:%M')}"
+            painter = ReportPainter(device, title, subtitle, headers, weights)
+            count = 0
+            for texts in rows:
+                if self.cancelled:
+                    break
+                painter.add_row(texts)
+                count += 1
+                if count % PRINT_PROGRESS_ROWS == 0:
+                    self.progress.emit(count, total)
+            
+            if self.cancelled and self.printer is not None:
+                self.printer.abort()
+            pages = painter.finish()
+            if self.cancelled and self.pdf_path:
+                os.remove(self.pdf_path)
+            self.print_finished.emit(count, pages, self.cancelled)
+        except Exception as e:
+            logger.error(f"Error printing report: {str(e)}", exc_info=True)
+            self.print_failed.emit(str(e))
+        finally:
+            db_manager.close()
+
 class DateRangeSelector(QDialog):
     def __init__(self, parent=None):
         super().__init__(parent)
@@ -312,38 +525,92 @@ class ReportsWindow(QMainWindow):
             QMessageBox.critical(self, "Error", f"Failed to export report: {str(e)}")
     
     def print_report(self):
+        """Print the report on the current tab"""
         if not self.check_permission('reports_print'):
             QMessageBox.warning(self, "Access Denied", "You don't have permission to print reports")
             return
         
         try:
-            if not hasattr(self, 'current_report_data') or not self.current_report_data:
-                QMessageBox.warning(self, "Warning", "Please generate a report first")
-                return
+            # Print support is only loaded when something is printed
+            from PyQt6.QtPrintSupport import QPrinter, QPrintDialog
             
             printer = QPrinter(QPrinter.PrinterMode.HighResolution)
             dialog = QPrintDialog(printer, self)
-            
             if dialog.exec() == QPrintDialog.DialogCode.Accepted:
-                document = QTextDocument()
-                html = self.generate_report_html()
-                document.setHtml(html)
-                document.print_(printer)
-                
-                # Log activity
-                self.db_manager.log_user_activity(
-                    self.current_user['id'],
-                    "print",
-                    "reports",
-                    "Printed report"
-                )
-                
-                self.status_bar.showMessage("Report printed successfully")
+                self.start_report_print(printer=printer)
         
         except Exception as e:
             logger.error(f"Error printing report: {str(e)}", exc_info=True)
             QMessageBox.critical(self, "Error", f"Failed to print report: {str(e)}")
     
+    def save_report_pdf(self):
+        """Save the report on the current tab as a PDF file"""
+        if not self.check_permission('reports_export'):
+            QMessageBox.warning(self, "Access Denied", "You don't have permission to export reports")
+            return
+        
+        report = PRINT_TABS[self.tabs.currentIndex()]
+        name = self.report_type.currentText() if report == 'custom' else report
+        file_name, _ = QFileDialog.getSaveFileName(
+            self,
+            "Save Report as PDF",
+            f"{name.lower().replace(' ', '_')}_report_{datetime.now().strftime('%Y%m%d')}.pdf",
+            "PDF Files (*.pdf)"
+        )
+        if file_name:
+            self.start_report_print(pdf_path=file_name)
+    
+    def start_report_print(self, printer=None, pdf_path=None):
+        """Render the current tab's report in the background, page by page"""
+        report = PRINT_TABS[self.tabs.currentIndex()]
+        
+        self.print_progress = QProgressDialog("Rendering report...", "Cancel", 0, 0, self)
+        self.print_progress.setWindowTitle("Print Report")
+        self.print_progress.setWindowModality(Qt.WindowModality.WindowModal)
+        self.print_progress.setMinimumDuration(500)
+        
+        self.print_worker = ReportPrintWorker(
+            self.db_manager.db_path,
+            report,
+            self.current_date_range['start'],
+            self.current_date_range['end'],
+            printer=printer,
+            pdf_path=pdf_path,
+            custom_type=self.report_type.currentText(),
+            all_stores=self.all_stores_selected(),
+            parent=self
+        )
+        self.print_worker.progress.connect(self.on_print_progress)
+        self.print_worker.print_finished.connect(
+            lambda rows, pages, cancelled: self.on_print_finished(report, pdf_path, rows, pages, cancelled))
+        self.print_worker.print_failed.connect(self.on_print_failed)
+        self.print_progress.canceled.connect(self.print_worker.cancel)
+        self.print_worker.start()
+    
+    def on_print_progress(self, rows, total):
+        self.print_progress.setMaximum(total)
+        self.print_progress.setValue(rows)
+        self.print_progress.setLabelText(f"Rendering report... {rows} of {total} rows")
+    
+    def on_print_finished(self, report, pdf_path, rows, pages, cancelled):
+        self.print_progress.close()
+        if cancelled:
+            self.status_bar.showMessage("Report printing cancelled")
+            return
+        
+        destination = pdf_path or "printer"
+        self.db_manager.log_user_activity(
+            self.current_user['id'],
+            "export" if pdf_path else "print",
+            "reports",
+            f"Printed {report} report to {destination}: {rows} rows, {pages} pages"
+        )
+        self.status_bar.showMessage(f"Report sent to {destination} ({pages} pages)")
+    
+    def on_print_failed(self, message):
+        self.print_progress.close()
+        QMessageBox.critical(self, "Error", f"Failed to print report: {message}")
+    
     def display_report(self, report_data, title):
         """Display report data in the table view"""
         self.current_report_data = report_data
@@ -385,12 +652,19 @@ class ReportsWindow(QMainWindow):
         self.date_label = QLabel(f"Date Range: {self.format_date_range()}")
         change_date_btn = QPushButton("Change Date Range")
         change_date_btn.clicked.connect(self.change_date_range)
+        print_btn = QPushButton("Print Report")
+        print_btn.clicked.connect(self.print_report)
+        pdf_btn = QPushButton("Save as PDF")
+        pdf_btn.clicked.connect(self.save_report_pdf)
         date_layout.addWidget(self.date_label)
         date_layout.addWidget(change_date_btn)
+        date_layout.addWidget(print_btn)
+        date_layout.addWidget(pdf_btn)
         layout.addLayout(date_layout)
         
         # Create tab widget
         tabs = QTabWidget()
+        self.tabs = tabs
         
         # Sales Reports Tab
         sales_tab = QWidget()
@@ -464,16 +738,20 @@ class ReportsWindow(QMainWindow):
         self.gross_sales_label = QLabel("$0.00")
         self.tax_collected_label = QLabel("$0.00")
         self.net_sales_label = QLabel("$0.00")
+        self.cost_of_goods_label = QLabel("$0.00")
+        self.margin_label = QLabel("$0.00")
         fin_summary_layout.addRow("Gross Sales:", self.gross_sales_label)
         fin_summary_layout.addRow("Tax Collected:", self.tax_collected_label)
         fin_summary_layout.addRow("Net Sales:", self.net_sales_label)
+        fin_summary_layout.addRow("Cost of Goods:", self.cost_of_goods_label)
+        fin_summary_layout.addRow("Margin:", self.margin_label)
         financial_layout.addWidget(financial_summary)
         
         # Financial table
         self.financial_table = QTableWidget()
-        self.financial_table.setColumnCount(5)
+        self.financial_table.setColumnCount(7)
         self.financial_table.setHorizontalHeaderLabels([
-            "Date", "Description", "Gross Amount", "Tax", "Net Amount"
+            "Date", "Description", "Gross Amount", "Tax", "Net Amount", "Cost of Goods", "Margin"
         ])
         self.financial_table.horizontalHeader().setSectionResizeMode(QHeaderView.ResizeMode.Stretch)
         financial_layout.addWidget(self.financial_table)
@@ -493,15 +771,15 @@ class ReportsWindow(QMainWindow):
         type_layout = QHBoxLayout()
         type_label = QLabel("Report Type:")
         self.report_type = QComboBox()
-        self.report_type.addItems([
-            "Top Selling Products",
-            "Sales by Category",
-            "Sales by Payment Method",
-            "Stock Movement",
-            "Daily Sales Summary"
-        ])
+        self.report_type.addItems(list(CUSTOM_REPORT_HEADERS))
         type_layout.addWidget(type_label)
         type_layout.addWidget(self.report_type)
+        
+        # Head offices with registered stores can report across all of them
+        self.report_scope = QComboBox()
+        self.report_scope.addItems(["This store", "All stores"])
+        self.report_scope.setVisible(bool(self.db_manager.get_locations()))
+        type_layout.addWidget(self.report_scope)
         custom_layout.addLayout(type_layout)
         
         # Custom report table
@@ -685,10 +963,19 @@ class ReportsWindow(QMainWindow):
             gross_sales = sum(trans['gross_amount'] for trans in financial_data)
             tax_collected = sum(trans['tax'] for trans in financial_data)
             net_sales = sum(trans['net_amount'] for trans in financial_data)
+            # Sales with a line of unknown cost are left out of the margin totals
+            costed = [trans for trans in financial_data if trans['cost_of_goods'] is not None]
+            cost_of_goods = sum(trans['cost_of_goods'] for trans in costed)
+            margin = sum(trans['margin'] for trans in costed)
             
             self.gross_sales_label.setText(f"${gross_sales:.2f}")
             self.tax_collected_label.setText(f"${tax_collected:.2f}")
             self.net_sales_label.setText(f"${net_sales:.2f}")
+            self.cost_of_goods_label.setText(f"${cost_of_goods:.2f}")
+            uncosted = len(financial_data) - len(costed)
+            self.margin_label.setText(
+                f"${margin:.2f}" + (f" ({uncosted} sales without cost)" if uncosted else "")
+            )
             
             # Update table
             self.financial_table.setRowCount(len(financial_data))
@@ -698,61 +985,51 @@ class ReportsWindow(QMainWindow):
                 self.financial_table.setItem(row, 2, QTableWidgetItem(f"${trans['gross_amount']:.2f}"))
                 self.financial_table.setItem(row, 3, QTableWidgetItem(f"${trans['tax']:.2f}"))
                 self.financial_table.setItem(row, 4, QTableWidgetItem(f"${trans['net_amount']:.2f}"))
+                for col, key in ((5, 'cost_of_goods'), (6, 'margin')):
+                    value = trans[key]
+                    self.financial_table.setItem(
+                        row, col, QTableWidgetItem(f"${value:.2f}" if value is not None else "-")
+                    )
         
         except Exception as e:
             logger.error(f"Error loading financial report: {str(e)}", exc_info=True)
             raise
     
+    def all_stores_selected(self):
+        return self.report_scope.isVisible() and self.report_scope.currentText() == "All stores"
+    
     def generate_custom_report(self):
         try:
             report_type = self.report_type.currentText()
             
             # Get custom report data from database
-            report_data = self.db_manager.get_custom_report(
-                report_type,
-                self.current_date_range['start'],
-                self.current_date_range['end']
-            )
+            if self.all_stores_selected():
+                if report_type not in FEDERATED_REPORTS:
+                    QMessageBox.warning(self, "Warning", f"{report_type} is only available for this store")
+                    return
+                report_data = self.db_manager.get_federated_report(
+                    report_type,
+                    self.current_date_range['start'],
+                    self.current_date_range['end']
+                )
+            else:
+                report_data = self.db_manager.get_custom_report(
+                    report_type,
+                    self.current_date_range['start'],
+                    self.current_date_range['end']
+                )
             
             # Configure table based on report type
-            if report_type == "Top Selling Products":
-                self.custom_table.setColumnCount(4)
-                self.custom_table.setHorizontalHeaderLabels([
-                    "Product", "Quantity Sold", "Total Revenue", "% of Sales"
-                ])
-            elif report_type == "Sales by Category":
-                self.custom_table.setColumnCount(4)
-                self.custom_table.setHorizontalHeaderLabels([
-                    "Category", "Items Sold", "Total Revenue", "% of Sales"
-                ])
-            elif report_type == "Sales by Payment Method":
-                self.custom_table.setColumnCount(3)
-                self.custom_table.setHorizontalHeaderLabels([
-                    "Payment Method", "Number of Sales", "Total Amount"
-                ])
-            elif report_type == "Stock Movement":
-                self.custom_table.setColumnCount(5)
-                self.custom_table.setHorizontalHeaderLabels([
-                    "Product", "Initial Stock", "Received", "Sold", "Current Stock"
-                ])
-            elif report_type == "Daily Sales Summary":
-                self.custom_table.setColumnCount(4)
-                self.custom_table.setHorizontalHeaderLabels([
-                    "Date", "Number of Sales", "Total Revenue", "Average Sale"
-                ])
+            headers = CUSTOM_REPORT_HEADERS[report_type]
+            self.custom_table.setColumnCount(len(headers))
+            self.custom_table.setHorizontalHeaderLabels(headers)
             
             # Update table
             self.custom_table.setRowCount(len(report_data))
             for row, data in enumerate(report_data):
                 for col, value in enumerate(data.values()):
-                    if isinstance(value, float):
-                        item_text = f"${value:.2f}"
-                    elif isinstance(value, (int, str)):
-                        item_text = str(value)
-                    else:
-                        item_text = str(value)
-                    
-                    self.custom_table.setItem(row, col, QTableWidgetItem(item_text))
+                    # e.g. a product with no known cost in Stock Valuation shows "-"
+                    self.custom_table.setItem(row, col, QTableWidgetItem(format_cell(value)))
             
             self.status_bar.showMessage(f"Generated {report_type} report successfully")
         